@@ -0,0 +1,313 @@
+"""
+Benchmark harness for the stages of a refresh: indicator computation, strategy simulation,
+getprices response parsing (to rows, and streamed to columns), decoding of archived
+candlesticks, scanning of a universe of tickers and, inside the Processing sketch, rendering
+of the main screen.
+
+Every stage runs against deterministic synthetic candlesticks of each requested size, and
+reports its throughput (candlesticks per second) and peak memory. On Jython the peak memory
+is the peak of the Java heap pools during the stage; on CPython 2 there is no per-stage peak,
+and it is reported as n/a. Results can be saved as a baseline and later runs compared against
+it, flagging regressions.
+
+    python Benchmarks/Benchmark.py --sizes 390,100000 --save-baseline
+    python Benchmarks/Benchmark.py --sizes 390,100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SketchPaths
+SketchPaths.addSketchPaths()
+
+from Clock import monotonicTime
+from Data import Data
+from BarParser import BarParser
+from BarArchive import encodeBlock
+from BarArchive import decodeBlock
+from Analysis import Analysis
+from TechnicalMethods import SimpleMovingAverage
+from Indicators import ExponentialMovingAverage
+from Indicators import BollingerBands
+from Indicators import DonchianChannel
+from SMACrossOver import SMACrossOver
+from RuleStrategy import RuleStrategy, CROSSOVER_RULES
+from UniverseScanner import UniverseScanner
+from Instrumentation import runRenderingStage
+
+# the synthetic candlesticks are rows of Python lists, as in Data.stockData, so sizes much
+# above a million need more heap than the sketch JVM has by default
+DEFAULT_SIZES = [390, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# universe size of the scan stage: the candlesticks are scanned as bars of this many tickers
+SCAN_TICKERS = 1000
+
+
+def syntheticStockData(candleStickTotal, seed=2013):
+    """
+    Returns deterministic candlesticks following a random walk, organized like Data.stockData.
+
+    @type candleStickTotal: int, the number of candlesticks
+    @type seed: int, the seed of the random walk
+    @rtype: list
+    """
+    walk = random.Random(seed)
+    stockData = []
+    close = 100.0
+    for candleStickCount in range(candleStickTotal):
+        openPrice = close
+        close = max(1.0, close + walk.gauss(0, 0.05))
+        high = max(openPrice, close) + walk.random() * 0.02
+        low = min(openPrice, close) - walk.random() * 0.02
+        stockData.append([float(candleStickCount + 1), close, high, low, openPrice,
+                          float(walk.randint(100, 5000))])
+    return stockData
+
+
+def syntheticResponse(stockData):
+    """
+    Returns a getprices response body containing the given candlesticks.
+
+    @type stockData: list, the candlesticks to encode
+    @rtype: str
+    """
+    lines = ["EXCHANGE%3DNASDAQ", "MARKET_OPEN_MINUTE=570", "MARKET_CLOSE_MINUTE=960",
+             "INTERVAL=60", "COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME", "DATA=",
+             "TIMEZONE_OFFSET=-240", "a1368538200,100,100,100,100,0"]
+    for bar in stockData:
+        lines.append("%d,%.4f,%.4f,%.4f,%.4f,%d" % (bar[0], bar[1], bar[2], bar[3], bar[4], bar[5]))
+    return "\n".join(lines) + "\n"
+
+
+class _MemoryProbe():
+    """
+    Measures the peak memory allocated while a stage runs, as the peak usage of the Java heap
+    pools on Jython, reset before the stage. On CPython 2 there is no per-stage peak (the
+    process peak only ever grows), and memory is not measured. Helper.
+    """
+
+    def __init__(self):
+        self.method = None
+        try:
+            from java.lang.management import ManagementFactory
+            from java.lang.management import MemoryType
+            self._pools = [pool for pool in ManagementFactory.getMemoryPoolMXBeans()
+                           if pool.getType() == MemoryType.HEAP]
+            self.method = "java heap pools"
+        except ImportError:
+            pass
+
+
+    def start(self):
+        gc.collect()
+        if self.method == "java heap pools":
+            self._before = 0
+            for pool in self._pools:
+                pool.resetPeakUsage()
+                self._before += pool.getUsage().getUsed()
+
+
+    def stop(self):
+        """
+        @rtype: int, the peak memory of the stage in bytes, or None if it cannot be measured
+        """
+        if self.method == "java heap pools":
+            # the pools peak at different times, so their sum slightly overestimates the peak
+            peak = sum([pool.getPeakUsage().getUsed() for pool in self._pools])
+            return max(0, peak - self._before)
+        return None
+
+
+def _resetSimulation(stockData):
+    data = Data.getInstance()
+    data.stockData = stockData
+    data.clearTrades()
+    Analysis.getInstance().preAnalysisCalculations()
+
+
+def _indicatorsStage(stockData):
+    for indicator in [SimpleMovingAverage(15), SimpleMovingAverage(50), ExponentialMovingAverage(20),
+                      BollingerBands(20), DonchianChannel(20)]:
+        indicator.getIndicators(stockData)
+
+
+def _crossOverStage(stockData):
+    _resetSimulation(stockData)
+    SMACrossOver().simulateStrategy()
+
+
+def _rulesStage(stockData):
+    _resetSimulation(stockData)
+    RuleStrategy(CROSSOVER_RULES).simulateStrategy()
+
+
+def _scanRows(stockData):
+    # the closes laid out as bars of a universe of SCAN_TICKERS tickers
+    tickerCount = min(SCAN_TICKERS, len(stockData))
+    closes = [bar[1] for bar in stockData]
+    return tickerCount, [closes[start:start + tickerCount]
+                         for start in range(0, len(closes) - tickerCount + 1, tickerCount)]
+
+
+def _scanStage(scanInput):
+    tickerCount, rows = scanInput
+    scanner = UniverseScanner([("T" + str(index), "NASD") for index in range(tickerCount)])
+    for row in rows:
+        scanner.addBar(row)
+
+
+def _parsingStage(responseText):
+    Data.parseStockData(responseText, None)
+
+
+def _columnParsingStage(responseText):
+    parser = BarParser()
+    for start in range(0, len(responseText), 65536):
+        parser.feed(responseText[start:start + 65536])
+    parser.close()
+
+
+# stage name -> (function preparing the input from the candlesticks, function timed on the input)
+STAGES = [
+    ("indicators", lambda stockData: stockData, _indicatorsStage),
+    ("simulation.SMACrossOver", lambda stockData: stockData, _crossOverStage),
+    ("simulation.rules", lambda stockData: stockData, _rulesStage),
+    ("parsing", syntheticResponse, _parsingStage),
+    ("parsing.columns", syntheticResponse, _columnParsingStage),
+    ("archive.decode", lambda stockData: encodeBlock(stockData, 10000), decodeBlock),
+    ("scan", _scanRows, _scanStage),
+]
+
+
+def runStage(function, stageInput, candleStickTotal, repeat):
+    """
+    Times a stage, keeping the fastest of (repeat) runs.
+
+    @rtype: dict, with the throughput in candlesticks per second, seconds, peak memory (None
+            if it cannot be measured) and how the memory was measured
+    """
+    probe = _MemoryProbe()
+    best = None
+    peakMemory = None
+    for run in range(repeat):
+        probe.start()
+        start = monotonicTime()
+        function(stageInput)
+        elapsed = max(monotonicTime() - start, 1e-9)
+        memory = probe.stop()
+        if best == None or elapsed < best:
+            best = elapsed
+        if memory != None:
+            peakMemory = max(peakMemory or 0, memory)
+    return {"barsPerSecond": candleStickTotal / best, "seconds": best, "peakMemory": peakMemory,
+            "memoryMethod": probe.method}
+
+
+def runBenchmarks(sizes, stageNames=None, repeat=3):
+    """
+    Runs every stage against synthetic candlesticks of every size.
+
+    @type sizes: list, of numbers of candlesticks
+    @type stageNames: list, the stages to run, defaults to all
+    @type repeat: int, the number of runs per stage on sizes up to 100000 candlesticks
+    @rtype: dict, "stage/size" -> result of runStage()
+    """
+    results = {}
+    for size in sizes:
+        stockData = syntheticStockData(size)
+        for name, prepare, function in STAGES:
+            if stageNames != None and name not in stageNames:
+                continue
+            stageInput = prepare(stockData)
+            stageRepeat = repeat if size <= 100000 else 1
+            results[name + "/" + str(size)] = runStage(function, stageInput, size, stageRepeat)
+            stageInput = None
+    return results
+
+
+def compareToBaseline(results, baseline, tolerance):
+    """
+    Returns the regressions of results against a baseline: a throughput lower than the
+    baseline's, or a peak memory higher, by more than the tolerance. Peak memory is only
+    compared when both were measured the same way.
+
+    @type results: dict, from runBenchmarks()
+    @type baseline: dict, from an earlier runBenchmarks()
+    @type tolerance: float, the accepted relative difference, e.g. 0.15 for 15%
+    @rtype: list, of str describing every regression
+    """
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        current, previous = results[key], baseline[key]
+        if current["barsPerSecond"] < previous["barsPerSecond"] * (1 - tolerance):
+            regressions.append(key + ": throughput " + _formatRate(current["barsPerSecond"]) +
+                               " vs baseline " + _formatRate(previous["barsPerSecond"]))
+        if current["peakMemory"] != None and previous.get("peakMemory") != None and \
+                current.get("memoryMethod") == previous.get("memoryMethod") and \
+                current["peakMemory"] > previous["peakMemory"] * (1 + tolerance):
+            regressions.append(key + ": peak memory " + _formatBytes(current["peakMemory"]) +
+                               " vs baseline " + _formatBytes(previous["peakMemory"]))
+    return regressions
+
+
+def _formatRate(barsPerSecond):
+    return "%.0f bars/s" % barsPerSecond
+
+
+def _formatBytes(byteCount):
+    if byteCount == None:
+        return "n/a"
+    return "%.1f MB" % (byteCount / 1048576.0)
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Benchmarks the stages of a refresh.")
+    parser.add_argument("--sizes", default=",".join([str(size) for size in DEFAULT_SIZES]),
+                        help="comma separated numbers of candlesticks")
+    parser.add_argument("--stages", default=None, help="comma separated stages, defaults to all")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="accepted relative difference")
+    options = parser.parse_args(arguments)
+
+    sizes = [int(size) for size in options.sizes.split(",")]
+    stageNames = None
+    if options.stages != None:
+        stageNames = options.stages.split(",")
+    results = runBenchmarks(sizes, stageNames, options.repeat)
+
+    for key in sorted(results):
+        result = results[key]
+        sys.stdout.write("%-32s %18s %10.4f s %12s\n" % (key, _formatRate(result["barsPerSecond"]),
+                                                          result["seconds"],
+                                                          _formatBytes(result["peakMemory"])))
+
+    if options.save_baseline:
+        baselineFile = open(options.baseline, "w")
+        json.dump(results, baselineFile, indent=2, sort_keys=True)
+        baselineFile.close()
+        sys.stdout.write("Saved baseline to " + options.baseline + "\n")
+        return 0
+
+    if os.path.exists(options.baseline):
+        baselineFile = open(options.baseline)
+        regressions = compareToBaseline(results, json.load(baselineFile), options.tolerance)
+        baselineFile.close()
+        for regression in regressions:
+            sys.stdout.write("REGRESSION " + regression + "\n")
+        if len(regressions) > 0:
+            return 1
+        sys.stdout.write("No regressions against " + options.baseline + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,214 @@
+"""
+Checks the BulkFetcher against a local stand-in server for the getprices service: retries of
+temporary server errors, the rate limit per host, and the cache (including concurrent
+requests for the same stock and day, which must be downloaded once).
+
+The stand-in server answers every request with synthetic candlesticks, after failing the
+first requests of the tickers configured to fail, and records the time of every request.
+
+    python Benchmarks/FetchCheck.py
+"""
+
+import argparse
+import os
+import sys
+import threading
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SketchPaths
+SketchPaths.addSketchPaths()
+
+from Clock import monotonicTime
+from BulkFetcher import BulkFetcher, FetchError
+from Benchmark import syntheticStockData, syntheticResponse
+
+
+class _StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers a getprices request on behalf of the StandInServer it belongs to.
+    """
+
+    protocol_version = "HTTP/1.1"       # keep-alive, as the getprices service
+
+    def do_GET(self):
+        status, body = self.server.standIn.answer(self.path)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *arguments):
+        pass
+
+
+class _ThreadingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer():
+    """
+    Local stand-in for the getprices service, serving synthetic candlesticks on a free port
+    of 127.0.0.1. Requests for a ticker in (failures) are answered with a 503 the configured
+    number of times per URL before they succeed.
+    """
+
+    def __init__(self, failures=None):
+        """
+        Initializes a new StandInServer, and starts serving on a thread.
+
+        @type failures: dict, ticker -> number of 503 answers per URL before it succeeds
+        @rtype: None
+        """
+        self.failures = failures if failures != None else {}
+        self.body = syntheticResponse(syntheticStockData(390))
+        self.requests = []              # (path, monotonic time) of every request answered
+        self._failed = {}               # path -> number of 503 answers given
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer(("127.0.0.1", 0), _StandInHandler)
+        self._server.standIn = self
+        self.baseURL = "http://127.0.0.1:" + str(self._server.server_address[1])
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+    def answer(self, path):
+        """
+        Returns the status and body of the answer to a request.
+
+        @type path: str, the path and query of the request
+        @rtype: tuple, (status, body)
+        """
+        with self._lock:
+            self.requests.append((path, monotonicTime()))
+            for ticker in self.failures:
+                if "q=" + ticker + "&" in path and self._failed.get(path, 0) < self.failures[ticker]:
+                    self._failed[path] = self._failed.get(path, 0) + 1
+                    return 503, ""
+        return 200, self.body
+
+
+    def requestCount(self, ticker=None):
+        """
+        Returns the number of requests answered.
+
+        @type ticker: str, only count the requests for this ticker, or None for all
+        @rtype: int
+        """
+        with self._lock:
+            return len([path for path, time in self.requests if ticker == None or "q=" + ticker + "&" in path])
+
+
+    def stop(self):
+        """
+        Stops serving.
+
+        @rtype: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def checkRetries(server):
+    """
+    Checks that temporary server errors are retried until the download succeeds, and that a
+    download failing for good raises FetchError after its retries.
+
+    @type server: StandInServer, failing the first 2 requests of FLAKY, and every request of DOWN
+    @rtype: tuple, (passed, detail)
+    """
+    fetcher = BulkFetcher(server.baseURL, retries=3, backoffBase=0.01, requestsPerSecond=1000, burst=100)
+    errors = fetcher.fetchAll([("FLAKY", "NASD", day) for day in range(3)] + [("DOWN", "NASD", 0)])
+    fetcher.close()
+    passed = (len(errors) == 1 and isinstance(errors.get(("DOWN", "NASD", 0)), FetchError) and
+              server.requestCount("FLAKY") == 3 * 3 and server.requestCount("DOWN") == 1 + 3 and
+              len(fetcher.cache) == 3)
+    return passed, "%d requests for 3 flaky days, %d for a download failing for good" % (
+        server.requestCount("FLAKY"), server.requestCount("DOWN"))
+
+
+def checkRateLimit(server, rate=50, burst=5, requestTotal=30):
+    """
+    Checks that the requests to a host stay within the rate limit: after the first (burst)
+    requests, the (n)th request is not sent before (n - burst) / rate seconds.
+
+    @type server: StandInServer, the server the requests are sent to
+    @type rate: float, the number of requests allowed per second
+    @type burst: int, the number of requests allowed at once
+    @type requestTotal: int, the number of requests sent
+    @rtype: tuple, (passed, detail)
+    """
+    fetcher = BulkFetcher(server.baseURL, workerCount=8, requestsPerSecond=rate, burst=burst)
+    start = len(server.requests)
+    fetcher.fetchAll([("RATE", "NASD", day) for day in range(requestTotal)])
+    fetcher.close()
+    times = sorted([time for path, time in server.requests[start:]])
+    # the clock of the server and of the token bucket differ by the request latency only
+    early = [count for count in range(burst, len(times))
+             if times[count] - times[0] < (count + 1 - burst) / float(rate) - 0.01]
+    elapsed = times[-1] - times[0]
+    return (len(times) == requestTotal and len(early) == 0,
+            "%d requests in %.3f s at %d/s with bursts of %d, %d too early" % (
+                len(times), elapsed, rate, burst, len(early)))
+
+
+def checkCache(server, callerCount=8):
+    """
+    Checks that cached stocks and days are not downloaded again, and that concurrent
+    requests for the same stock and day are downloaded once.
+
+    @type server: StandInServer, the server the requests are sent to
+    @type callerCount: int, the number of threads requesting the same stock and day at once
+    @rtype: tuple, (passed, detail)
+    """
+    fetcher = BulkFetcher(server.baseURL, requestsPerSecond=1000, burst=100)
+    keys = [("CACHE", "NASD", day) for day in range(5)]
+    fetcher.fetchAll(keys)
+    firstCount = server.requestCount("CACHE")
+    fetcher.fetchAll(keys + keys)
+    for key in keys:
+        fetcher.fetch(*key)
+    cachedCount = server.requestCount("CACHE") - firstCount
+
+    callers = [threading.Thread(target=fetcher.fetch, args=("SHARED", "NASD", 0)) for i in range(callerCount)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    fetcher.close()
+    sharedCount = server.requestCount("SHARED")
+    return (firstCount == len(keys) and cachedCount == 0 and sharedCount == 1,
+            "%d requests for %d days, %d once cached, %d for %d concurrent callers" % (
+                firstCount, len(keys), cachedCount, sharedCount, callerCount))
+
+
+# check name -> function checking the BulkFetcher against the stand-in server
+CHECKS = [
+    ("retries", checkRetries),
+    ("rate limit", checkRateLimit),
+    ("cache", checkCache),
+]
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Checks the BulkFetcher against a local stand-in server.")
+    parser.parse_args(arguments)
+
+    server = StandInServer({"FLAKY": 2, "DOWN": 1000})
+    failures = 0
+    try:
+        for name, check in CHECKS:
+            passed, detail = check(server)
+            sys.stdout.write("%-4s %-12s %s\n" % ("ok" if passed else "FAIL", name, detail))
+            if not passed:
+                failures += 1
+    finally:
+        server.stop()
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
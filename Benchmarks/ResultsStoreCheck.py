@@ -0,0 +1,126 @@
+"""
+Checks that the ResultsStore counts a simulated day once: refreshing the sketch on a complete
+day simulates and records it again, which must neither change the ranking of
+bestParameters() nor grow the store file, also after the store is reopened. A changed run of
+the same day replaces the earlier one.
+
+    python Benchmarks/ResultsStoreCheck.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SketchPaths
+SketchPaths.addSketchPaths()
+
+from Data import Data
+from Analysis import Analysis
+from ResultsStore import ResultsStore
+from SMACrossOver import SMACrossOver
+from SMACrossOverDelayed import SMACrossOverDelayed
+from Benchmark import syntheticStockData
+
+
+def refresh(tradingStrategy, results):
+    """
+    Simulates the day in Data from scratch and records it, as a refresh of Market.pyde does.
+
+    @type tradingStrategy: TradingStrategy, the strategy simulated
+    @type results: ResultsStore, the store the simulation is recorded in
+    @rtype: None
+    """
+    tradingStrategy.simulateNewCandleSticks(0)
+    Analysis.getInstance().postAnalysisCalculations()
+    results.recordSimulation(tradingStrategy)
+    results.flush()
+
+
+def checkRepeatedRefresh(path, refreshCount=5):
+    """
+    Checks that refreshing a complete day (refreshCount) times records it once.
+
+    @type path: str, the store file, new
+    @type refreshCount: int, the number of refreshes
+    @rtype: tuple, (passed, detail)
+    """
+    data = Data.getInstance()
+    data.timeDays = 1
+    data.popList(data.stockData)
+    data.stockData.extend(syntheticStockData(Data.DAY_LENGTH))
+    strategies = [SMACrossOver(), SMACrossOverDelayed()]
+
+    results = ResultsStore(path)
+    for tradingStrategy in strategies:
+        refresh(tradingStrategy, results)
+    firstBest = results.bestParameters()
+    firstSize = os.path.getsize(path)
+    for i in range(refreshCount - 1):
+        for tradingStrategy in strategies:
+            refresh(tradingStrategy, results)
+    best = results.bestParameters()
+    runCount = len(results)
+    size = os.path.getsize(path)
+    results.close()
+
+    reopened = ResultsStore(path)
+    reopenedBest = reopened.bestParameters()
+    reopened.close()
+    return (best == firstBest and reopenedBest == firstBest and runCount == len(strategies) and
+            size == firstSize and all([total[2] == 1 for total in best]),
+            "%d refreshes of %d strategies: %d runs, %d bytes after the first refresh, %d after the last" % (
+                refreshCount, len(strategies), runCount, firstSize, size))
+
+
+def checkChangedRun(path):
+    """
+    Checks that a changed run of the same day replaces the earlier one, also when reopened.
+
+    @type path: str, the store file, new
+    @rtype: tuple, (passed, detail)
+    """
+    results = ResultsStore(path)
+    results.recordRun("AAPL", "NASD", "SMA Crossover", {"short": 15}, 20130514, 390, 10, -100.0,
+                      99900.0, 100.0, 0)
+    results.recordRun("AAPL", "NASD", "SMA Crossover", {"short": 15}, 20130514, 390, 12, 50.0,
+                      100050.0, 120.0, 0)
+    best = results.bestParameters()
+    results.close()
+    reopened = ResultsStore(path)
+    reopenedBest = reopened.bestParameters()
+    runCount = len(reopened)
+    reopened.close()
+    return (best == [({"short": 15}, 50.0, 1)] and reopenedBest == best and runCount == 1,
+            "%d run after a changed run of the same day, P/L $%.2f" % (runCount, reopenedBest[0][1]))
+
+
+# check name -> function checking a ResultsStore on a new store file
+CHECKS = [
+    ("refresh", checkRepeatedRefresh),
+    ("changed run", checkChangedRun),
+]
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Checks that the ResultsStore counts a day once.")
+    parser.parse_args(arguments)
+
+    directory = tempfile.mkdtemp()
+    failures = 0
+    try:
+        for checkNumber, (name, check) in enumerate(CHECKS):
+            path = os.path.join(directory, "results" + str(checkNumber) + ".store")
+            passed, detail = check(path)
+            sys.stdout.write("%-4s %-12s %s\n" % ("ok" if passed else "FAIL", name, detail))
+            if not passed:
+                failures += 1
+            os.remove(path)
+    finally:
+        os.rmdir(directory)
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
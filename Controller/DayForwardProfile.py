@@ -33,7 +33,7 @@ class DayForwardProfile(ClickableProfile):
         """
         if self.data.timeDays > 0:
             self.data.timeDays -= 1
-            self.data.timeSinceRefresh = self.data.refreshFrequency - 1
+            self.data.requestRefresh()
         
     
     def setupScreenPosition(self, viewInstance):
@@ -34,7 +34,7 @@ class DayPreviousProfile(ClickableProfile):
         # Google finance maintains data of only the past 14 days
         if (self.data.timeDays <= 14):
             self.data.timeDays += 1
-            self.data.timeSinceRefresh = self.data.refreshFrequency - 1
+            self.data.requestRefresh()
     
     
     def setupScreenPosition(self, viewInstance):
@@ -35,8 +35,11 @@ class ModeProfile(ClickableProfile):
         
         @rtype: None
         """
+        if self.modeIndex == 1 and self.viewInstance.mode == 1:
+            # the History Screen switches between fills and round trips
+            self.viewInstance.showRoundTrips = 1 - self.viewInstance.showRoundTrips
         self.viewInstance.mode = self.modeIndex
-        self.data.setDataTimerToReset()
+        self.data.requestRefresh()
         
     
     def setupScreenPosition(self, viewInstance):
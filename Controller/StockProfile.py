@@ -36,7 +36,7 @@ class StockProfile(ClickableProfile):
         """
         self.data.ticker = self.title
         self.data.exchange = self.exchange
-        self.data.setDataTimerToReset()
+        self.data.requestRefresh()
         
     
     def setupScreenPosition(self, viewInstance):
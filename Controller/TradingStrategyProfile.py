@@ -39,7 +39,7 @@ class TradingStrategyProfile(ClickableProfile):
         analyzer = Analysis.getInstance()
         analyzer.strategy = self.strategyIndex
         data = Data.getInstance()
-        data.setDataTimerToReset()
+        data.requestRefresh()
         
     
     def setupScreenPosition(self, viewInstance):
@@ -0,0 +1,255 @@
+"""
+Runs one refresh cycle of the sketch without a window: refreshes the stock data (or parses a
+saved getprices response), runs the pre-analysis, the strategy and the post-analysis, and
+prints the resulting profit/loss. Drawing needs the Processing window and is skipped.
+
+    python Headless.py --strategy 1
+    python Headless.py --strategy 3 --response saved.txt --profile refresh
+
+With --profile, the cycle is captured by the Profiler into <prefix>.collapsed (flamegraph
+ready) and <prefix>.txt (hot function table).
+
+With --replay, the candlesticks are replayed through the live pipeline instead, at --speed
+times real time (0 for as fast as possible), and the throughput and latency are printed:
+
+    python Headless.py --strategy 1 --response saved.txt --replay --speed 0
+
+With --scan, the tickers of a universe file are scanned over a day instead, and the strongest
+signals of its last bar are printed:
+
+    python Headless.py --scan universe.txt --days 1
+
+With --publish, the live trades are also published on a local port, as by the sketch, and the
+publication metrics are printed at the end. Only a replay of the current day publishes: the
+cycle simulates the day at once, and none of its trades are live signals.
+
+    python Headless.py --strategy 1 --response saved.txt --replay --speed 60 --publish 5557
+
+With --robustness, the trades and candlesticks of the cycle are also resampled into that many
+synthetic paths, and the trade bootstrap and block bootstrap reports are printed:
+
+    python Headless.py --strategy 1 --response saved.txt --robustness 5000 --seed 1
+
+With --walkforward, the crossover rules are optimized walk-forward over that many days of the
+stock tracked in Data instead, and every fold and the stitched out-of-sample profit/loss are
+printed:
+
+    python Headless.py --walkforward 14
+"""
+
+import argparse
+import sys
+
+import SketchPaths
+SketchPaths.addSketchPaths()
+
+from Data import Data
+from Analysis import Analysis
+from Profiler import Profiler
+from SimpleMomentum import SimpleMomentum
+from SMACrossOver import SMACrossOver
+from SMACrossOverDelayed import SMACrossOverDelayed
+from RuleStrategy import RuleStrategy, CROSSOVER_RULES, CROSSOVER_NAME
+from BulkFetcher import BulkFetcher
+from UniverseScanner import UniverseScanner, loadUniverse
+from RoundTrips import RoundTripStatistics, matchRoundTrips
+from ReplayEngine import ReplayEngine
+from SignalPublisher import SignalPublisher
+from Robustness import Robustness
+from WalkForward import WalkForward
+
+
+def createStrategy(strategy):
+    """
+    Creates a trading strategy by its index in Analysis, as Market.pyde does.
+
+    @type strategy: int, the index of the strategy
+    @rtype: TradingStrategy
+    """
+    if strategy == 0:   return SimpleMomentum()
+    elif strategy == 1: return SMACrossOver()
+    elif strategy == 2: return SMACrossOverDelayed()
+    return RuleStrategy(CROSSOVER_RULES, CROSSOVER_NAME)
+
+
+def runCycle(tradingStrategy, responseText=None):
+    """
+    Runs one refresh cycle, as the draw loop of Market.pyde does on a refresh.
+
+    @type tradingStrategy: TradingStrategy, the strategy simulated
+    @type responseText: str, a saved getprices response, or None to download the stock data
+    @rtype: None
+    """
+    data = Data.getInstance()
+    analyzer = Analysis.getInstance()
+    if responseText == None:
+        data.refreshStockData()
+    else:
+        data.popList(data.stockData)
+        data.clearTrades()
+        data.stockData.extend(Data.parseStockData(responseText))
+    analyzer.preAnalysisCalculations()
+    tradingStrategy.simulateStrategy()
+    analyzer.postAnalysisCalculations()
+
+
+def runReplay(tradingStrategy, speed):
+    """
+    Replays the candlesticks in Data through the live pipeline and prints the throughput and
+    latency of the replay.
+
+    @type tradingStrategy: TradingStrategy, the strategy simulated
+    @type speed: float, the speed multiplier, 0 for as fast as possible
+    @rtype: None
+    """
+    replay = ReplayEngine(list(Data.getInstance().stockData), tradingStrategy,
+                          speed if speed > 0 else None)
+    report = replay.run()
+    sys.stdout.write("Replay: %d bars in %.3f s, %.0f bars/s, latency %.3f ms median, %.3f ms p99, "
+                     "%.3f ms max\n" % (report["bars"], report["seconds"], report["barsPerSecond"],
+                                         report["latencyMedian"] * 1000, report["latency99"] * 1000,
+                                         report["latencyMax"] * 1000))
+
+
+def printPublished():
+    """
+    Prints the publication metrics of the SignalPublisher.
+
+    @rtype: None
+    """
+    metrics = SignalPublisher.getInstance().metrics()
+    sys.stdout.write("Signals: %d published, %d sent in %d writes (largest %d), %d dropped, "
+                     "%d subscribers, latency %.3f ms median, %.3f ms p99\n" % (
+                         metrics["published"], metrics["sent"], metrics["batches"],
+                         metrics["maxBatch"], metrics["dropped"], metrics["subscribers"],
+                         metrics["latencyMedian"] * 1000, metrics["latency99"] * 1000))
+
+
+def runScan(universePath, timeDays):
+    """
+    Scans a day of a universe of stocks and prints the strongest signals of its last bar.
+
+    @type universePath: str, the universe config file
+    @type timeDays: int, the day, as number of days prior to current day
+    @rtype: None
+    """
+    scanner = UniverseScanner(loadUniverse(universePath))
+    scanner.scanDay(BulkFetcher(), timeDays)
+    sys.stdout.write("%d tickers, %d bars, %d signals on the last bar\n" % (
+        len(scanner.universe), scanner.barCount, len(scanner.signals)))
+    for signal in scanner.signals:
+        sys.stdout.write("%-6s %-5s %-5s %-30s %8.4f%% at $%.2f\n" % (
+            signal.ticker, signal.exchange, signal.positionType, signal.strategyName,
+            100 * signal.strength, signal.price))
+
+
+def runRobustness(pathCount, seed):
+    """
+    Resamples the trades and candlesticks of the cycle just run into synthetic paths and
+    prints the trade bootstrap and block bootstrap reports.
+
+    @type pathCount: int, the number of synthetic paths
+    @type seed: int, the seed of the random number generator, or None
+    @rtype: None
+    """
+    data = Data.getInstance()
+    robustness = Robustness(pathCount, seed)
+    robustness.decompose(data.stockData, data.journal.trades(), Analysis.getInstance().commission)
+    for report in [robustness.tradeBootstrap(), robustness.blockBootstrap()]:
+        sys.stdout.write(report.summary() + "\n")
+
+
+def runWalkForward(dayCount):
+    """
+    Runs the walk-forward optimization of the crossover rules over the last days of the stock
+    tracked in Data and prints every fold and the stitched out-of-sample profit/loss.
+
+    @type dayCount: int, the number of days to cover
+    @rtype: None
+    """
+    data = Data.getInstance()
+    fetcher = BulkFetcher()
+    try:
+        folds, stitchedCurve = WalkForward(fetcher=fetcher).run(data.ticker, data.exchange, dayCount)
+    finally:
+        fetcher.close()
+    for fold in folds:
+        parameters = ", ".join([name + "=" + str(fold.parameters[name]) for name in sorted(fold.parameters)])
+        sys.stdout.write("days %d-%d: %-30s in-sample P/L $%.2f, out-of-sample P/L $%.2f\n" % (
+            fold.inSampleDays[0], fold.outOfSampleDays[-1], parameters, fold.inSamplePL,
+            fold.outOfSamplePL))
+    sys.stdout.write("%s: %d folds, out-of-sample P/L $%.2f\n" % (
+        data.ticker, len(folds), stitchedCurve[-1] if len(stitchedCurve) > 0 else 0.0))
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description="Runs one refresh cycle without a window.")
+    parser.add_argument("--strategy", type=int, default=Analysis.getInstance().strategy,
+                        help="index of the strategy, as in Analysis")
+    parser.add_argument("--response", default=None, help="saved getprices response to parse")
+    parser.add_argument("--profile", default=None, metavar="PREFIX",
+                        help="profile the cycle, writing PREFIX.collapsed and PREFIX.txt")
+    parser.add_argument("--replay", action="store_true",
+                        help="replay the candlesticks through the live pipeline after the cycle")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="with --replay, the speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--scan", default=None, metavar="UNIVERSE",
+                        help="scan the tickers of a universe file instead of running a cycle")
+    parser.add_argument("--days", type=int, default=0,
+                        help="with --scan, the day scanned, as number of days prior to current day")
+    parser.add_argument("--publish", type=int, default=None, metavar="PORT",
+                        help="publish the trades on a local port, as the sketch does")
+    parser.add_argument("--robustness", type=int, default=None, metavar="PATHS",
+                        help="resample the cycle into PATHS synthetic paths and print the reports")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="with --robustness, the seed of the resampling, for reproducible reports")
+    parser.add_argument("--walkforward", type=int, default=None, metavar="DAYS",
+                        help="optimize the crossover rules walk-forward over DAYS days instead of "
+                             "running a cycle")
+    options = parser.parse_args(arguments)
+
+    if options.scan != None:
+        runScan(options.scan, options.days)
+        return 0
+    if options.walkforward != None:
+        runWalkForward(options.walkforward)
+        return 0
+
+    responseText = None
+    if options.response != None:
+        responseFile = open(options.response)
+        responseText = responseFile.read()
+        responseFile.close()
+    tradingStrategy = createStrategy(options.strategy)
+    if options.publish != None:
+        SignalPublisher.getInstance().start(options.publish)
+
+    profiler = Profiler.getInstance()
+    if options.profile != None:
+        profiler.arm(options.profile)
+        profiler.start()
+    runCycle(tradingStrategy, responseText)
+    if profiler.capturing == 1:
+        sys.stdout.write("Profile written to " + ", ".join(profiler.stop()) + "\n")
+
+    analyzer = Analysis.getInstance()
+    sys.stdout.write("%s: %d candlesticks, %d trades, P/L $%.2f\n" % (
+        tradingStrategy.strategyName, len(Data.getInstance().stockData),
+        Data.getInstance().journal.count, analyzer.PL))
+    statistics = RoundTripStatistics()
+    for roundTrip in matchRoundTrips(Data.getInstance().journal.trades(), Data.getInstance().stockData,
+                                     analyzer.commission):
+        statistics.add(roundTrip)
+    sys.stdout.write("%d round trips, %.1f%% winners, average held %.1f minutes\n" % (
+        statistics.count, 100 * statistics.winRate(), statistics.averageHoldingTime()))
+    if options.robustness != None:
+        runRobustness(options.robustness, options.seed)
+    if options.replay:
+        runReplay(tradingStrategy, options.speed)
+    if options.publish != None:
+        printPublished()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
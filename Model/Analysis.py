@@ -1,4 +1,5 @@
 from Data import Data
+from RiskEngine import RiskEngine
 
 class Analysis():
     """
@@ -21,12 +22,17 @@ class Analysis():
         return Analysis._instance
     
     
-    def __init__ (self):
+    def __init__ (self, data=None):
         """
-        Initializes a new Analysis object. Singleton, should only be called by getInstance().
+        Initializes a new Analysis object. Singleton, should only be called by getInstance(),
+        except for the account of a SessionContext.
 
+        @type data: Data, the candlesticks the account trades on, defaults to the Data singleton
         @rtype: None
         """
+        if data == None:
+            data = Data.getInstance()
+        self.data = data                       # the candlesticks the account trades on
         self.cashInitial = 100000              # starting cash ($)
         self.cash = self.cashInitial           # 'current' cash variable throughout simulation ($)
     
@@ -38,9 +44,14 @@ class Analysis():
         self.commissionTotal = 0               # total commission paid ($)
         self.cashUsed = 0                      # cash used in trades ($)
         self.PL = 0                            # profit/loss ($)
+        self.commissionSettled = 0             # commission already deducted from cash ($)
+        self.tradedPositionSize = None         # position ($) at trade prices, kept while
+                                               # positionSize is marked to market
     
         self.maxLongPosition = self.cashInitial    # maximum long position allowed
         self.maxShortPosition = -self.cashInitial  # maximum short position possible
+        self.risk = RiskEngine(self)           # risk rules checked before every trade, including
+                                               # the maximum long and short positions
         
         self.strategy = 1                      # trading strategy used
         
@@ -53,48 +64,63 @@ class Analysis():
         """
         self.cash = self.cashInitial
         self.position = self.positionInitial
+        self.positionSize = 0
         self.commissionTotal = 0
+        self.commissionSettled = 0
+        self.tradedPositionSize = None
+        self.risk.reset()
+        
+        
+    def resumeAnalysisCalculations(self):
+        """
+        Prepares to continue a trading simulation on new candlesticks, after
+        postAnalysisCalculations() has marked the position to market.
+
+        @rtype: None
+        """
+        if self.tradedPositionSize != None:
+            self.positionSize = self.tradedPositionSize
+            self.tradedPositionSize = None
         
         
     def postAnalysisCalculations(self):
         """
-        Makes the calculations and sets statistics following a trading simulation.
+        Makes the calculations and sets statistics following a trading simulation. Only the
+        commission not yet deducted is deducted from the cash, so that the statistics can be
+        recalculated after the simulation is continued on new candlesticks.
 
         @rtype: None
         """
-        data = Data.getInstance()
+        data = self.data
+        if self.tradedPositionSize == None:
+            self.tradedPositionSize = self.positionSize
         self.positionSize = self.position * data.stockData[len(data.stockData) - 1][1]
-        self.cash = self.cash - self.commissionTotal
+        self.cash = self.cash - (self.commissionTotal - self.commissionSettled)
+        self.commissionSettled = self.commissionTotal
         self.PL = self.cash - self.cashInitial + self.positionSize
         
         
     def checkShortIsInLimits(self, currentPositionInCash, candleStickCount, additionalPositionInShares):
         """
         Checks whether, following a potential new short position, the total cash position of the shorted
-        shares is within the predefined limits.
+        shares is within the predefined limits and the rules of the risk engine.
 
         @type currentPositionInCash: float, the current amount of shares owned in terms of cash
         @type candleStickCount: int, the candlestick on which the current analysis is being run
         @type additionalPositionInShares: int, the amount of additional shares which would be added
-        @rtype: None
+        @rtype: int, 1 for true and 0 for false
         """
-        data = Data.getInstance()
-        if currentPositionInCash - additionalPositionInShares * data.stockData[candleStickCount][1] < self.maxShortPosition:
-            return 0
-        return 1
+        return self.risk.allowShort(currentPositionInCash, candleStickCount, additionalPositionInShares)
     
     
     def checkLongIsInLimits(self, currentPositionInCash, candleStickCount, additionalPositionInShares):
         """
         Checks whether, following a potential new long position, the total cash position of the shorted
-        shares is within the predefined limits.
+        shares is within the predefined limits and the rules of the risk engine.
 
         @type currentPositionInCash: float, the current amount of shares owned in terms of cash
         @type candleStickCount: int, the candlestick on which the current analysis is being run
         @type additionalPositionInShares: int, the amount of additional shares which would be added
-        @rtype: None
+        @rtype: int, 1 for true and 0 for false
         """
-        data = Data.getInstance()
-        if currentPositionInCash + additionalPositionInShares * data.stockData[candleStickCount][1] > self.maxLongPosition:
-            return 0
-        return 1
\ No newline at end of file
+        return self.risk.allowLong(currentPositionInCash, candleStickCount, additionalPositionInShares)
\ No newline at end of file
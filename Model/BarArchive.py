@@ -0,0 +1,343 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from BarParser import BarColumns
+
+# file layout: header, one entry per (ticker, exchange, day) (tag, names, block entry, then the
+# compressed block), then the block index and the trailer, written when the archive is closed
+MAGIC = b"MRBA"
+INDEX_MAGIC = b"MRBI"
+VERSION = 2
+_HEADER = struct.Struct("<4sH")             # magic, version
+_TRAILER = struct.Struct("<QI4s")           # index offset, number of blocks, index magic
+_INDEX_ENTRY = struct.Struct("<IQII")       # day, block offset, block length, candlestick count
+_BLOCK_ENTRY = struct.Struct("<III")        # day, block length, candlestick count
+_BLOCK_HEADER = struct.Struct("<IqI")       # candlestick count, first time, ticks per price unit
+_BLOCK_TAG = b"B"
+
+
+def dayKey(timestamp, timezoneOffset=0):
+    """
+    Returns the day of a time in an exchange's timezone as an int, e.g. 20130514.
+
+    @type timestamp: float, seconds since the epoch (UTC)
+    @type timezoneOffset: int, the exchange's offset from UTC in minutes, e.g. -240
+    @rtype: int, the day as YYYYMMDD
+    """
+    day = time.gmtime(timestamp + timezoneOffset * 60)
+    return day.tm_year * 10000 + day.tm_mon * 100 + day.tm_mday
+
+
+def encodeBlock(bars, tickScale):
+    """
+    Encodes the candlesticks of a day: times as deltas from the previous candlestick, prices
+    as integer ticks delta-encoded per column, volumes as integers, all compressed with zlib.
+    Helper.
+
+    @type bars: list, the candlesticks, organized like Data.stockData
+    @type tickScale: int, the number of ticks per price unit, e.g. 10000 for 0.0001
+    @rtype: str, the compressed block
+    """
+    count = len(bars)
+    times = [int(round(bar[0])) for bar in bars]
+    firstTime = times[0] if count > 0 else 0
+    parts = [_BLOCK_HEADER.pack(count, firstTime, tickScale),
+             struct.pack("<%di" % count, *[0] + [times[i] - times[i - 1] for i in range(1, count)])]
+    for column in [1, 2, 3, 4]:
+        ticks = [int(round(bar[column] * tickScale)) for bar in bars]
+        parts.append(struct.pack("<%di" % count, *[ticks[i] - (ticks[i - 1] if i > 0 else 0)
+                                                    for i in range(count)]))
+    parts.append(struct.pack("<%dq" % count, *[int(bar[5]) for bar in bars]))
+    return zlib.compress(b"".join(parts), 6)
+
+
+def decodeBlock(block):
+    """
+    Decodes a block written by encodeBlock(). Helper.
+
+    @type block: str, the compressed block
+    @rtype: BarColumns, the candlesticks of the block
+    """
+    payload = zlib.decompress(block)
+    count, firstTime, tickScale = _BLOCK_HEADER.unpack_from(payload, 0)
+    offset = _BLOCK_HEADER.size
+    columns = BarColumns()
+
+    deltas = struct.unpack_from("<%di" % count, payload, offset)
+    offset += 4 * count
+    current = firstTime
+    for delta in deltas:
+        current += delta
+        columns.times.append(float(current))
+
+    scale = float(tickScale)
+    for column in [columns.close, columns.high, columns.low, columns.open]:
+        deltas = struct.unpack_from("<%di" % count, payload, offset)
+        offset += 4 * count
+        ticks = 0
+        for delta in deltas:
+            ticks += delta
+            column.append(ticks / scale)
+    columns.volume.extend(map(float, struct.unpack_from("<%dq" % count, payload, offset)))
+    return columns
+
+
+class BarArchive():
+    """
+    Reader of a compressed columnar archive of minute candlesticks. The block index at the
+    end of the file is read when the archive is opened; loading a day then reads and
+    decompresses only that day's block, however large the archive. An archive that was not
+    closed, e.g. after a crash, has no block index, and its blocks are scanned instead.
+    Thread safe.
+
+    Archives are written with BarArchiveWriter.
+    """
+
+    def __init__(self, path):
+        """
+        Opens an archive and reads its block index.
+
+        @type path: str, the archive file
+        @rtype: None
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self.index = _readIndex(self._file)[0]  # (ticker, exchange, day) -> (offset, length, count)
+        self._lock = threading.Lock()
+
+
+    def days(self, ticker, exchange):
+        """
+        Returns the days archived for a stock.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @rtype: list, of days as YYYYMMDD, oldest first
+        """
+        with self._lock:
+            return sorted([key[2] for key in self.index if key[0] == ticker and key[1] == exchange])
+
+
+    def readColumns(self, ticker, exchange, day):
+        """
+        Reads the candlesticks of a stock on a day.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type day: int, the day as YYYYMMDD
+        @rtype: BarColumns, the candlesticks, or None if the day is not archived
+        """
+        with self._lock:
+            if (ticker, exchange, day) not in self.index:
+                return None
+            offset, length, count = self.index[(ticker, exchange, day)]
+            self._file.seek(offset)
+            block = self._file.read(length)
+        return decodeBlock(block)
+
+
+    def readDay(self, ticker, exchange, day):
+        """
+        Reads the candlesticks of a stock on a day as rows organized like Data.stockData.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type day: int, the day as YYYYMMDD
+        @rtype: list, the candlesticks, or None if the day is not archived
+        """
+        columns = self.readColumns(ticker, exchange, day)
+        if columns == None:
+            return None
+        return columns.rows()
+
+
+    def close(self):
+        """
+        Closes the archive file.
+
+        @rtype: None
+        """
+        self._file.close()
+
+
+class BarArchiveWriter(BarArchive):
+    """
+    Writer of a compressed columnar archive of minute candlesticks, which can also read the
+    days it holds. Days are appended to an existing archive; writing a day that is already
+    archived replaces it in the index (the old block stays in the file until the archive is
+    rewritten). Every day is flushed to the file as it is added, and names its stock and day,
+    so the days written before a crash are found again by scanning the blocks.
+    """
+
+    def __init__(self, path, tickScale=10000):
+        """
+        Opens an archive for appending, creating it if it does not exist.
+
+        @type path: str, the archive file
+        @type tickScale: int, the number of ticks per price unit, e.g. 10000 for 0.0001
+        @rtype: None
+        """
+        self.path = path
+        self.tickScale = tickScale
+        self._lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._file = open(path, "r+b")
+            self.index, appendOffset = _readIndex(self._file)
+            self._file.seek(appendOffset)
+            self._file.truncate()
+        else:
+            self._file = open(path, "w+b")
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+            self.index = {}
+
+
+    def addDay(self, ticker, exchange, day, bars):
+        """
+        Appends the candlesticks of a stock on a day.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type day: int, the day as YYYYMMDD, see dayKey()
+        @type bars: list, the candlesticks, organized like Data.stockData
+        @rtype: None
+        """
+        block = encodeBlock(bars, self.tickScale)
+        with self._lock:
+            self._file.seek(0, 2)
+            self._file.write(_BLOCK_TAG + _encodeNames(ticker, exchange) +
+                             _BLOCK_ENTRY.pack(day, len(block), len(bars)))
+            offset = self._file.tell()
+            self._file.write(block)
+            self._file.flush()
+            self.index[(ticker, exchange, day)] = (offset, len(block), len(bars))
+
+
+    def addColumns(self, ticker, exchange, columns):
+        """
+        Appends parsed candlesticks, one block per day in the exchange's timezone.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type columns: BarColumns, e.g. a parsed getprices response
+        @rtype: None
+        """
+        rows = columns.rows()
+        start = 0
+        for end in range(1, len(rows) + 1):
+            if end == len(rows) or dayKey(columns.localTime(end), 0) != dayKey(columns.localTime(start), 0):
+                self.addDay(ticker, exchange, dayKey(columns.localTime(start), 0), rows[start:end])
+                start = end
+
+
+    def close(self):
+        """
+        Writes the block index and closes the archive.
+
+        @rtype: None
+        """
+        with self._lock:
+            self._file.seek(0, 2)
+            indexOffset = self._file.tell()
+            self._file.write(INDEX_MAGIC)
+            for key in sorted(self.index):
+                ticker, exchange, day = key
+                self._file.write(_encodeNames(ticker, exchange) + _INDEX_ENTRY.pack(day, *self.index[key]))
+            self._file.write(_TRAILER.pack(indexOffset, len(self.index), INDEX_MAGIC))
+            self._file.close()
+
+
+def _encodeNames(ticker, exchange):
+    """
+    Returns the ticker and exchange names as length-prefixed UTF-8. Helper.
+
+    @rtype: str
+    """
+    parts = []
+    for name in [ticker, exchange]:
+        encoded = name.encode("utf-8")
+        parts.append(struct.pack("<H", len(encoded)) + encoded)
+    return b"".join(parts)
+
+
+def _decodeNames(contents, position):
+    """
+    Decodes the names written by _encodeNames() at a position. Helper.
+
+    @rtype: tuple, (ticker, exchange, position after the names), or None if cut short
+    """
+    names = []
+    for field in range(2):
+        if position + 2 > len(contents):
+            return None
+        length = struct.unpack_from("<H", contents, position)[0]
+        if position + 2 + length > len(contents):
+            return None
+        names.append(str(contents[position + 2:position + 2 + length].decode("utf-8")))
+        position += 2 + length
+    return names[0], names[1], position
+
+
+def _readIndex(archiveFile):
+    """
+    Reads the block index of an open archive, or rebuilds it by scanning the blocks if the
+    archive was not closed. Helper.
+
+    @rtype: tuple, (dict from (ticker, exchange, day) to (offset, length, count), the offset
+            new blocks are appended at)
+    """
+    archiveFile.seek(0, 2)
+    size = archiveFile.tell()
+    archiveFile.seek(0)
+    magic, version = _HEADER.unpack(archiveFile.read(_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise IOError("not a version " + str(VERSION) + " bar archive: " + str(archiveFile.name))
+    if size >= _HEADER.size + len(INDEX_MAGIC) + _TRAILER.size:
+        archiveFile.seek(-_TRAILER.size, 2)
+        indexOffset, blockCount, indexMagic = _TRAILER.unpack(archiveFile.read(_TRAILER.size))
+        if indexMagic == INDEX_MAGIC and indexOffset < size:
+            archiveFile.seek(indexOffset)
+            indexBytes = archiveFile.read(size - _TRAILER.size - indexOffset)
+            if indexBytes[:len(INDEX_MAGIC)] == INDEX_MAGIC:
+                index = {}
+                position = len(INDEX_MAGIC)
+                for blockNumber in range(blockCount):
+                    ticker, exchange, position = _decodeNames(indexBytes, position)
+                    day, offset, length, count = _INDEX_ENTRY.unpack_from(indexBytes, position)
+                    position += _INDEX_ENTRY.size
+                    index[(ticker, exchange, day)] = (offset, length, count)
+                return index, indexOffset
+    return _scanBlocks(archiveFile, size)
+
+
+def _scanBlocks(archiveFile, size):
+    """
+    Rebuilds the block index of an archive that was not closed by reading the entry of every
+    block, stopping at a block cut short by a crash. Helper.
+
+    @rtype: tuple, (dict from (ticker, exchange, day) to (offset, length, count), the end of
+            the last complete block)
+    """
+    index = {}
+    position = _HEADER.size
+    while position < size:
+        archiveFile.seek(position)
+        if archiveFile.read(1) != _BLOCK_TAG:
+            break
+        names = []
+        for field in range(2):
+            lengthBytes = archiveFile.read(2)
+            if len(lengthBytes) < 2:
+                break
+            names.append(str(archiveFile.read(struct.unpack("<H", lengthBytes)[0]).decode("utf-8")))
+        entry = archiveFile.read(_BLOCK_ENTRY.size)
+        if len(names) < 2 or len(entry) < _BLOCK_ENTRY.size:
+            break
+        day, length, count = _BLOCK_ENTRY.unpack(entry)
+        offset = archiveFile.tell()
+        if offset + length > size:
+            break
+        index[(names[0], names[1], day)] = (offset, length, count)
+        position = offset + length
+    return index, position
@@ -0,0 +1,211 @@
+from array import array
+
+# the columns of a candlestick, in the order of Data.stockData
+COLUMNS = ["DATE", "CLOSE", "HIGH", "LOW", "OPEN", "VOLUME"]
+
+
+class BarColumns():
+    """
+    Holds parsed candlesticks as typed columns: one array of doubles per column, instead of a
+    list of floats per candlestick. Times are resolved to seconds since the epoch (UTC).
+    """
+
+    def __init__(self):
+        """
+        Initializes new, empty BarColumns.
+
+        @rtype: None
+        """
+        self.times = array('d')         # time of each candlestick (seconds since the epoch, UTC)
+        self.close = array('d')
+        self.high = array('d')
+        self.low = array('d')
+        self.open = array('d')
+        self.volume = array('d')
+        self.timezoneOffsets = []       # (first candlestick #, offset from UTC in minutes), in order
+
+
+    def __len__(self):
+        return len(self.times)
+
+
+    def localTime(self, index):
+        """
+        Returns the time of a candlestick in the exchange's timezone.
+
+        @type index: int, the candlestick #
+        @rtype: float, seconds since the epoch, shifted by the timezone offset
+        """
+        offset = 0
+        for start, minutes in self.timezoneOffsets:
+            if start > index:
+                break
+            offset = minutes
+        return self.times[index] + offset * 60
+
+
+    def rows(self, start=0, stop=None):
+        """
+        Returns candlesticks as rows organized like Data.stockData.
+
+        @type start: int, the first candlestick #
+        @type stop: int, the candlestick # after the last, or None for the end
+        @rtype: list, of [date, close, high, low, open, volume]
+        """
+        if stop == None or stop > len(self.times):
+            stop = len(self.times)
+        return [[self.times[i], self.close[i], self.high[i], self.low[i], self.open[i], self.volume[i]]
+                for i in range(start, stop)]
+
+
+class BarParser():
+    """
+    Streaming parser of the getprices response format: header lines (INTERVAL=60,
+    COLUMNS=DATE,CLOSE,..., TIMEZONE_OFFSET=-240, ...) followed by one line per candlestick,
+    whose date is either absolute ("a1368538200", seconds since the epoch) or an offset in
+    intervals from the last absolute date ("15").
+
+    The response is fed in chunks as it arrives. The complete lines of a chunk are parsed in
+    one batch: the fields of every line are split at once and each column is converted with
+    a single map() straight into its array, so no list is built per candlestick.
+    """
+
+    def __init__(self, columns=None):
+        """
+        Initializes a new BarParser.
+
+        @type columns: BarColumns, the columns parsed candlesticks are appended to, or None for new ones
+        @rtype: None
+        """
+        if columns == None:
+            columns = BarColumns()
+        self.columns = columns
+        self.interval = 60              # seconds between two candlesticks, from INTERVAL=
+        self.fieldNames = list(COLUMNS) # fields of a line, in order, from COLUMNS=
+        self._baseTime = 0              # the last absolute date (seconds since the epoch)
+        self._remainder = ""            # incomplete last line of the previous chunk
+        self.byteCount = 0              # number of bytes fed
+
+
+    def feed(self, chunk):
+        """
+        Parses a chunk of the response. A line cut at the end of the chunk is kept until the
+        next chunk.
+
+        @type chunk: str, the next bytes of the response
+        @rtype: None
+        """
+        self.byteCount += len(chunk)
+        text = self._remainder + chunk
+        end = text.rfind("\n")
+        if end < 0:
+            self._remainder = text
+            return
+        self._remainder = text[end + 1:]
+        self._parseLines(text[:end].split("\n"))
+
+
+    def close(self):
+        """
+        Parses the rest of the response, once every chunk has been fed.
+
+        @rtype: BarColumns, the parsed candlesticks
+        """
+        if self._remainder != "":
+            self._parseLines([self._remainder])
+            self._remainder = ""
+        return self.columns
+
+
+    def parse(self, responseText):
+        """
+        Parses a whole response.
+
+        @type responseText: str, the body of the response
+        @rtype: BarColumns, the parsed candlesticks
+        """
+        self.feed(responseText)
+        return self.close()
+
+
+    def parseStream(self, stream, chunkSize=65536):
+        """
+        Parses a response read incrementally from a file-like object, e.g. an HTTP response
+        or an archived download.
+
+        @type stream: file-like object with read(size)
+        @type chunkSize: int, the number of bytes read at once
+        @rtype: BarColumns, the parsed candlesticks
+        """
+        while True:
+            chunk = stream.read(chunkSize)
+            if not chunk:
+                return self.close()
+            self.feed(chunk)
+
+
+    def _parseLines(self, lines):
+        """
+        Parses complete lines, batching runs of candlestick lines between header lines.
+        Helper.
+
+        @rtype: None
+        """
+        batch = []
+        for line in lines:
+            line = line.strip()
+            if line == "":
+                continue
+            first = line[0]
+            if first.isdigit() or (first == "a" and line[1:2].isdigit()):
+                batch.append(line)
+                continue
+            if len(batch) > 0:
+                self._parseBatch(batch)
+                batch = []
+            self._parseHeader(line)
+        if len(batch) > 0:
+            self._parseBatch(batch)
+
+
+    def _parseHeader(self, line):
+        name, separator, value = line.partition("=")
+        if name == "INTERVAL":
+            self.interval = int(value)
+        elif name == "COLUMNS":
+            self.fieldNames = value.split(",")
+        elif name == "TIMEZONE_OFFSET":
+            self.columns.timezoneOffsets.append((len(self.columns.times), int(value)))
+
+
+    def _parseBatch(self, lines):
+        """
+        Parses candlestick lines into the columns. Helper.
+
+        @rtype: None
+        """
+        fieldCount = len(self.fieldNames)
+        fields = ",".join(lines).split(",")
+        if len(fields) != fieldCount * len(lines):
+            raise ValueError("getprices lines do not have " + str(fieldCount) + " fields: " + lines[0])
+
+        # resolve the dates, absolute or offset from the last absolute date
+        times = []
+        baseTime = self._baseTime
+        interval = self.interval
+        for date in fields[self.fieldNames.index("DATE")::fieldCount]:
+            if date[0] == "a":
+                baseTime = int(date[1:])
+                times.append(baseTime)
+            else:
+                times.append(baseTime + int(date) * interval)
+        self._baseTime = baseTime
+        self.columns.times.extend(map(float, times))
+
+        for name, column in [("CLOSE", self.columns.close), ("HIGH", self.columns.high),
+                             ("LOW", self.columns.low), ("OPEN", self.columns.open),
+                             ("VOLUME", self.columns.volume)]:
+            if name in self.fieldNames:
+                column.extend(map(float, fields[self.fieldNames.index(name)::fieldCount]))
+            else:
+                column.extend([0.0] * len(lines))
@@ -0,0 +1,309 @@
+import httplib
+import random
+import socket
+import threading
+import time
+import urlparse
+from Clock import monotonicTime
+from Data import Data
+from Instrumentation import Instrumentation
+from WorkerPool import runInParallel
+
+# HTTP statuses worth retrying: rate limited, or a temporary failure of the server
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class FetchError(Exception):
+    """
+    Raised when a download fails for good, after its retries.
+    """
+    pass
+
+
+class TokenBucket():
+    """
+    Rate limiter allowing (rate) requests per second on average, with bursts of up to (burst)
+    requests. Thread safe.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Initializes a new TokenBucket, full.
+
+        @type rate: float, the number of requests allowed per second
+        @type burst: int, the maximum number of requests allowed at once
+        @rtype: None
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = monotonicTime()
+        self.lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        Waits until a request is allowed, and takes its token.
+
+        @rtype: None
+        """
+        while True:
+            with self.lock:
+                now = monotonicTime()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ConnectionPool():
+    """
+    Pool of keep-alive HTTP connections to one host, so that consecutive downloads reuse a
+    connection instead of opening a new one. Thread safe.
+    """
+
+    def __init__(self, scheme, host, size, timeout):
+        """
+        Initializes a new ConnectionPool.
+
+        @type scheme: str, "http" or "https"
+        @type host: str, the host and optional port, e.g. "127.0.0.1:8000"
+        @type size: int, the maximum number of connections open at once
+        @type timeout: float, the socket timeout of every connection (seconds)
+        @rtype: None
+        """
+        self.scheme = scheme
+        self.host = host
+        self.timeout = timeout
+        self.idle = []                          # open connections not in use
+        self.slots = threading.Semaphore(size)  # bounds the connections in use
+        self.lock = threading.Lock()
+
+
+    def acquire(self):
+        """
+        Returns an idle connection, or a new one, waiting while (size) connections are in use.
+
+        @rtype: httplib.HTTPConnection
+        """
+        self.slots.acquire()
+        with self.lock:
+            if len(self.idle) > 0:
+                return self.idle.pop()
+        if self.scheme == "https":
+            return httplib.HTTPSConnection(self.host, timeout=self.timeout)
+        return httplib.HTTPConnection(self.host, timeout=self.timeout)
+
+
+    def release(self, connection, reusable):
+        """
+        Returns a connection to the pool.
+
+        @type connection: httplib.HTTPConnection, a connection from acquire()
+        @type reusable: bool, whether the connection can be used again, false after an error
+        @rtype: None
+        """
+        if reusable:
+            with self.lock:
+                self.idle.append(connection)
+        else:
+            connection.close()
+        self.slots.release()
+
+
+    def close(self):
+        """
+        Closes the idle connections.
+
+        @rtype: None
+        """
+        with self.lock:
+            for connection in self.idle:
+                connection.close()
+            self.idle = []
+
+
+class BulkFetcher():
+    """
+    Class responsible for downloading the candlesticks of many stocks and days concurrently.
+    Downloads run on a bounded pool of worker threads over pooled keep-alive connections, with
+    a timeout, retries with exponential backoff and jitter, and a rate limit per host. The
+    downloaded candlesticks are cached by (ticker, exchange, day).
+
+    The base URL is configurable, e.g. to fetch from a local stand-in server:
+        BulkFetcher(baseURL="http://127.0.0.1:8000")
+    as Benchmarks/FetchCheck.py does to check the retries, rate limit and cache.
+    """
+
+    def __init__(self, baseURL=Data.BASE_URL, workerCount=8, connectionsPerHost=4, timeout=10,
+                 retries=4, backoffBase=0.5, backoffMax=8, requestsPerSecond=10, burst=5):
+        """
+        Initializes a new BulkFetcher.
+
+        @type baseURL: str, the scheme and host the candlesticks are downloaded from
+        @type workerCount: int, the number of downloads run in parallel
+        @type connectionsPerHost: int, the number of connections open at once per host
+        @type timeout: float, the socket timeout of a download (seconds)
+        @type retries: int, the number of retries of a failed download
+        @type backoffBase: float, the wait before the first retry (seconds), doubled every retry
+        @type backoffMax: float, the maximum wait between two retries (seconds)
+        @type requestsPerSecond: float, the number of requests allowed per second per host
+        @type burst: int, the number of requests allowed at once per host
+        @rtype: None
+        """
+        self.baseURL = baseURL
+        self.workerCount = workerCount
+        self.connectionsPerHost = connectionsPerHost
+        self.timeout = timeout
+        self.retries = retries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+        self.requestsPerSecond = requestsPerSecond
+        self.burst = burst
+
+        self.cache = {}             # (ticker, exchange, day) -> candlesticks
+        self._pools = {}            # (scheme, host) -> ConnectionPool
+        self._buckets = {}          # host -> TokenBucket
+        self._keyLocks = {}         # (ticker, exchange, day) -> lock, one download per key
+        self._lock = threading.Lock()
+        self._random = random.Random()
+
+
+    def fetch(self, ticker, exchange, timeDays):
+        """
+        Returns the candlesticks of a stock on a day, downloading them if they are neither
+        cached nor archived (see Data.openArchive()). Concurrent calls for the same key wait
+        for the first one instead of downloading the key again.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type timeDays: int, the day, as number of days prior to current day
+        @rtype: list, the candlesticks of the day, organized like Data.stockData
+        """
+        key = (ticker, exchange, timeDays)
+        if key not in self.cache:
+            with self._keyLock(key):
+                if key not in self.cache:
+                    stockData = Data.archivedDay(ticker, exchange, timeDays)
+                    if stockData == None:
+                        responseText = self.download(Data.stockDataURL(ticker, exchange, timeDays,
+                                                                       self.baseURL))
+                        stockData = Data.parseStockData(responseText)
+                        Data.archiveDay(ticker, exchange, timeDays, stockData)
+                    self.cache[key] = stockData
+        return self.cache[key]
+
+
+    def fetchAll(self, requests):
+        """
+        Downloads the candlesticks of many stocks and days in parallel, into the cache, on a
+        pool of (workerCount) threads (see WorkerPool.runInParallel()).
+
+        @type requests: list, of (ticker, exchange, day) tuples
+        @rtype: dict, (ticker, exchange, day) -> FetchError, for every download that failed
+        """
+        errors = {}
+
+        def fetchKey(key):
+            try:
+                self.fetch(*key)
+            except FetchError as error:
+                errors[key] = error
+
+        runInParallel(fetchKey, [key for key in requests if key not in self.cache], self.workerCount)
+        return errors
+
+
+    def warmCache(self, tickers, exchange, dayCount):
+        """
+        Downloads the last (dayCount) days of every ticker into the cache.
+
+        @type tickers: list, of stock ticker names
+        @type exchange: str, stock exchange name
+        @type dayCount: int, the number of days per ticker
+        @rtype: dict, (ticker, exchange, day) -> FetchError, for every download that failed
+        """
+        return self.fetchAll([(ticker, exchange, day) for ticker in tickers for day in range(dayCount)])
+
+
+    def download(self, url):
+        """
+        Downloads the body of a URL, retrying timeouts, connection errors and temporary
+        server errors with exponential backoff.
+
+        @type url: str, the URL to download
+        @rtype: str, the body of the response
+        """
+        parts = urlparse.urlsplit(url)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        pool = self._pool(parts.scheme, parts.netloc)
+        bucket = self._bucket(parts.netloc)
+
+        attempt = 0
+        while True:
+            bucket.acquire()
+            connection = pool.acquire()
+            reusable = False
+            try:
+                connection.request("GET", path, headers={"Connection": "keep-alive"})
+                response = connection.getresponse()
+                body = response.read()
+                reusable = not response.will_close
+                status = response.status
+            except (socket.error, httplib.HTTPException) as error:
+                status, body = None, str(error)
+            finally:
+                pool.release(connection, reusable)
+
+            if status == 200:
+                Instrumentation.getInstance().count("fetchBytes", len(body))
+                return body
+            if (status != None and status not in RETRY_STATUSES) or attempt >= self.retries:
+                raise FetchError(url + ": " + (str(status) if status != None else body))
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+
+    def close(self):
+        """
+        Closes the idle connections of every pool.
+
+        @rtype: None
+        """
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+
+
+    def _backoff(self, attempt):
+        """
+        Returns the wait before a retry: exponential, with full jitter so that workers failing
+        together do not retry together. Helper.
+
+        @rtype: float, seconds
+        """
+        return self._random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+
+
+    def _pool(self, scheme, host):
+        with self._lock:
+            if (scheme, host) not in self._pools:
+                self._pools[(scheme, host)] = ConnectionPool(scheme, host, self.connectionsPerHost, self.timeout)
+            return self._pools[(scheme, host)]
+
+
+    def _keyLock(self, key):
+        with self._lock:
+            if key not in self._keyLocks:
+                self._keyLocks[key] = threading.Lock()
+            return self._keyLocks[key]
+
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.requestsPerSecond, self.burst)
+            return self._buckets[host]
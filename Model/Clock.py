@@ -0,0 +1,20 @@
+import time
+
+try:
+    # Jython: the JVM's monotonic nanosecond clock
+    from java.lang import System
+
+    def monotonicTime():
+        """
+        Returns the time in seconds of a clock that never goes backwards, unlike time.time()
+        which follows changes of the system clock. Only differences between two calls are
+        meaningful.
+
+        @rtype: float
+        """
+        return System.nanoTime() / 1e9
+except ImportError:
+    if hasattr(time, "monotonic"):
+        monotonicTime = time.monotonic
+    else:
+        monotonicTime = time.time
@@ -1,4 +1,14 @@
+import time
 import urllib2
+from collections import deque
+from BarParser import BarParser
+from Instrumentation import Instrumentation
+from RefreshScheduler import RefreshScheduler
+from TradeJournal import TradeJournal
+from TimeIndex import TimeIndex
+from TimeIndex import DEFAULT_TIMEZONE_OFFSET
+from BarArchive import BarArchiveWriter
+from BarArchive import dayKey
 
 class Data():
     """
@@ -8,6 +18,27 @@ class Data():
     # Singleton instances of Data
     _instance = None
     
+    # the scheme and host the candlesticks are downloaded from
+    BASE_URL = "http://www.google.com"
+    
+    # socket timeout of a download (seconds)
+    TIMEOUT = 10
+    
+    # number of candlesticks in a trading day
+    DAY_LENGTH = 390
+    
+    # number of the most recent trades and trade signals kept in memory, older ones are only
+    # kept in the trade journal
+    TRADE_MEMORY = 1024
+    
+    # archive of the candlesticks of complete past days, shared by every Data and BulkFetcher,
+    # None to always download them, see openArchive()
+    archive = None
+    
+    # (exchange, today, timeDays) -> day the download of (timeDays) returned today, as
+    # YYYYMMDD, see archivedDay()
+    archiveDays = {}
+    
     @staticmethod
     def getInstance():
         """
@@ -22,13 +53,16 @@ class Data():
     
     def __init__(self):
         """
-        Initializes a new Data object. Singleton, should only be called by getInstance().
+        Initializes a new Data object. Singleton, should only be called by getInstance(),
+        except for the Data of a SessionContext.
 
         @rtype: None
         """
         self.stockData = []         # the dataset for a stock, represented as a list of ticks
-        self.tradeLog = []          # log of position entry/exit, time, and which methodology
-        self.tradeSignals = []      # marks by algorithm to signify long/short positions on chart,
+        self.tradeLog = deque(maxlen=Data.TRADE_MEMORY)
+                                    # log of position entry/exit, time, and which methodology
+        self.tradeSignals = deque(maxlen=Data.TRADE_MEMORY)
+                                    # marks by algorithm to signify long/short positions on chart,
                                     # stock data at each index organized in order: 
                                     # date, close, high, low, open, volume, cDays
                                     
@@ -37,21 +71,136 @@ class Data():
         self.timeDays = 0           # the day this data is from, expressed as number of days prior to
                                     # current day
                                     
-        # used for timing and refreshing the data
-        self.refreshFrequency = 300
-        self.timeSinceRefresh = self.refreshFrequency
-    
-    
-    def setDataTimerToReset(self):
-        self.timeSinceRefresh = 299
+        self.revision = 0           # incremented every time stockData is replaced rather than
+                                    # appended to
+        self._loadedStock = None    # (ticker, exchange, timeDays) of the candlesticks in stockData
+        self.journal = TradeJournal()
+                                    # every trade of the session, see recordTrade()
+        self._timeIndex = TimeIndex()
+                                    # stockData by time, see timeIndex()
+        
+        
+    def requestRefresh(self):
+        """
+        Requests a refresh of the data as soon as possible, e.g. after another stock or day
+        has been selected.
+        
+        @rtype: None
+        """
+        RefreshScheduler.getInstance().requestRefresh(self.ticker)
+        
+        
+    def openJournal(self, path):
+        """
+        Records the trades of the session in a journal file kept between sessions instead of
+        in a temporary file.
+        
+        @type path: str, the journal file
+        @rtype: None
+        """
+        self.journal.close()
+        self.journal = TradeJournal(path)
+        
+        
+    @staticmethod
+    def openArchive(path):
+        """
+        Keeps the candlesticks of complete past days in a bar archive: every such day
+        downloaded is written to the archive, and days already archived are read from it
+        instead of being downloaded again, see archivedDay(). The current day is always
+        downloaded.
+        
+        @type path: str, the archive file
+        @rtype: None
+        """
+        if Data.archive != None:
+            Data.archive.close()
+        Data.archive = BarArchiveWriter(path)
+        
+        
+    @staticmethod
+    def archivedDay(ticker, exchange, timeDays):
+        """
+        Returns the archived candlesticks of a stock on a past day. The archive is indexed by
+        date, and which date (timeDays) is depends on the exchange's holidays, so a day is
+        only read once a download of (timeDays) on the same exchange has returned its date
+        today; until then it is downloaded.
+        
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type timeDays: int, the day, as number of days prior to current day
+        @rtype: list, the candlesticks, organized like stockData, or None if not archived
+        """
+        if Data.archive == None or timeDays <= 0:
+            return None
+        day = Data.archiveDays.get((exchange, Data._today(), timeDays))
+        if day == None:
+            return None
+        return Data.archive.readDay(ticker, exchange, day)
+        
+        
+    @staticmethod
+    def archiveDay(ticker, exchange, timeDays, stockData):
+        """
+        Writes the downloaded candlesticks of a stock on a day to the archive, if the day is
+        a complete past day not archived yet, and notes the date of (timeDays) for
+        archivedDay().
+        
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type timeDays: int, the day, as number of days prior to current day
+        @type stockData: list, the candlesticks of the day, organized like stockData
+        @rtype: None
+        """
+        if Data.archive == None or timeDays <= 0 or len(stockData) < Data.DAY_LENGTH:
+            return
+        day = dayKey(stockData[0][0], DEFAULT_TIMEZONE_OFFSET)
+        Data.archiveDays[(exchange, Data._today(), timeDays)] = day
+        if (ticker, exchange, day) not in Data.archive.index:
+            Data.archive.addDay(ticker, exchange, day, stockData)
+        
+        
+    @staticmethod
+    def _today():
+        """
+        Returns the current date at the exchange. Helper.
+        
+        @rtype: int, the day as YYYYMMDD
+        """
+        return dayKey(time.time(), DEFAULT_TIMEZONE_OFFSET)
+        
+        
+    def recordTrade(self, trade):
+        """
+        Adds a trade to the trade log and to the trade journal.
+        
+        @type trade: list, the trade record, see TradingStrategy
+        @rtype: None
+        """
+        self.tradeLog.append(trade)
+        self.journal.record(trade)
         
         
-    def refreshAndReset(self):
-        data.refreshStockData()
-        analyzer.preAnalysisCalculations()
-        tradingStrategy.simulateStrategy()
-        analyzer.postAnalysisCalculations()
-        data.timeSinceRefresh = 0
+    def clearTrades(self):
+        """
+        Clears the trade log and signals before simulating from scratch, starting a new run
+        in the trade journal.
+        
+        @rtype: None
+        """
+        self.popList(self.tradeLog)
+        self.popList(self.tradeSignals)
+        self.journal.beginRun()
+        
+        
+    def timeIndex(self):
+        """
+        Returns the time index of stockData, brought up to date with its candlesticks.
+
+        @rtype: TimeIndex, to look up candlesticks by time
+        """
+        self._timeIndex.update(self.stockData)
+        return self._timeIndex
         
         
     def popList(self, ls): #pops everything in list
@@ -73,21 +222,135 @@ class Data():
         
         @rtype: None
         """
-        URL = str("http://www.google.com/finance/getprices?q=" + self.ticker + "&candleStickCount=" +\
-                   self.exchange + "&i=60&p=" + str(self.timeDays + 1) +\
-                    "d&f=d,c,v,k,o,h,l&df=cpct&auto=0&ei=Ef6XUYDfCqSTiAKEMg")
-        
         # Pop stockData, tradeLogs, and tradeSignals
         self.popList(self.stockData)
-        self.popList(self.tradeLog)       
-        self.popList(self.tradeSignals)
+        self.clearTrades()
+        
+        self.stockData.extend(Data.downloadStockData(self.ticker, self.exchange, self.timeDays))
+        self.revision += 1
+        self._loadedStock = (self.ticker, self.exchange, self.timeDays)
+        
+        
+    def pollStockData(self):
+        """
+        Downloads only the candlesticks after the last one held for the stock being tracked,
+        and appends them to stockData in place, leaving the trade log and signals of the
+        earlier candlesticks untouched. Falls back to refreshStockData() when there is nothing
+        to continue from: no candlesticks yet, another stock or day selected, or a past day.
+        
+        @rtype: int, the index of the first new candlestick, 0 if the data was replaced
+        """
+        if self._loadedStock != (self.ticker, self.exchange, self.timeDays) or \
+                len(self.stockData) == 0 or self.timeDays != 0:
+            self.refreshStockData()
+            return 0
+        if len(self.stockData) >= Data.DAY_LENGTH:
+            return len(self.stockData)
+        
+        lastTime = self.stockData[len(self.stockData) - 1][0]
+        columns = Data.downloadColumns(Data.stockDataURL(self.ticker, self.exchange, 0,
+                                                         startTime=lastTime))
+        firstNew = 0
+        while firstNew < len(columns) and columns.times[firstNew] <= lastTime:
+            firstNew += 1
+        return self.appendBars(columns.rows(firstNew))
+        
+        
+    def appendBars(self, bars):
+        """
+        Appends new candlesticks to stockData in place, up to the end of the trading day.
+        
+        @type bars: list, the new candlesticks, organized like stockData
+        @rtype: int, the index of the first appended candlestick
+        """
+        firstNew = len(self.stockData)
+        self.stockData.extend(bars[:max(0, Data.DAY_LENGTH - firstNew)])
+        return firstNew
+        
+        
+    @staticmethod
+    def stockDataURL(ticker, exchange, timeDays, baseURL=None, startTime=None):
+        """
+        Returns the URL of the minute candlesticks of a stock, from the given day to today.
+        
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type timeDays: int, the first day to download, as number of days prior to current day
+        @type baseURL: str, the scheme and host to download from, defaults to BASE_URL
+        @type startTime: float, if given, only candlesticks from this time on (seconds since
+                         the epoch) are downloaded
+        @rtype: str
+        """
+        if baseURL == None:
+            baseURL = Data.BASE_URL
+        url = str(baseURL + "/finance/getprices?q=" + ticker + "&x=" +\
+                  exchange + "&i=60&p=" + str(timeDays + 1) +\
+                   "d&f=d,c,v,k,o,h,l&df=cpct&auto=0&ei=Ef6XUYDfCqSTiAKEMg")
+        if startTime != None:
+            url += "&ts=" + str(int(startTime))
+        return url
+        
+        
+    @staticmethod
+    def downloadStockData(ticker, exchange, timeDays):
+        """
+        Downloads the minute candlesticks of a stock on a single day, without changing the
+        stock being tracked. Past days are read from the archive when it holds them, and
+        written to it once downloaded, see openArchive().
+        
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type timeDays: int, the day to download, as number of days prior to current day
+        @rtype: list, the candlesticks of the day, organized like stockData
+        """
+        stockData = Data.archivedDay(ticker, exchange, timeDays)
+        if stockData == None:
+            stockData = Data.stockDataRows(Data.downloadColumns(Data.stockDataURL(ticker, exchange, timeDays)))
+            Data.archiveDay(ticker, exchange, timeDays, stockData)
+        return stockData
+        
+        
+    @staticmethod
+    def downloadColumns(url):
+        """
+        Downloads a getprices response, parsing it as it arrives.
+        
+        @type url: str, the URL of the response
+        @rtype: BarColumns, the parsed candlesticks
+        """
+        response = urllib2.urlopen(url, timeout=Data.TIMEOUT)
+        parser = BarParser()
+        columns = parser.parseStream(response)
+        Instrumentation.getInstance().count("fetchBytes", parser.byteCount)
+        return columns
         
-        response = urllib2.urlopen(URL)
         
-        # Note: first 8 indices are other data
-        data2 = response.read().split()
-        for line in data2[8:398]:
-            self.stockData.append([float(t) for t in line.split(',') ])
+    @staticmethod
+    def parseStockData(responseText, candleStickLimit=390):
+        """
+        Parses the candlesticks out of a getprices response.
+        
+        @type responseText: str, the body of the response
+        @type candleStickLimit: int, the maximum number of candlesticks to parse, or None for all
+        @rtype: list, the candlesticks, organized like stockData
+        """
+        return Data.stockDataRows(BarParser().parse(responseText), candleStickLimit)
+        
+        
+    @staticmethod
+    def stockDataRows(columns, candleStickLimit=390):
+        """
+        Returns the candlesticks of parsed columns as rows organized like stockData. The
+        opening candlestick of the response (its first absolute date) is skipped, so that a
+        day has candlesticks 0 to 389 and closes at candlestick 389.
+        
+        @type columns: BarColumns, the parsed response
+        @type candleStickLimit: int, the maximum number of candlesticks, or None for all
+        @rtype: list, the candlesticks, organized like stockData
+        """
+        if candleStickLimit == None:
+            return columns.rows(1)
+        return columns.rows(1, 1 + candleStickLimit)
             
         
     def minLowInData(self):
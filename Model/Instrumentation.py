@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque
+from Clock import monotonicTime
+
+class FrameTimeHistogram():
+    """
+    Rolling record of the most recent frame times, from which percentiles are read.
+    """
+
+    def __init__(self, frameCount=600):
+        """
+        Initializes a new FrameTimeHistogram.
+
+        @type frameCount: int, the number of most recent frames kept
+        @rtype: None
+        """
+        self.frameTimes = deque(maxlen=frameCount)
+
+
+    def add(self, seconds):
+        """
+        Records the time of a frame.
+
+        @type seconds: float, the duration of the frame
+        @rtype: None
+        """
+        self.frameTimes.append(seconds)
+
+
+    def percentiles(self, percents):
+        """
+        Returns percentiles of the recorded frame times.
+
+        @type percents: list, of percentiles between 0 and 100, e.g. [50, 95, 99]
+        @rtype: list, of frame times in seconds, one per percentile
+        """
+        if len(self.frameTimes) == 0:
+            return [0.0 for percent in percents]
+        ordered = sorted(self.frameTimes)
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))] for percent in percents]
+
+
+class _StageTimer():
+    """
+    Context manager timing one stage with the monotonic clock. Helper.
+    """
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = monotonicTime()
+        return self
+
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.instrumentation.recordStage(self.name, monotonicTime() - self.start)
+        return False
+
+
+class Instrumentation():
+    """
+    Class responsible for always-on timing of the stages of the draw loop (refresh, analysis,
+    simulation and drawing), the frame time distribution, and counters such as bytes fetched,
+    candlesticks processed and trades emitted. A summary is drawn as an optional overlay by
+    the View and periodically appended to a log file.
+    """
+
+    # Singleton instance of Instrumentation
+    _instance = None
+
+    @staticmethod
+    def getInstance():
+        """
+        Returns the singleton instance of Instrumentation. If it does not exist, create it and
+        then return it.
+
+        @rtype: Instrumentation, the singleton instance of Instrumentation
+        """
+        if Instrumentation._instance == None:
+            Instrumentation._instance = Instrumentation()
+        return Instrumentation._instance
+
+
+    def __init__(self, logPath="instrumentation.log", logInterval=60):
+        """
+        Initializes a new Instrumentation. Singleton, should only be called by getInstance().
+
+        @type logPath: str, the file the summaries are appended to, or None to not log
+        @type logInterval: float, the number of seconds between two summaries in the log
+        @rtype: None
+        """
+        self.frames = FrameTimeHistogram()
+        self.stageNames = []            # stages in the order they were first seen
+        self.stageLast = {}             # stage -> duration of its last run (seconds)
+        self.stageAverage = {}          # stage -> moving average of its duration (seconds)
+        self.stageTotal = {}            # stage -> total time spent in it (seconds)
+        self.counters = {"fetchBytes": 0, "barsProcessed": 0, "tradesEmitted": 0}
+        self._countLock = threading.Lock()  # counters are added to from worker threads
+        self.showOverlay = 0            # whether the View draws the overlay
+
+        self.logPath = logPath
+        self.logInterval = logInterval
+        self._frameStart = None
+        self._lastLog = monotonicTime()
+
+
+    def stage(self, name):
+        """
+        Returns a context manager timing a stage, e.g.
+            with instrumentation.stage("refresh"):
+                data.refreshStockData()
+
+        @type name: str, the name of the stage
+        @rtype: context manager
+        """
+        return _StageTimer(self, name)
+
+
+    def recordStage(self, name, seconds):
+        """
+        Records the duration of a run of a stage.
+
+        @type name: str, the name of the stage
+        @type seconds: float, the duration of the run
+        @rtype: None
+        """
+        if name not in self.stageLast:
+            self.stageNames.append(name)
+            self.stageAverage[name] = seconds
+            self.stageTotal[name] = 0.0
+        self.stageLast[name] = seconds
+        self.stageAverage[name] += 0.05 * (seconds - self.stageAverage[name])
+        self.stageTotal[name] += seconds
+
+
+    def count(self, name, amount=1):
+        """
+        Adds to a counter. Thread safe, e.g. BulkFetcher counts from its worker threads.
+
+        @type name: str, the name of the counter, e.g. "fetchBytes"
+        @type amount: int, the amount to add
+        @rtype: None
+        """
+        with self._countLock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+
+    def beginFrame(self):
+        """
+        Marks the start of a frame of the draw loop.
+
+        @rtype: None
+        """
+        self._frameStart = monotonicTime()
+
+
+    def endFrame(self):
+        """
+        Marks the end of a frame of the draw loop, and appends a summary to the log file
+        every logInterval seconds.
+
+        @rtype: None
+        """
+        now = monotonicTime()
+        if self._frameStart != None:
+            self.frames.add(now - self._frameStart)
+        if self.logPath != None and now - self._lastLog >= self.logInterval:
+            self._lastLog = now
+            self.dumpToLog()
+
+
+    def summaryLines(self):
+        """
+        Returns the summary shown in the overlay and written to the log.
+
+        @rtype: list, of str
+        """
+        p50, p95, p99 = self.frames.percentiles([50, 95, 99])
+        lines = ["frame p50/p95/p99: %.1f/%.1f/%.1f ms" % (p50 * 1000, p95 * 1000, p99 * 1000)]
+        for name in self.stageNames:
+            lines.append("%s: last %.1f ms, avg %.1f ms" % (name, self.stageLast[name] * 1000,
+                                                             self.stageAverage[name] * 1000))
+        for name in sorted(self.counters):
+            lines.append("%s: %d" % (name, self.counters[name]))
+        return lines
+
+
+    def dumpToLog(self):
+        """
+        Appends the current summary to the log file.
+
+        @rtype: None
+        """
+        try:
+            logFile = open(self.logPath, "a")
+            logFile.write(time.strftime("%Y-%m-%d %H:%M:%S") + " | " + " | ".join(self.summaryLines()) + "\n")
+            logFile.close()
+        except IOError:
+            # instrumentation must never interrupt the draw loop
+            self.logPath = None
+
+
+def runRenderingStage(view, tradingStrategy, frames=60):
+    """
+    Times View.drawMainScreen() on the candlesticks of a strategy's session, as the rendering
+    stage of the benchmarks. Only possible inside the Processing sketch, e.g. called from
+    Market.pyde.
+
+    @type view: View, the instantiated View
+    @type tradingStrategy: TradingStrategy, the strategy whose indicators are drawn
+    @type frames: int, the number of frames to draw
+    @rtype: dict, with the throughput in candlesticks per second and the seconds per frame
+    """
+    candleStickTotal = len(tradingStrategy.data.stockData)
+    start = monotonicTime()
+    for frame in range(frames):
+        view.drawMainScreen(tradingStrategy)
+    elapsed = max(monotonicTime() - start, 1e-9)
+    return {"barsPerSecond": candleStickTotal * frames / elapsed, "seconds": elapsed / frames,
+            "peakMemory": None, "memoryMethod": None}
@@ -0,0 +1,162 @@
+import sys
+from Clock import monotonicTime
+
+class Profiler():
+    """
+    Class responsible for on-demand deterministic profiling of one refresh cycle (refresh,
+    simulation and drawing). Every Python call and return is recorded through sys.setprofile
+    while a capture is running; when no capture is running no hook is installed, so the
+    profiler costs nothing.
+
+    A capture is written as collapsed stacks (one "caller;callee;... microseconds" line per
+    stack, ready for flamegraph.pl or speedscope) and as a table of the hottest functions.
+    """
+
+    # Singleton instance of Profiler
+    _instance = None
+
+    @staticmethod
+    def getInstance():
+        """
+        Returns the singleton instance of Profiler. If it does not exist, create it and then
+        return it.
+
+        @rtype: Profiler, the singleton instance of Profiler
+        """
+        if Profiler._instance == None:
+            Profiler._instance = Profiler()
+        return Profiler._instance
+
+
+    def __init__(self):
+        """
+        Initializes a new Profiler. Singleton, should only be called by getInstance().
+
+        @rtype: None
+        """
+        self.armed = 0                  # whether the next refresh cycle should be captured
+        self.capturing = 0              # whether a capture is running
+        self.outputPrefix = "profile"   # captures are written to <prefix>.collapsed and <prefix>.txt
+        self._reset()
+
+
+    def _reset(self):
+        self._stack = []                # [function key, start time, time spent in callees]
+        self._active = {}               # function key -> number of its calls on the stack
+        self.collapsedStacks = {}       # "caller;callee;..." -> self time (seconds)
+        self.functionStats = {}         # function key -> [calls, self time, total time]
+
+
+    def arm(self, outputPrefix=None):
+        """
+        Requests a capture of the next refresh cycle.
+
+        @type outputPrefix: str, the path prefix of the capture's files
+        @rtype: None
+        """
+        if outputPrefix != None:
+            self.outputPrefix = outputPrefix
+        self.armed = 1
+
+
+    def start(self):
+        """
+        Starts a capture.
+
+        @rtype: None
+        """
+        self._reset()
+        self.armed = 0
+        self.capturing = 1
+        sys.setprofile(self._hook)
+
+
+    def stop(self):
+        """
+        Stops the running capture and writes its files.
+
+        @rtype: list, the paths of the files written
+        """
+        sys.setprofile(None)
+        self.capturing = 0
+        now = monotonicTime()
+        while len(self._stack) > 0:
+            self._leave(now)
+        collapsedPath = self.outputPrefix + ".collapsed"
+        tablePath = self.outputPrefix + ".txt"
+        self.writeCollapsedStacks(collapsedPath)
+        self.writeHotFunctionTable(tablePath)
+        return [collapsedPath, tablePath]
+
+
+    def _hook(self, frame, event, argument):
+        """
+        Profile hook installed with sys.setprofile during a capture. Helper.
+
+        @rtype: None
+        """
+        now = monotonicTime()
+        if event == "call":
+            code = frame.f_code
+            self._enter(code.co_name + " (" + code.co_filename.split("/")[-1] + ":" +
+                        str(code.co_firstlineno) + ")", now)
+        elif event == "c_call":
+            self._enter(getattr(argument, "__name__", str(argument)) + " (builtin)", now)
+        elif event in ["return", "c_return", "c_exception"]:
+            if len(self._stack) > 0:
+                self._leave(now)
+
+
+    def _enter(self, key, now):
+        self._stack.append([key, now, 0.0])
+        self._active[key] = self._active.get(key, 0) + 1
+
+
+    def _leave(self, now):
+        key, start, calleeTime = self._stack.pop()
+        elapsed = now - start
+        selfTime = elapsed - calleeTime
+        if len(self._stack) > 0:
+            self._stack[-1][2] += elapsed
+
+        stackKey = ";".join([entry[0] for entry in self._stack] + [key])
+        self.collapsedStacks[stackKey] = self.collapsedStacks.get(stackKey, 0.0) + selfTime
+
+        stats = self.functionStats.setdefault(key, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += selfTime
+        self._active[key] -= 1
+        if self._active[key] == 0:
+            # only the outermost call of a recursive function adds to its total time
+            stats[2] += elapsed
+
+
+    def writeCollapsedStacks(self, path):
+        """
+        Writes the capture as collapsed stacks, with self times in microseconds.
+
+        @type path: str, the file to write
+        @rtype: None
+        """
+        outputFile = open(path, "w")
+        for stackKey in sorted(self.collapsedStacks):
+            microseconds = int(self.collapsedStacks[stackKey] * 1e6)
+            if microseconds > 0:
+                outputFile.write(stackKey.replace(" ", "_") + " " + str(microseconds) + "\n")
+        outputFile.close()
+
+
+    def writeHotFunctionTable(self, path, rowCount=50):
+        """
+        Writes the functions of the capture sorted by self time.
+
+        @type path: str, the file to write
+        @type rowCount: int, the number of functions listed
+        @rtype: None
+        """
+        rows = sorted(self.functionStats.items(), key=lambda item: -item[1][1])
+        outputFile = open(path, "w")
+        outputFile.write("%12s %12s %12s  %s\n" % ("calls", "self (ms)", "total (ms)", "function"))
+        for key, stats in rows[:rowCount]:
+            outputFile.write("%12d %12.3f %12.3f  %s\n" % (stats[0], stats[1] * 1000, stats[2] * 1000, key))
+        outputFile.close()
@@ -0,0 +1,130 @@
+import math
+import random
+import time
+from Clock import monotonicTime
+
+class RefreshScheduler():
+    """
+    Class responsible for deciding when the stock data is refreshed, on the monotonic clock
+    rather than by counting frames, so that the polling rate does not depend on the frame
+    rate or the rendering load.
+
+    Live stocks are polled right after each of their candlesticks closes: the deadline is the
+    next multiple of the stock's interval on the wall clock, plus a short settle delay for the
+    candlestick to be published, plus random jitter so that many displays (or many stocks) do
+    not all fetch at the same instant. Past days do not change and are only refreshed on
+    request. Requests made before a refresh runs, and a request that falls together with a
+    scheduled poll, are coalesced into a single refresh.
+    """
+
+    # Singleton instance of RefreshScheduler
+    _instance = None
+
+    @staticmethod
+    def getInstance():
+        """
+        Returns the singleton instance of RefreshScheduler. If it does not exist, create it
+        and then return it.
+
+        @rtype: RefreshScheduler, the singleton instance of RefreshScheduler
+        """
+        if RefreshScheduler._instance == None:
+            RefreshScheduler._instance = RefreshScheduler()
+        return RefreshScheduler._instance
+
+
+    def __init__(self, interval=60, settleDelay=1.0, jitter=2.0):
+        """
+        Initializes a new RefreshScheduler. Singleton, should only be called by getInstance().
+
+        @type interval: float, the default polling interval, the candlestick length (seconds)
+        @type settleDelay: float, the wait after a candlestick closes before polling (seconds)
+        @type jitter: float, the maximum random delay added to every poll (seconds)
+        @rtype: None
+        """
+        self.interval = interval
+        self.settleDelay = settleDelay
+        self.jitter = jitter
+        self.intervals = {}             # ticker -> polling interval (seconds), if not the default
+        self._requested = set()         # tickers with a pending refresh request, None for all
+        self._deadlines = {}            # ticker -> monotonic time of its next poll
+        self._random = random.Random()
+
+
+    def setInterval(self, ticker, seconds):
+        """
+        Sets the polling interval of a stock, e.g. 300 for five minute candlesticks.
+
+        @type ticker: str, stock ticker name
+        @type seconds: float, the polling interval
+        @rtype: None
+        """
+        self.intervals[ticker] = seconds
+        self._deadlines.pop(ticker, None)
+
+
+    def requestRefresh(self, ticker=None):
+        """
+        Requests a refresh as soon as possible, e.g. after the user selected another stock,
+        day or strategy. Repeated requests before the refresh runs are coalesced.
+
+        @type ticker: str, stock ticker name, or None for whichever stock is tracked
+        @rtype: None
+        """
+        self._requested.add(ticker)
+
+
+    def isDue(self, ticker, live):
+        """
+        Returns whether the stock data should be refreshed now.
+
+        @type ticker: str, stock ticker name
+        @type live: bool, whether the data is from the current day and keeps changing
+        @rtype: int, 1 for true and 0 for false
+        """
+        if ticker in self._requested or None in self._requested or ticker not in self._deadlines:
+            return 1
+        if live and monotonicTime() >= self._deadlines[ticker]:
+            return 1
+        return 0
+
+
+    def markRefreshed(self, ticker):
+        """
+        Records that the stock data has been refreshed, clearing the requests it satisfied
+        and scheduling the next poll after the next candlestick closes.
+
+        @type ticker: str, stock ticker name
+        @rtype: None
+        """
+        self._requested.discard(ticker)
+        self._requested.discard(None)
+        self._deadlines[ticker] = monotonicTime() + self.secondsUntilNextPoll(ticker)
+
+
+    def scheduleRefresh(self, ticker, seconds):
+        """
+        Schedules the next poll of a stock in (seconds), e.g. shortly after a restored session
+        has been drawn.
+
+        @type ticker: str, stock ticker name
+        @type seconds: float, the delay before the poll
+        @rtype: None
+        """
+        self._requested.discard(ticker)
+        self._requested.discard(None)
+        self._deadlines[ticker] = monotonicTime() + seconds
+
+
+    def secondsUntilNextPoll(self, ticker):
+        """
+        Returns the time until the next poll of a stock: until its current candlestick
+        closes on the wall clock, plus the settle delay and jitter.
+
+        @type ticker: str, stock ticker name
+        @rtype: float, seconds
+        """
+        interval = self.intervals.get(ticker, self.interval)
+        now = time.time()
+        nextClose = (math.floor(now / interval) + 1) * interval
+        return nextClose - now + self.settleDelay + self._random.uniform(0, self.jitter)
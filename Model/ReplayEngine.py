@@ -0,0 +1,181 @@
+import time
+from Clock import monotonicTime
+from Instrumentation import FrameTimeHistogram
+from SessionContext import SessionContext
+from SignalPublisher import SignalPublisher
+
+
+class ReplayEngine():
+    """
+    Class responsible for replaying archived candlesticks through the live pipeline, as if
+    they were arriving from polls: every new candlestick is appended to Data in place and
+    simulated with TradingStrategy.simulateNewCandleSticks(), then marked to market, exactly
+    as the draw loop of Market.pyde does after a poll. The live path can so be tested and
+    load-tested offline, without waiting for real minutes.
+
+    Candlesticks are released on the monotonic clock at (speed) times their real pace, e.g.
+    a day of minute candlesticks in 6.5 minutes at 60x, or as fast as possible with a speed
+    of None. The replay is driven either by pump() from a frame loop, which releases the
+    candlesticks that are due within a time budget, or by run(), which sleeps until the next
+    candlestick is due and then spins for the last milliseconds, so that release times are
+    accurate well below the resolution of time.sleep().
+
+    The sustained throughput in candlesticks per second and the latency from the time a
+    candlestick is due to the end of its simulation are reported by report().
+    """
+
+    # remaining wait below which run() spins instead of sleeping (seconds)
+    SPIN_THRESHOLD = 0.002
+
+    def __init__(self, bars, tradingStrategy, speed=60.0, interval=60, context=None):
+        """
+        Initializes a new ReplayEngine.
+
+        @type bars: list, the archived candlesticks, organized like Data.stockData, e.g. from
+                    Data.archivedDay() or BarArchive.readDay()
+        @type tradingStrategy: TradingStrategy, the strategy simulated on the candlesticks
+        @type speed: float, the speed multiplier, 1 for real time, None for as fast as possible
+        @type interval: float, seconds between two candlesticks in real time
+        @type context: SessionContext, the session replayed into, defaults to the singletons
+        @rtype: None
+        """
+        self.bars = bars
+        self.tradingStrategy = tradingStrategy
+        self.speed = speed
+        self.interval = interval
+        self.context = SessionContext.resolve(context)
+        self.replayedCount = 0          # number of candlesticks released so far
+        self.latencies = FrameTimeHistogram(max(1, len(bars)))
+                                        # due time to end of simulation of every candlestick
+        self._startTime = None          # monotonic time the replay started
+        self._endTime = None            # monotonic time the last candlestick was simulated
+
+
+    def start(self):
+        """
+        Empties the stock data of the session and starts the clock of the replay.
+
+        @rtype: None
+        """
+        data = self.context.data
+        data.popList(data.stockData)
+        data.clearTrades()
+        data.revision += 1
+        SignalPublisher.getInstance().resetWatermark(data.ticker, data.exchange)
+        self.replayedCount = 0
+        self._endTime = None
+        self._startTime = monotonicTime()
+
+
+    def finished(self):
+        """
+        Returns whether every candlestick has been replayed.
+
+        @rtype: int, 1 for true and 0 for false
+        """
+        if self.replayedCount >= len(self.bars):
+            return 1
+        return 0
+
+
+    def dueTime(self, candleStickCount):
+        """
+        Returns the monotonic time a candlestick is released at.
+
+        @type candleStickCount: int, the index of the candlestick in the replayed bars
+        @rtype: float
+        """
+        if self.speed == None:
+            return self._startTime
+        return self._startTime + candleStickCount * self.interval / float(self.speed)
+
+
+    def pump(self, budget=None):
+        """
+        Releases the candlesticks that are due, the ones due together being simulated as one
+        poll. Intended to be called once per frame.
+
+        @type budget: float, the time after which no more candlesticks are released (seconds),
+                      or None to release every candlestick that is due at once
+        @rtype: int, the number of candlesticks released
+        """
+        if self._startTime == None:
+            self.start()
+        pumpStart = monotonicTime()
+        released = 0
+        while self.finished() == 0:
+            now = monotonicTime()
+            last = self.replayedCount
+            while last < len(self.bars) and self.dueTime(last) <= now:
+                last += 1
+            if last == self.replayedCount:
+                break
+            if budget != None and self.speed == None:
+                # as fast as possible, one candlestick at a time until the budget is spent
+                last = self.replayedCount + 1
+            released += self._release(last)
+            if budget == None or monotonicTime() - pumpStart >= budget:
+                break
+        return released
+
+
+    def run(self):
+        """
+        Replays every candlestick, waiting for each to be due.
+
+        @rtype: dict, the report of the replay, see report()
+        """
+        if self._startTime == None:
+            self.start()
+        while self.finished() == 0:
+            wait = self.dueTime(self.replayedCount) - monotonicTime()
+            if wait > ReplayEngine.SPIN_THRESHOLD:
+                time.sleep(wait - ReplayEngine.SPIN_THRESHOLD)
+                continue
+            while monotonicTime() < self.dueTime(self.replayedCount):
+                pass
+            self._release(self.replayedCount + 1)
+        return self.report()
+
+
+    def report(self):
+        """
+        Returns the throughput and latency of the replay so far.
+
+        @rtype: dict, with the candlesticks replayed, the seconds elapsed, the sustained
+                candlesticks per second, and the median, 99th percentile and maximum latency
+                (seconds)
+        """
+        endTime = self._endTime if self._endTime != None else monotonicTime()
+        elapsed = max(endTime - self._startTime, 1e-9) if self._startTime != None else 0.0
+        median, percentile99, maximum = self.latencies.percentiles([50, 99, 100])
+        return {"bars": self.replayedCount, "seconds": elapsed,
+                "barsPerSecond": self.replayedCount / elapsed if elapsed > 0 else 0.0,
+                "latencyMedian": median, "latency99": percentile99, "latencyMax": maximum}
+
+
+    def _release(self, last):
+        """
+        Appends the candlesticks up to (last) to the stock data and simulates them, as the
+        draw loop does after a poll, then records their latencies. Helper.
+
+        @rtype: int, the number of candlesticks released
+        """
+        releaseTime = monotonicTime()
+        data = self.context.data
+        first = self.replayedCount
+        firstNewCandleStick = data.appendBars(self.bars[first:last])
+        self.tradingStrategy.simulateNewCandleSticks(firstNewCandleStick)
+        self.context.analyzer.postAnalysisCalculations()
+        view = self.context.getView()
+        if view != None:
+            view.invalidate()
+
+        # as fast as possible, a candlestick is due when it is released
+        done = monotonicTime()
+        for candleStickCount in range(first, last):
+            dueTime = self.dueTime(candleStickCount) if self.speed != None else releaseTime
+            self.latencies.add(max(0.0, done - dueTime))
+        self.replayedCount = last
+        self._endTime = done
+        return last - first
@@ -0,0 +1,198 @@
+from array import array
+from Data import Data
+from TimeIndex import DEFAULT_TIMEZONE_OFFSET
+from TimeIndex import clockTime
+
+class Resampler():
+    """
+    Class responsible for building higher timeframe candlesticks (5 minute, 15 minute, hourly,
+    daily...) from the 1 minute candlesticks in Data. Every timeframe is built once and cached;
+    as new minute candlesticks arrive, only the newest higher timeframe candlestick of each
+    cached timeframe is updated or appended.
+
+    Candlesticks are grouped by their time, in intervals starting from the open of their
+    trading day, so that e.g. the hourly candlesticks of a day cover 9:30-10:29, 10:30-11:29,
+    ..., 15:30-15:59. A missing minute leaves its interval with fewer minutes, and does not
+    shift the later minutes into the wrong interval.
+    """
+
+    # Singleton instance of Resampler
+    _instance = None
+
+    # timeframe of one candlestick per trading day, in minutes
+    DAILY = 390
+
+    # time of the open of a trading day, in the exchange's timezone (hour, minute)
+    SESSION_OPEN = (9, 30)
+
+    @staticmethod
+    def getInstance():
+        """
+        Returns the singleton instance of Resampler. If it does not exist, create it and then
+        return it.
+
+        @rtype: Resampler, the singleton instance of Resampler
+        """
+        if Resampler._instance == None:
+            Resampler._instance = Resampler()
+        return Resampler._instance
+
+
+    def __init__(self, sessionLength=390, timezoneOffset=DEFAULT_TIMEZONE_OFFSET):
+        """
+        Initializes a new Resampler. Singleton, should only be called by getInstance(),
+        except for the Resampler of a SessionContext.
+
+        @type sessionLength: int, the number of minute candlesticks in a trading day
+        @type timezoneOffset: int, the exchange's offset from UTC in minutes, e.g. -240
+        @rtype: None
+        """
+        self.sessionLength = sessionLength
+        self.timezoneOffset = timezoneOffset
+        self._stockData = None          # the minute candlesticks the cache was built from
+        self._processedCount = 0        # number of minute candlesticks already resampled
+        self._lastProcessedBar = None   # the last minute candlestick resampled
+        self._bars = {}                 # timeframe (minutes) -> list of candlesticks
+        self._bucketKeys = {}           # timeframe (minutes) -> key of its newest candlestick
+        self._barIndexes = {}           # timeframe (minutes) -> index of the candlestick of the
+                                        # timeframe containing every minute candlestick
+        self._day = None                # (start, end, open time) of the last day looked up
+
+
+    def getBars(self, minutes, stockData=None):
+        """
+        Returns the candlesticks of a timeframe, organized like Data.stockData: date, close,
+        high, low, open, volume. The newest candlestick covers the minutes seen so far and is
+        still updated as new minute candlesticks arrive.
+
+        @type minutes: int, the timeframe in minutes, e.g. 5, 15, 60 or Resampler.DAILY
+        @type stockData: list, the minute candlesticks, defaults to the stock currently being
+                         tracked in Data
+        @rtype: list, the candlesticks of the timeframe
+        """
+        self.prepareTimeframes([minutes], stockData)
+        return self._bars[minutes]
+
+
+    def prepareTimeframes(self, timeframes, stockData=None):
+        """
+        Builds every missing timeframe in a single pass over the minute candlesticks, and
+        brings the cached ones up to date with any new minute candlesticks.
+
+        @type timeframes: list, of timeframes in minutes
+        @type stockData: list, the minute candlesticks, defaults to the stock currently being
+                         tracked in Data
+        @rtype: None
+        """
+        if stockData == None:
+            stockData = Data.getInstance().stockData
+        self._synchronize(stockData)
+
+        missing = [minutes for minutes in timeframes if minutes not in self._bars]
+        if len(missing) == 0:
+            return
+        for minutes in missing:
+            self._bars[minutes] = []
+            self._bucketKeys[minutes] = None
+            self._barIndexes[minutes] = array('i')
+        for candleStickCount in range(self._processedCount):
+            bar = stockData[candleStickCount]
+            sessionOpen = self._sessionOpen(bar[0])
+            for minutes in missing:
+                self._addBar(minutes, sessionOpen, bar)
+
+
+    def getBarIndex(self, minutes, candleStickCount, stockData=None):
+        """
+        Returns the index of the candlestick of a timeframe containing a minute candlestick.
+        In backtests, only candlesticks before this index are complete at that minute.
+
+        @type minutes: int, the timeframe in minutes
+        @type candleStickCount: int, the index of the minute candlestick
+        @type stockData: list, the minute candlesticks, defaults to the stock currently being
+                         tracked in Data
+        @rtype: int, the index in getBars(minutes)
+        """
+        self.prepareTimeframes([minutes], stockData)
+        return self._barIndexes[minutes][candleStickCount]
+
+
+    def bucketKey(self, minutes, sessionOpen, timestamp):
+        """
+        Returns the interval of a timeframe a minute candlestick belongs to: its trading day,
+        and the number of whole intervals between the open of that day and its time.
+
+        @type minutes: int, the timeframe in minutes
+        @type sessionOpen: float, the open of the candlestick's trading day, seconds since the epoch
+        @type timestamp: float, the time of the candlestick, seconds since the epoch
+        @rtype: tuple, (open of the trading day, interval #)
+        """
+        if minutes >= self.sessionLength:
+            return (sessionOpen, 0)
+        return (sessionOpen, int((timestamp - sessionOpen) // (minutes * 60)))
+
+
+    def _synchronize(self, stockData):
+        """
+        Resamples the minute candlesticks added since the last call, or clears the cache if
+        the minute candlesticks were replaced (e.g. by Data.refreshStockData). Helper.
+
+        @rtype: None
+        """
+        replaced = (stockData is not self._stockData or len(stockData) < self._processedCount or
+                    (self._processedCount > 0 and
+                     stockData[self._processedCount - 1] is not self._lastProcessedBar))
+        if replaced:
+            # cached timeframes are rebuilt on demand in prepareTimeframes()
+            self._stockData = stockData
+            self._bars = {}
+            self._bucketKeys = {}
+            self._barIndexes = {}
+            self._processedCount = len(stockData)
+        else:
+            for candleStickCount in range(self._processedCount, len(stockData)):
+                bar = stockData[candleStickCount]
+                sessionOpen = self._sessionOpen(bar[0])
+                for minutes in self._bars:
+                    self._addBar(minutes, sessionOpen, bar)
+            self._processedCount = len(stockData)
+        if self._processedCount > 0:
+            self._lastProcessedBar = stockData[self._processedCount - 1]
+
+
+    def _sessionOpen(self, timestamp):
+        """
+        Returns the open of the trading day of a time, looking up only the first time of
+        every day. Helper.
+
+        @rtype: float, seconds since the epoch
+        """
+        if self._day == None or not (self._day[0] <= timestamp < self._day[1]):
+            midnight = clockTime(timestamp, 0, 0, self.timezoneOffset)
+            self._day = (midnight, midnight + 86400,
+                         clockTime(timestamp, Resampler.SESSION_OPEN[0], Resampler.SESSION_OPEN[1],
+                                   self.timezoneOffset))
+        return self._day[2]
+
+
+    def _addBar(self, minutes, sessionOpen, bar):
+        """
+        Merges a minute candlestick into the newest candlestick of a timeframe, or starts a
+        new one if the minute belongs to the next interval. Helper.
+
+        @rtype: None
+        """
+        bucketKey = self.bucketKey(minutes, sessionOpen, bar[0])
+        bars = self._bars[minutes]
+        if bucketKey == self._bucketKeys[minutes]:
+            current = bars[-1]
+            current[1] = bar[1]
+            if bar[2] > current[2]:
+                current[2] = bar[2]
+            if bar[3] < current[3]:
+                current[3] = bar[3]
+            current[5] += bar[5]
+        else:
+            bars.append([bar[0], bar[1], bar[2], bar[3], bar[4], bar[5]])
+            self._bucketKeys[minutes] = bucketKey
+        self._barIndexes[minutes].append(len(bars) - 1)
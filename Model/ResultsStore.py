@@ -0,0 +1,394 @@
+import bisect
+import heapq
+import struct
+import threading
+import time
+from array import array
+from BarArchive import dayKey
+
+# file layout: header, then entries of a tag byte followed by a string or a run record
+MAGIC = b"MRRS"
+VERSION = 1
+_HEADER = struct.Struct("<4sH")             # magic, version
+_STRING = struct.Struct("<IH")              # string id, length of the UTF-8 bytes that follow
+_RECORD = struct.Struct("<dIIIIiIiIIdddi")  # see RECORD_FIELDS
+_STRING_TAG = b"S"
+_RECORD_TAG = b"R"
+
+# the fields of a run record, in file order; the string fields hold ids of the string table
+RECORD_FIELDS = ["recordedAt", "ticker", "exchange", "strategy", "parameters", "day", "journal",
+                 "journalRun", "candleSticks", "trades", "PL", "cash", "commissionTotal", "position"]
+_STRING_FIELDS = ["ticker", "exchange", "strategy", "parameters", "journal"]
+_TYPECODES = {"recordedAt": "d", "PL": "d", "cash": "d", "commissionTotal": "d"}
+# the fields of a run record holding its results, compared to tell a changed run from a repeat
+RESULT_FIELDS = ["candleSticks", "trades", "PL", "cash", "commissionTotal", "position"]
+
+
+def parameterKey(parameters):
+    """
+    Returns the canonical form of a parameter set, e.g. "delay=3,long=50,short=15".
+
+    @type parameters: dict, from parameter name to value
+    @rtype: str
+    """
+    return ",".join([name + "=" + str(parameters[name]) for name in sorted(parameters)])
+
+
+def parseParameterKey(key):
+    """
+    Returns the parameter set of a canonical parameter key, see parameterKey().
+
+    @type key: str, the canonical parameter key
+    @rtype: dict, from parameter name to value (int or float where the value is a number)
+    """
+    parameters = {}
+    for pair in key.split(","):
+        if "=" not in pair:
+            continue
+        name, value = pair.split("=", 1)
+        for kind in [int, float]:
+            try:
+                value = kind(value)
+                break
+            except ValueError:
+                pass
+        parameters[name] = value
+    return parameters
+
+
+class RunRecord():
+    """
+    Holds one backtest run of a ResultsStore: what was run, its summary metrics, and where
+    its trades are journaled.
+    """
+
+    def __init__(self, values):
+        """
+        Initializes a new RunRecord.
+
+        @type values: dict, from field name (see RECORD_FIELDS) to value, strings resolved
+        @rtype: None
+        """
+        self.recordedAt = values["recordedAt"]      # time the run was recorded (seconds since epoch)
+        self.ticker = values["ticker"]              # stock ticker name
+        self.exchange = values["exchange"]          # stock exchange name
+        self.strategy = values["strategy"]          # strategy name
+        self.parameters = parseParameterKey(values["parameters"])
+        self.day = values["day"]                    # day of the candlesticks, as YYYYMMDD
+        self.journal = values["journal"]            # trade journal file, "" if not kept
+        self.journalRun = values["journalRun"]      # run in the trade journal, -1 if none
+        self.candleSticks = values["candleSticks"]  # number of candlesticks simulated
+        self.trades = values["trades"]              # number of trades
+        self.PL = values["PL"]                      # profit/loss ($)
+        self.cash = values["cash"]                  # cash at the end of the run ($)
+        self.commissionTotal = values["commissionTotal"]
+                                                    # total commission paid ($)
+        self.position = values["position"]          # position at the end of the run (shares)
+
+
+class ResultsStore():
+    """
+    Class responsible for keeping the summary of every backtest run in a local file, and
+    answering queries over them, e.g. the best crossover parameters on a stock over a
+    quarter.
+
+    Runs are appended to the file as fixed-size records whose strings (ticker, exchange,
+    strategy, parameters, journal) are dictionary-encoded in a string table kept in the same
+    file, so a record costs about 80 bytes. When the store is opened, the records are loaded
+    into typed columns and indexed by ticker, exchange, strategy, parameter set, parameter
+    value and day, so a query intersects the smallest matching index lists instead of
+    scanning every run. (sqlite3 is not available on Jython.)
+
+    A run of the same strategy and parameters on the same stock and day replaces the earlier
+    one, so simulating a day again (e.g. on every refresh of the sketch) does not count it
+    twice. A repeated run with unchanged results is not written again.
+    """
+
+    def __init__(self, path="results.store"):
+        """
+        Opens a results store, creating it if it does not exist.
+
+        @type path: str, the store file
+        @rtype: None
+        """
+        self.path = path
+        self.strings = []               # string id -> string
+        self._stringIds = {}            # string -> string id
+        self._columns = dict([(field, array(_TYPECODES.get(field, "i"))) for field in RECORD_FIELDS])
+        self._indexes = dict([(field, {}) for field in _STRING_FIELDS])
+        self._parameterValues = {}      # (parameter name, value as str) -> record numbers
+        self._parameterSets = {}        # parameters string id -> parameter set
+        self._runs = {}                 # (ticker, exchange, strategy, parameters, day) ids -> record
+        self._replaced = set()          # record numbers replaced by a later run
+        self._dayOrder = None           # record numbers sorted by day, rebuilt when stale
+        self._orderedDays = None        # the days of the records in _dayOrder
+        self._lock = threading.Lock()
+
+        self._file = open(path, "a+b", 65536)
+        self._file.seek(0, 2)
+        if self._file.tell() == 0:
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+        else:
+            self._load()
+
+
+    def __len__(self):
+        return len(self._runs)
+
+
+    def recordRun(self, ticker, exchange, strategy, parameters, day, candleSticks, trades, PL,
+                  cash, commissionTotal, position, journal="", journalRun=-1):
+        """
+        Appends a run to the store, replacing the run of the same strategy and parameters on
+        the same stock and day if there is one. Safe to call from several threads.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type strategy: str, the strategy name
+        @type parameters: dict, from parameter name to value
+        @type day: int, the day of the candlesticks, as YYYYMMDD
+        @type candleSticks: int, the number of candlesticks simulated
+        @type trades: int, the number of trades
+        @type PL: float, the profit/loss ($)
+        @type cash: float, the cash at the end of the run ($)
+        @type commissionTotal: float, the total commission paid ($)
+        @type position: int, the position at the end of the run (shares)
+        @type journal: str, the trade journal file holding the trades, "" if not kept
+        @type journalRun: int, the run in the trade journal, -1 if none
+        @rtype: int, the record number of the run
+        """
+        with self._lock:
+            values = [time.time(), self._stringId(ticker), self._stringId(exchange),
+                      self._stringId(strategy), self._stringId(parameterKey(parameters)), day,
+                      self._stringId(journal or ""), journalRun, candleSticks, trades, PL, cash,
+                      commissionTotal, position]
+            recordNumber = self._runs.get(tuple(values[1:6]))
+            if recordNumber != None and \
+               [self._columns[field][recordNumber] for field in RESULT_FIELDS] == \
+               [values[RECORD_FIELDS.index(field)] for field in RESULT_FIELDS]:
+                return recordNumber
+            self._file.write(_RECORD_TAG + _RECORD.pack(*values))
+            return self._addRecord(values)
+
+
+    def recordSimulation(self, tradingStrategy):
+        """
+        Appends the simulation of a strategy, from the account and the trade journal of its
+        session, replacing an earlier simulation of the same day, see recordRun().
+
+        @type tradingStrategy: TradingStrategy, the simulated strategy
+        @rtype: int, the record number of the run
+        """
+        data = tradingStrategy.context.data
+        analyzer = tradingStrategy.context.analyzer
+        day = dayKey(data.stockData[0][0]) if len(data.stockData) > 0 else 0
+        return self.recordRun(data.ticker, data.exchange, tradingStrategy.strategyName,
+                              tradingStrategy.parameters(), day, len(data.stockData),
+                              data.journal.count, analyzer.PL, analyzer.cash,
+                              analyzer.commissionTotal, analyzer.position,
+                              data.journal.path or "", data.journal.run)
+
+
+    def query(self, ticker=None, exchange=None, strategy=None, parameters=None, firstDay=None,
+              lastDay=None, orderBy="PL", limit=None, descending=True):
+        """
+        Returns the runs matching every given filter, ordered by a metric.
+
+        @type ticker: str, only runs on this stock ticker
+        @type exchange: str, only runs on this stock exchange
+        @type strategy: str, only runs of this strategy
+        @type parameters: dict, only runs with these parameter values (other parameters may
+                          take any value)
+        @type firstDay: int, only runs on or after this day, as YYYYMMDD
+        @type lastDay: int, only runs on or before this day, as YYYYMMDD
+        @type orderBy: str, the numeric field to order by, see RECORD_FIELDS
+        @type limit: int, the maximum number of runs returned, or None for all
+        @type descending: bool, order from the highest value of (orderBy) down
+        @rtype: list, of RunRecord
+        """
+        with self._lock:
+            recordNumbers = self._match(ticker, exchange, strategy, parameters, firstDay, lastDay)
+            column = self._columns[orderBy]
+            if limit != None and descending:
+                recordNumbers = heapq.nlargest(limit, recordNumbers, key=column.__getitem__)
+            elif limit != None:
+                recordNumbers = heapq.nsmallest(limit, recordNumbers, key=column.__getitem__)
+            else:
+                recordNumbers = sorted(recordNumbers, key=column.__getitem__, reverse=descending)
+            return [self._record(recordNumber) for recordNumber in recordNumbers]
+
+
+    def bestParameters(self, ticker=None, exchange=None, strategy=None, firstDay=None,
+                       lastDay=None, count=10):
+        """
+        Returns the parameter sets with the highest total profit/loss over the matching runs,
+        e.g. the best crossover parameters on a stock over the last quarter.
+
+        @type ticker: str, only runs on this stock ticker
+        @type exchange: str, only runs on this stock exchange
+        @type strategy: str, only runs of this strategy
+        @type firstDay: int, only runs on or after this day, as YYYYMMDD
+        @type lastDay: int, only runs on or before this day, as YYYYMMDD
+        @type count: int, the number of parameter sets returned
+        @rtype: list, of (parameters dict, total profit/loss, number of runs), best first
+        """
+        with self._lock:
+            totals = {}
+            PLs = self._columns["PL"]
+            parameterIds = self._columns["parameters"]
+            for recordNumber in self._match(ticker, exchange, strategy, None, firstDay, lastDay):
+                total = totals.setdefault(parameterIds[recordNumber], [0.0, 0])
+                total[0] += PLs[recordNumber]
+                total[1] += 1
+            best = heapq.nlargest(count, totals.items(), key=lambda item: item[1][0])
+            return [(parseParameterKey(self.strings[parameterId]), total[0], total[1])
+                    for parameterId, total in best]
+
+
+    def flush(self):
+        """
+        Flushes the runs recorded so far to the store file.
+
+        @rtype: None
+        """
+        with self._lock:
+            self._file.flush()
+
+
+    def close(self):
+        """
+        Flushes and closes the store file.
+
+        @rtype: None
+        """
+        self.flush()
+        self._file.close()
+
+
+    def _match(self, ticker, exchange, strategy, parameters, firstDay, lastDay):
+        """
+        Returns the record numbers matching the filters of query(). Helper.
+
+        @rtype: list, of record numbers
+        """
+        candidates = []
+        for field, value in [("ticker", ticker), ("exchange", exchange), ("strategy", strategy)]:
+            if value != None:
+                candidates.append(self._indexes[field].get(self._stringIds.get(value), ()))
+        if parameters != None:
+            for name in parameters:
+                candidates.append(self._parameterValues.get((name, str(parameters[name])), ()))
+
+        days = self._columns["day"]
+        if len(candidates) == 0:
+            # only the day index applies
+            if self._dayOrder == None:
+                self._dayOrder = sorted(range(len(days)), key=days.__getitem__)
+                self._orderedDays = array("i", [days[recordNumber] for recordNumber in self._dayOrder])
+            start = 0 if firstDay == None else bisect.bisect_left(self._orderedDays, firstDay)
+            stop = len(self._dayOrder) if lastDay == None else bisect.bisect_right(self._orderedDays, lastDay)
+            return [recordNumber for recordNumber in self._dayOrder[start:stop]
+                    if recordNumber not in self._replaced]
+
+        candidates.sort(key=len)
+        matches = candidates[0]
+        for other in candidates[1:]:
+            if len(matches) == 0:
+                break
+            other = set(other)
+            matches = [recordNumber for recordNumber in matches if recordNumber in other]
+        return [recordNumber for recordNumber in matches
+                if (firstDay == None or days[recordNumber] >= firstDay) and
+                (lastDay == None or days[recordNumber] <= lastDay) and
+                recordNumber not in self._replaced]
+
+
+    def _record(self, recordNumber):
+        """
+        Returns a record as a RunRecord, with its strings resolved. Helper.
+
+        @rtype: RunRecord
+        """
+        values = {}
+        for field in RECORD_FIELDS:
+            values[field] = self._columns[field][recordNumber]
+            if field in _STRING_FIELDS:
+                values[field] = self.strings[values[field]]
+        return RunRecord(values)
+
+
+    def _stringId(self, string):
+        """
+        Returns the id of a string in the string table, appending it to the table (and the
+        file) if it is new. Helper.
+
+        @rtype: int
+        """
+        if string not in self._stringIds:
+            encoded = string.encode("utf-8")
+            self._file.write(_STRING_TAG + _STRING.pack(len(self.strings), len(encoded)) + encoded)
+            self._stringIds[string] = len(self.strings)
+            self.strings.append(string)
+        return self._stringIds[string]
+
+
+    def _addRecord(self, values):
+        """
+        Adds a record to the columns and indexes, replacing the earlier run of the same
+        strategy and parameters on the same stock and day. Helper.
+
+        @rtype: int, the record number
+        """
+        recordNumber = len(self._columns["day"])
+        runKey = tuple(values[1:6])
+        if runKey in self._runs:
+            self._replaced.add(self._runs[runKey])
+        self._runs[runKey] = recordNumber
+        for field, value in zip(RECORD_FIELDS, values):
+            self._columns[field].append(value)
+        for field in _STRING_FIELDS:
+            self._indexes[field].setdefault(self._columns[field][recordNumber], array("i")).append(recordNumber)
+        if values[4] not in self._parameterSets:
+            self._parameterSets[values[4]] = parseParameterKey(self.strings[values[4]]).items()
+        for name, value in self._parameterSets[values[4]]:
+            self._parameterValues.setdefault((name, str(value)), array("i")).append(recordNumber)
+        self._dayOrder = None
+        return recordNumber
+
+
+    def _load(self):
+        """
+        Reads the store file into the columns and indexes, dropping an entry cut short by a
+        crash. Helper.
+
+        @rtype: None
+        """
+        self._file.seek(0)
+        contents = self._file.read()
+        magic, version = _HEADER.unpack_from(contents, 0)
+        if magic != MAGIC or version != VERSION:
+            raise IOError("not a version " + str(VERSION) + " results store: " + str(self.path))
+        position = _HEADER.size
+        while position < len(contents):
+            tag = contents[position:position + 1]
+            if tag == _STRING_TAG and position + 1 + _STRING.size <= len(contents):
+                stringId, length = _STRING.unpack_from(contents, position + 1)
+                end = position + 1 + _STRING.size + length
+                if end > len(contents):
+                    break
+                string = contents[position + 1 + _STRING.size:end].decode("utf-8")
+                try:
+                    string = str(string)
+                except UnicodeError:
+                    pass
+                self._stringIds[string] = stringId
+                self.strings.append(string)
+            elif tag == _RECORD_TAG and position + 1 + _RECORD.size <= len(contents):
+                end = position + 1 + _RECORD.size
+                self._addRecord(list(_RECORD.unpack_from(contents, position + 1)))
+            else:
+                break
+            position = end
+        if position < len(contents):
+            self._file.truncate(position)
+        self._file.seek(0, 2)
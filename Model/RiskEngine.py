@@ -0,0 +1,231 @@
+from array import array
+from Data import Data
+from Indicators import WelfordWindow
+
+# rules of a RiskEngine copied to the accounts of other sessions, see SessionContext.forBars()
+RISK_RULES = ["maxGrossExposure", "maxNetExposure", "maxTradeNotional", "volatilityRisk",
+              "volatilityWindow", "dailyLossStop"]
+
+
+class RiskEngine():
+    """
+    Class responsible for the risk rules of an account: the long and short position limits
+    of Analysis, and optional limits on gross and net exposure, on the notional of a trade,
+    volatility-scaled position sizing and a daily loss stop. A rule set to None is off.
+
+    The rules are evaluated in two modes. In streaming mode, allowLong() and allowShort()
+    check one trade against the state of the account, in constant time: the volatility of
+    the candlesticks is extended incrementally as they arrive, and nothing is looked up
+    again. In batch mode, tradeSizes() applies the rules that do not depend on the account
+    (trade notional and volatility sizing) to a whole dataset at once, as arrays of share
+    counts, and backtestSignals() only checks the account rules with checkFill() on the
+    candlesticks that have a signal.
+    """
+
+    def __init__(self, analyzer):
+        """
+        Initializes a new RiskEngine.
+
+        @type analyzer: Analysis, the account the rules apply to
+        @rtype: None
+        """
+        self.analyzer = analyzer
+        self.maxGrossExposure = None    # maximum of the position plus the shares traded, e.g.
+                                        # when reversing from long to short ($)
+        self.maxNetExposure = None      # maximum position after a trade that increases it,
+                                        # long or short ($)
+        self.maxTradeNotional = None    # maximum value of a single trade ($)
+        self.volatilityRisk = None      # position size is capped so that a move of one standard
+                                        # deviation of the returns loses at most this much ($)
+        self.volatilityWindow = 20      # number of returns the volatility is measured over
+        self.dailyLossStop = None       # loss over a trading day after which only trades
+                                        # reducing the position are allowed ($)
+
+        self._volatilities = array('d') # volatility of the returns at every candlestick
+        self._returns = None            # WelfordWindow over the latest returns measured
+        self._stockData = None          # the candlesticks the volatilities were measured on
+        self._lastMeasuredBar = None    # the last candlestick measured
+        self._day = None                # trading day of the last streaming check
+        self._dayStartPL = 0            # profit/loss at the start of that day ($)
+
+
+    def reset(self):
+        """
+        Forgets the daily state before a simulation from scratch.
+
+        @rtype: None
+        """
+        self._day = None
+        self._dayStartPL = 0
+
+
+    def allowLong(self, currentPositionInCash, candleStickCount, additionalPositionInShares):
+        """
+        Checks a potential long trade against the rules, in the current state of the account.
+
+        @type currentPositionInCash: float, the current position ($), as in Analysis.positionSize
+        @type candleStickCount: int, the candlestick the trade would be made at
+        @type additionalPositionInShares: int, the number of shares that would be bought
+        @rtype: int, 1 if the trade is allowed and 0 otherwise
+        """
+        return self._allowStreaming(0, currentPositionInCash, candleStickCount, additionalPositionInShares)
+
+
+    def allowShort(self, currentPositionInCash, candleStickCount, additionalPositionInShares):
+        """
+        Checks a potential short trade against the rules, in the current state of the account.
+
+        @type currentPositionInCash: float, the current position ($), as in Analysis.positionSize
+        @type candleStickCount: int, the candlestick the trade would be made at
+        @type additionalPositionInShares: int, the number of shares that would be sold
+        @rtype: int, 1 if the trade is allowed and 0 otherwise
+        """
+        return self._allowStreaming(1, currentPositionInCash, candleStickCount, additionalPositionInShares)
+
+
+    def sizeShares(self, candleStickCount, baseShares, stockData=None):
+        """
+        Returns the number of shares of a trade after volatility sizing and the trade notional
+        limit.
+
+        @type candleStickCount: int, the candlestick the trade would be made at
+        @type baseShares: int, the number of shares the strategy would trade
+        @type stockData: list, the candlesticks, defaults to the ones of the account
+        @rtype: int, at most baseShares
+        """
+        if self.volatilityRisk == None and self.maxTradeNotional == None:
+            return baseShares
+        if stockData == None:
+            stockData = self.analyzer.data.stockData
+        sharePrice = stockData[candleStickCount][1]
+        if self.volatilityRisk != None:
+            volatility = self.volatilities(stockData)[candleStickCount]
+            if volatility > 0:
+                baseShares = min(baseShares, int(self.volatilityRisk / (sharePrice * volatility)))
+        if self.maxTradeNotional != None:
+            baseShares = min(baseShares, int(self.maxTradeNotional / sharePrice))
+        return max(baseShares, 0)
+
+
+    def tradeSizes(self, stockData, baseShares):
+        """
+        Returns the number of shares of a trade at every candlestick of a dataset, after
+        volatility sizing and the trade notional limit; 0 where no trade is allowed.
+
+        @type stockData: list, the candlesticks
+        @type baseShares: int, the number of shares the strategy would trade
+        @rtype: array, of share counts, one per candlestick
+        """
+        sizes = array('i', [baseShares] * len(stockData))
+        if self.volatilityRisk != None:
+            risk = self.volatilityRisk
+            sizes = array('i', [min(size, int(risk / (bar[1] * volatility))) if volatility > 0 else size
+                                for size, bar, volatility in zip(sizes, stockData, self.volatilities(stockData))])
+        if self.maxTradeNotional != None:
+            notional = self.maxTradeNotional
+            sizes = array('i', [min(size, int(notional / bar[1])) for size, bar in zip(sizes, stockData)])
+        return sizes
+
+
+    def checkFill(self, positionType, candleStickCount, shares, sharePrice, position, positionSize,
+                  PL=None, dayStartPL=None):
+        """
+        Checks a trade against the rules that depend on the account, given its state. Shared
+        by streaming checks and backtests, which keep their own account state.
+
+        @type positionType: int, 0 for long and 1 for short
+        @type candleStickCount: int, the candlestick the trade would be made at
+        @type shares: int, the number of shares traded
+        @type sharePrice: float, the price per share
+        @type position: int, the current position (shares)
+        @type positionSize: float, the current position at trade prices ($)
+        @type PL: float, the current profit/loss ($), or None to skip the daily loss stop
+        @type dayStartPL: float, the profit/loss at the start of the trading day ($)
+        @rtype: int, 1 if the trade is allowed and 0 otherwise
+        """
+        analyzer = self.analyzer
+        if positionType == 0:
+            if positionSize + shares * sharePrice > analyzer.maxLongPosition:
+                return 0
+            newPosition = position + shares
+        else:
+            if positionSize - shares * sharePrice < analyzer.maxShortPosition:
+                return 0
+            newPosition = position - shares
+        if self.maxTradeNotional != None and shares * sharePrice > self.maxTradeNotional:
+            return 0
+        if self.maxGrossExposure != None and (abs(position) + shares) * sharePrice > self.maxGrossExposure:
+            return 0
+        if self.maxNetExposure != None and abs(newPosition) * sharePrice > self.maxNetExposure and \
+           abs(newPosition) > abs(position):
+            return 0
+        if self.dailyLossStop != None and PL != None and PL - dayStartPL <= -self.dailyLossStop and \
+           abs(newPosition) > abs(position):
+            return 0
+        return 1
+
+
+    def volatilities(self, stockData):
+        """
+        Returns the volatility (standard deviation of the close to close returns over the
+        volatility window) at every candlestick, measuring only the candlesticks added since
+        the last call, or all of them if the candlesticks were replaced.
+
+        @type stockData: list, the candlesticks
+        @rtype: array, the volatility at every candlestick, 0 until a return is known
+        """
+        measuredCount = len(self._volatilities)
+        replaced = (stockData is not self._stockData or len(stockData) < measuredCount or
+                    (measuredCount > 0 and stockData[measuredCount - 1] is not self._lastMeasuredBar) or
+                    self._returns == None or self._returns.duration != self.volatilityWindow)
+        if replaced:
+            self._stockData = stockData
+            self._volatilities = array('d')
+            self._returns = WelfordWindow(self.volatilityWindow)
+            measuredCount = 0
+        if len(stockData) > measuredCount:
+            self._measure(stockData, measuredCount)
+            self._lastMeasuredBar = stockData[-1]
+        return self._volatilities
+
+
+    def _allowStreaming(self, positionType, currentPositionInCash, candleStickCount, shares):
+        """
+        Checks a trade against the rules in the current state of the account. Helper.
+
+        @rtype: int, 1 if the trade is allowed and 0 otherwise
+        """
+        analyzer = self.analyzer
+        sharePrice = analyzer.data.stockData[candleStickCount][1]
+        PL = None
+        if self.dailyLossStop != None:
+            # the commission settled by postAnalysisCalculations() is already out of cash
+            PL = (analyzer.cash + analyzer.position * sharePrice - analyzer.cashInitial -
+                  (analyzer.commissionTotal - analyzer.commissionSettled))
+            day = candleStickCount // Data.DAY_LENGTH
+            if day != self._day:
+                self._day = day
+                self._dayStartPL = PL
+        return self.checkFill(positionType, candleStickCount, shares, sharePrice, analyzer.position,
+                              currentPositionInCash, PL, self._dayStartPL)
+
+
+    def _measure(self, stockData, firstCandleStick):
+        """
+        Appends the volatility of the candlesticks from (firstCandleStick) on, continuing the
+        rolling window of returns left by the previous call. Helper.
+
+        @rtype: None
+        """
+        returns = self._returns
+        for candleStickCount in range(firstCandleStick, len(stockData)):
+            if candleStickCount >= 1:
+                previousClose = stockData[candleStickCount - 1][1]
+                if previousClose > 0:
+                    returns.add(stockData[candleStickCount][1] / previousClose - 1)
+                else:
+                    returns.add(0.0)
+            if len(returns.window) < 2:
+                self._volatilities.append(0.0)
+            else:
+                self._volatilities.append(returns.standardDeviation())
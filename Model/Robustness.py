@@ -0,0 +1,223 @@
+import random
+from Data import Data
+from Analysis import Analysis
+
+class RobustnessReport():
+    """
+    Holds the distributions of profit/loss and maximum drawdown over a set of synthetic
+    paths produced by Robustness.
+    """
+
+    def __init__(self, method, finalPLs, maxDrawdowns):
+        """
+        Initializes a new RobustnessReport.
+
+        @type method: str, how the paths were produced
+        @type finalPLs: list, the profit/loss at the end of every path ($)
+        @type maxDrawdowns: list, the maximum drawdown of every path ($), positive
+        @rtype: None
+        """
+        self.method = method
+        self.pathCount = len(finalPLs)
+        self.finalPLs = sorted(finalPLs)
+        self.maxDrawdowns = sorted(maxDrawdowns)
+        self.expectedPL = sum(finalPLs) / float(max(1, len(finalPLs)))
+        self.probabilityOfLoss = len([PL for PL in finalPLs if PL < 0]) / float(max(1, len(finalPLs)))
+
+
+    def PLPercentile(self, percent):
+        """
+        Returns a percentile of the profit/loss distribution.
+
+        @type percent: float, between 0 and 100
+        @rtype: float ($)
+        """
+        return percentile(self.finalPLs, percent)
+
+
+    def drawdownPercentile(self, percent):
+        """
+        Returns a percentile of the maximum drawdown distribution.
+
+        @type percent: float, between 0 and 100
+        @rtype: float ($)
+        """
+        return percentile(self.maxDrawdowns, percent)
+
+
+    def summary(self):
+        """
+        Returns a one-line summary of the report.
+
+        @rtype: str
+        """
+        return (self.method + ": " + str(self.pathCount) + " paths, expected P/L " +
+                str(round(self.expectedPL, 2)) + ", P/L 5%/50%/95% " +
+                str(round(self.PLPercentile(5), 2)) + "/" + str(round(self.PLPercentile(50), 2)) +
+                "/" + str(round(self.PLPercentile(95), 2)) + ", max drawdown 95% " +
+                str(round(self.drawdownPercentile(95), 2)) + ", P(loss) " +
+                str(round(self.probabilityOfLoss, 3)))
+
+
+class Robustness():
+    """
+    Class responsible for Monte Carlo and bootstrap robustness analysis of a trading simulation.
+    The profit/loss of a single simulation is decomposed into trade profits/losses and
+    candlestick profits/losses, which are resampled into thousands of synthetic paths.
+
+    Paths are evaluated together: the (paths x time) matrix is walked one time step at a
+    time, advancing the equity, peak and drawdown of every path at once, instead of running
+    one simulation per path.
+    """
+
+    def __init__(self, pathCount=5000, seed=None):
+        """
+        Initializes a new Robustness analysis.
+
+        @type pathCount: int, the number of synthetic paths to produce
+        @type seed: int, the seed of the random number generator, for reproducible results
+        @rtype: None
+        """
+        self.pathCount = pathCount
+        self._random = random.Random(seed)
+        self.candleStickPLs = []        # profit/loss of the simulation on every candlestick ($)
+        self.tradePLs = []              # profit/loss between consecutive trades ($)
+
+
+    def analyzeStrategy(self, tradingStrategy, blockLength=None):
+        """
+        Simulates a trading strategy on the stock currently being tracked in Data, and returns
+        the trade bootstrap and block bootstrap reports of the simulation.
+
+        @type tradingStrategy: TradingStrategy, the strategy to analyze
+        @type blockLength: int, the length of the blocks of candlesticks resampled together,
+                           defaults to the square root of the number of candlesticks
+        @rtype: list, of RobustnessReport, trade bootstrap then block bootstrap
+        """
+        data = Data.getInstance()
+        analyzer = Analysis.getInstance()
+        data.clearTrades()
+        analyzer.preAnalysisCalculations()
+        tradingStrategy.simulateStrategy()
+        analyzer.postAnalysisCalculations()
+
+        self.decompose(data.stockData, data.journal.trades(), analyzer.commission)
+        return [self.tradeBootstrap(), self.blockBootstrap(blockLength)]
+
+
+    def decompose(self, stockData, tradeLog, commission):
+        """
+        Splits a simulation into its profit/loss per candlestick and per trade.
+
+        @type stockData: list, the candlesticks the simulation ran on
+        @type tradeLog: iterable, the trade records of the simulation, see TradingStrategy
+        @type commission: float, the commission paid per trade ($)
+        @rtype: None
+        """
+        candleStickTotal = len(stockData)
+        sharesTraded = [0] * candleStickTotal
+        commissions = [0] * candleStickTotal
+        for trade in tradeLog:
+            if trade[2] == "Long":
+                sharesTraded[trade[0]] += trade[3]
+            else:
+                sharesTraded[trade[0]] -= trade[3]
+            commissions[trade[0]] += commission
+
+        # the position held over a candlestick is the one entered at the previous close
+        self.candleStickPLs = [0.0] * candleStickTotal
+        position = 0
+        for candleStickCount in range(candleStickTotal):
+            if candleStickCount > 0:
+                self.candleStickPLs[candleStickCount] = position * (stockData[candleStickCount][1] -
+                                                                    stockData[candleStickCount - 1][1])
+            self.candleStickPLs[candleStickCount] -= commissions[candleStickCount]
+            position += sharesTraded[candleStickCount]
+
+        # profit/loss accumulated between consecutive trades, including the commission paid
+        self.tradePLs = []
+        tradePL = 0.0
+        for candleStickCount in range(candleStickTotal):
+            tradePL += self.candleStickPLs[candleStickCount]
+            if sharesTraded[candleStickCount] != 0 or commissions[candleStickCount] != 0:
+                self.tradePLs.append(tradePL)
+                tradePL = 0.0
+        if tradePL != 0:
+            self.tradePLs.append(tradePL)
+
+
+    def tradeBootstrap(self):
+        """
+        Resamples the trade profits/losses with replacement into synthetic paths of the same
+        number of trades.
+
+        @rtype: RobustnessReport
+        """
+        randomIndex = self._random.randrange
+        tradeTotal = len(self.tradePLs)
+        columns = []
+        for step in range(tradeTotal):
+            columns.append([self.tradePLs[randomIndex(tradeTotal)] for path in range(self.pathCount)])
+        return self._evaluatePaths("Trade bootstrap", columns)
+
+
+    def blockBootstrap(self, blockLength=None):
+        """
+        Resamples the candlestick profits/losses in blocks of consecutive candlesticks, which
+        keeps the short-term autocorrelation of the price series, into synthetic paths of the
+        same number of candlesticks.
+
+        @type blockLength: int, the length of the blocks, defaults to the square root of the
+                           number of candlesticks
+        @rtype: RobustnessReport
+        """
+        candleStickTotal = len(self.candleStickPLs)
+        if candleStickTotal == 0:
+            return self._evaluatePaths("Block bootstrap", [])
+        if blockLength == None:
+            blockLength = max(1, int(candleStickTotal ** 0.5))
+        blockLength = min(blockLength, candleStickTotal)
+
+        # block start of every path, redrawn every blockLength candlesticks
+        randomIndex = self._random.randrange
+        columns = []
+        starts = None
+        for step in range(candleStickTotal):
+            offset = step % blockLength
+            if offset == 0:
+                starts = [randomIndex(candleStickTotal - blockLength + 1) for path in range(self.pathCount)]
+            columns.append([self.candleStickPLs[start + offset] for start in starts])
+        return self._evaluatePaths("Block bootstrap", columns)
+
+
+    def _evaluatePaths(self, method, columns):
+        """
+        Accumulates the (time x paths) matrix of profits/losses into the final profit/loss and
+        maximum drawdown of every path. Helper.
+
+        @rtype: RobustnessReport
+        """
+        equity = [0.0] * self.pathCount
+        peak = [0.0] * self.pathCount
+        maxDrawdown = [0.0] * self.pathCount
+        for column in columns:
+            equity = [e + PL for e, PL in zip(equity, column)]
+            peak = [p if p > e else e for p, e in zip(peak, equity)]
+            maxDrawdown = [d if d > p - e else p - e for d, p, e in zip(maxDrawdown, peak, equity)]
+        return RobustnessReport(method, equity, maxDrawdown)
+
+
+def percentile(sortedValues, percent):
+    """
+    Returns a percentile of sorted values, interpolating linearly between values.
+
+    @type sortedValues: list, the values in ascending order
+    @type percent: float, between 0 and 100
+    @rtype: float
+    """
+    if len(sortedValues) == 0:
+        return 0.0
+    position = (len(sortedValues) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sortedValues) - 1)
+    return sortedValues[lower] + (sortedValues[upper] - sortedValues[lower]) * (position - lower)
@@ -0,0 +1,241 @@
+from array import array
+from collections import deque
+
+
+class RangeExtremes():
+    """
+    Class responsible for answering range minimum or maximum queries over a series, e.g. the
+    lowest low or highest high between two candlesticks, in constant time. A sparse table is
+    built once in O(n log n): level k holds the extreme of every window of 2^k values, and
+    any range is covered by two overlapping windows of the same level.
+    """
+
+    def __init__(self, values, function=max):
+        """
+        Initializes a new RangeExtremes.
+
+        @type values: list, the series
+        @type function: function, max for range maximums or min for range minimums
+        @rtype: None
+        """
+        self.function = function
+        self._levels = [array('d', values)]
+        width = 1
+        while 2 * width <= len(values):
+            previous = self._levels[-1]
+            self._levels.append(array('d', map(function, previous[:len(previous) - width],
+                                               previous[width:])))
+            width *= 2
+
+
+    def __len__(self):
+        return len(self._levels[0])
+
+
+    def query(self, first, last):
+        """
+        Returns the extreme of the series between two positions, both included.
+
+        @type first: int, the first position
+        @type last: int, the last position, at least first
+        @rtype: float
+        """
+        level = (last - first + 1).bit_length() - 1
+        values = self._levels[level]
+        return self.function(values[first], values[last - (1 << level) + 1])
+
+
+class RoundTrip():
+    """
+    Holds one round trip: shares bought then sold (long) or sold then bought back (short),
+    matched from the fills of the trade log.
+    """
+
+    def __init__(self, positionType, shares, entryCandleStick, entryPrice, exitCandleStick,
+                 exitPrice, commission):
+        """
+        Initializes a new RoundTrip.
+
+        @type positionType: str, "Long" or "Short"
+        @type shares: int, the number of shares traded
+        @type entryCandleStick: int, the candlestick # the position was opened at
+        @type entryPrice: float, the price per share the position was opened at
+        @type exitCandleStick: int, the candlestick # the position was closed at
+        @type exitPrice: float, the price per share the position was closed at
+        @type commission: float, the commissions of the fills allotted to the round trip
+        @rtype: None
+        """
+        self.positionType = positionType
+        self.shares = shares
+        self.entryCandleStick = entryCandleStick
+        self.entryPrice = entryPrice
+        self.exitCandleStick = exitCandleStick
+        self.exitPrice = exitPrice
+        self.commission = commission
+        direction = 1 if positionType == "Long" else -1
+        self.PL = direction * (exitPrice - entryPrice) * shares - commission
+        self.holdingTime = exitCandleStick - entryCandleStick
+                                        # in candlesticks (minutes)
+        self.MAE = None                 # maximum adverse excursion ($), see RoundTripMatcher
+        self.MFE = None                 # maximum favorable excursion ($), see RoundTripMatcher
+
+
+class RoundTripMatcher():
+    """
+    Class responsible for pairing the fills of a trade log into round trips, first in first
+    out: a fill first closes the oldest open lots on the other side, and whatever is left of
+    it opens a new lot. Every fill is handled once, so a run's fills are matched in a single
+    linear pass, and can be fed as they are recorded or read from the trade journal.
+
+    With the candlesticks, the maximum adverse and favorable excursions of every round trip
+    are taken from range minimum/maximum queries over the lows and highs, instead of
+    rescanning the candlesticks the position was held over.
+    """
+
+    def __init__(self, stockData=None, commission=0):
+        """
+        Initializes a new RoundTripMatcher.
+
+        @type stockData: list, the candlesticks the fills were made on, or None for no excursions
+        @type commission: float, the commission of a fill, as in Analysis
+        @rtype: None
+        """
+        self.commission = commission
+        self.openLots = deque()         # [candlestick #, signed shares left, price, commission
+                                        # per share], oldest first, all on the same side
+        self._lows = None
+        self._highs = None
+        if stockData != None and len(stockData) > 0:
+            self._lows = RangeExtremes([bar[3] for bar in stockData], min)
+            self._highs = RangeExtremes([bar[2] for bar in stockData], max)
+
+
+    def add(self, trade):
+        """
+        Matches a fill against the open lots.
+
+        @type trade: list, a trade record organized like Data.tradeLog
+        @rtype: list, of the RoundTrip closed by the fill
+        """
+        candleStickCount = trade[0]
+        shares = int(trade[3])
+        price = float(trade[4])
+        if shares <= 0:
+            return []
+        commissionPerShare = self.commission / float(shares)
+        signedShares = shares if trade[2] == "Long" else -shares
+
+        closed = []
+        while signedShares != 0 and len(self.openLots) > 0 and (self.openLots[0][1] > 0) != (signedShares > 0):
+            lot = self.openLots[0]
+            matched = min(abs(lot[1]), abs(signedShares))
+            positionType = "Long" if lot[1] > 0 else "Short"
+            roundTrip = RoundTrip(positionType, matched, lot[0], lot[2], candleStickCount, price,
+                                  matched * (lot[3] + commissionPerShare))
+            self._setExcursions(roundTrip)
+            closed.append(roundTrip)
+            if lot[1] > 0:
+                lot[1] -= matched
+                signedShares += matched
+            else:
+                lot[1] += matched
+                signedShares -= matched
+            if lot[1] == 0:
+                self.openLots.popleft()
+        if signedShares != 0:
+            self.openLots.append([candleStickCount, signedShares, price, commissionPerShare])
+        return closed
+
+
+    def _setExcursions(self, roundTrip):
+        """
+        Sets the maximum adverse and favorable excursions of a round trip from the lows and
+        highs between its entry and exit. Helper.
+
+        @rtype: None
+        """
+        if self._lows == None or roundTrip.exitCandleStick >= len(self._lows):
+            return
+        lowest = self._lows.query(roundTrip.entryCandleStick, roundTrip.exitCandleStick)
+        highest = self._highs.query(roundTrip.entryCandleStick, roundTrip.exitCandleStick)
+        if roundTrip.positionType == "Long":
+            roundTrip.MAE = max(0.0, roundTrip.entryPrice - lowest) * roundTrip.shares
+            roundTrip.MFE = max(0.0, highest - roundTrip.entryPrice) * roundTrip.shares
+        else:
+            roundTrip.MAE = max(0.0, highest - roundTrip.entryPrice) * roundTrip.shares
+            roundTrip.MFE = max(0.0, roundTrip.entryPrice - lowest) * roundTrip.shares
+
+
+class RoundTripStatistics():
+    """
+    Holds running totals over round trips, so that a run with very many fills can be
+    summarized without keeping all of its round trips.
+    """
+
+    def __init__(self):
+        """
+        Initializes new, empty RoundTripStatistics.
+
+        @rtype: None
+        """
+        self.count = 0
+        self.winners = 0
+        self.PL = 0
+        self.grossProfit = 0
+        self.grossLoss = 0
+        self.holdingTime = 0            # total, in candlesticks
+
+
+    def add(self, roundTrip):
+        """
+        Adds a round trip to the totals.
+
+        @type roundTrip: RoundTrip
+        @rtype: None
+        """
+        self.count += 1
+        self.PL += roundTrip.PL
+        self.holdingTime += roundTrip.holdingTime
+        if roundTrip.PL > 0:
+            self.winners += 1
+            self.grossProfit += roundTrip.PL
+        else:
+            self.grossLoss -= roundTrip.PL
+
+
+    def winRate(self):
+        """
+        Returns the share of round trips with a profit.
+
+        @rtype: float, between 0 and 1
+        """
+        if self.count == 0:
+            return 0.0
+        return self.winners / float(self.count)
+
+
+    def averageHoldingTime(self):
+        """
+        Returns the average holding time of the round trips.
+
+        @rtype: float, in candlesticks (minutes)
+        """
+        if self.count == 0:
+            return 0.0
+        return self.holdingTime / float(self.count)
+
+
+def matchRoundTrips(trades, stockData=None, commission=0):
+    """
+    Pairs fills into round trips, first in first out, in a single pass.
+
+    @type trades: iterable, of trade records organized like Data.tradeLog, e.g.
+                  Data.journal.trades()
+    @type stockData: list, the candlesticks the fills were made on, or None for no excursions
+    @type commission: float, the commission of a fill, as in Analysis
+    @rtype: generator, of RoundTrip in the order they were closed
+    """
+    matcher = RoundTripMatcher(stockData, commission)
+    for trade in trades:
+        for roundTrip in matcher.add(trade):
+            yield roundTrip
@@ -0,0 +1,133 @@
+from Data import Data
+from Analysis import Analysis
+from View import View
+from Resampler import Resampler
+from RiskEngine import RISK_RULES
+from WorkerPool import runInParallel
+
+
+class SessionContext():
+    """
+    Holds the state of one trading session: its Data (candlesticks, trade log and signals),
+    its Analysis (account), its Resampler and, for the session shown on screen, its View.
+    Strategies are given a context and use its state instead of the singletons, so that
+    independent sessions can be simulated side by side in the same process.
+
+    The default context wraps the singletons used by Market.pyde. Other contexts have their
+    own Data and Analysis, and may share candlesticks with other sessions: the candlestick
+    list is only read by a simulation, so it is shared rather than copied.
+    """
+
+    # the context of the singletons, see getDefault()
+    _default = None
+
+    @staticmethod
+    def getDefault():
+        """
+        Returns the context of the Data, Analysis, Resampler and View singletons. If it does
+        not exist, create it and then return it.
+
+        @rtype: SessionContext
+        """
+        if SessionContext._default == None:
+            SessionContext._default = SessionContext(Data.getInstance(), Analysis.getInstance(),
+                                                     Resampler.getInstance())
+            SessionContext._default.isDefault = 1
+        return SessionContext._default
+
+
+    @staticmethod
+    def resolve(context):
+        """
+        Returns the given context, or the default context if none is given.
+
+        @type context: SessionContext, or None
+        @rtype: SessionContext
+        """
+        if context == None:
+            return SessionContext.getDefault()
+        return context
+
+
+    @staticmethod
+    def forBars(stockData, ticker=None, exchange=None, timeDays=0):
+        """
+        Creates a headless context simulating on the given candlesticks, with the account
+        settings (starting cash, commission, limits and risk rules) of the default context.
+
+        @type stockData: list, the candlesticks, shared with the caller and other sessions
+        @type ticker: str, stock ticker name, defaults to the stock of the default context
+        @type exchange: str, stock exchange name, defaults to the stock of the default context
+        @type timeDays: int, the day of the candlesticks, as number of days prior to current day
+        @rtype: SessionContext
+        """
+        default = SessionContext.getDefault()
+        data = Data()
+        data.stockData = stockData
+        data.ticker = ticker if ticker != None else default.data.ticker
+        data.exchange = exchange if exchange != None else default.data.exchange
+        data.timeDays = timeDays
+
+        analyzer = Analysis(data)
+        for field in ["cashInitial", "positionInitial", "commission", "maxLongPosition",
+                      "maxShortPosition", "strategy"]:
+            setattr(analyzer, field, getattr(default.analyzer, field))
+        for rule in RISK_RULES:
+            setattr(analyzer.risk, rule, getattr(default.analyzer.risk, rule))
+        return SessionContext(data, analyzer, Resampler())
+
+
+    def __init__(self, data, analyzer, resampler=None, view=None):
+        """
+        Initializes a new SessionContext.
+
+        @type data: Data, the candlesticks, trade log and signals of the session
+        @type analyzer: Analysis, the account of the session
+        @type resampler: Resampler, the higher timeframes of the session's candlesticks
+        @type view: View, the View drawing the session, or None for a headless session
+        @rtype: None
+        """
+        self.data = data
+        self.analyzer = analyzer
+        self.resampler = resampler if resampler != None else Resampler()
+        self.view = view
+        self.isDefault = 0
+
+
+    def getView(self):
+        """
+        Returns the View drawing this session. The default context uses the View singleton,
+        which is created after the first strategies.
+
+        @rtype: View, or None for a headless session
+        """
+        if self.isDefault == 1:
+            return View.getInstantiatedInstance()
+        return self.view
+
+
+def simulateConcurrently(strategyFactories, stockData, workerCount=4):
+    """
+    Simulates several strategies on the same candlesticks at once, each in its own headless
+    SessionContext, on a pool of worker threads (see WorkerPool.runInParallel()). The
+    candlesticks are shared by every session instead of being copied.
+
+    @type strategyFactories: list, of functions creating a TradingStrategy from a SessionContext,
+                             e.g. SMACrossOver or lambda context: RuleStrategy(rules, context=context)
+    @type stockData: list, the candlesticks, only read by the simulations
+    @type workerCount: int, the number of simulations run at a time
+    @rtype: list, of (TradingStrategy, SessionContext) in the order of the factories
+    """
+    sessions = []
+    for factory in strategyFactories:
+        context = SessionContext.forBars(stockData)
+        sessions.append((factory(context), context))
+
+    def simulate(session):
+        tradingStrategy, context = session
+        context.analyzer.preAnalysisCalculations()
+        tradingStrategy.simulateStrategy()
+        context.analyzer.postAnalysisCalculations()
+
+    runInParallel(simulate, sessions, workerCount)
+    return sessions
@@ -0,0 +1,182 @@
+import json
+import os
+import struct
+from Data import Data
+from Analysis import Analysis
+
+# file layout: header, then sections of (tag, length, payload)
+MAGIC = b"MRSS"
+VERSION = 1
+_HEADER = struct.Struct("<4sH")             # magic, version
+_SECTION = struct.Struct("<4sI")            # tag, payload length
+
+# the account fields of Analysis kept in a snapshot
+ACCOUNT_FIELDS = ["cashInitial", "cash", "position", "positionSize", "commissionTotal",
+                  "commissionSettled", "tradedPositionSize", "PL", "strategy"]
+
+
+class SessionSnapshot():
+    """
+    Class responsible for saving the state of a session to a binary file and restoring it on
+    the next launch, so that a restart (even after a crash) shows the last state at once
+    instead of after a download and a simulation.
+
+    A snapshot holds the candlesticks as raw double columns, the trade signals as packed
+    integers, and the trade log, account, selection (ticker, exchange, day, strategy and
+    View mode) and trade journal run as JSON. It is written to a temporary file and renamed
+    over the previous snapshot, so a crash while saving leaves the previous snapshot intact.
+    It is read through mmap where available (not on Jython), otherwise read whole.
+
+    On restore, the run is made current again in the trade journal if the journal holds it.
+    Otherwise the trades of the trade log are recorded in a new run, so the journal has the
+    trades of the restored session either way.
+
+    Indicator series are not saved; the strategy recomputes them from the restored
+    candlesticks on its first refresh.
+    """
+
+    def __init__(self, path="session.snapshot"):
+        """
+        Initializes a new SessionSnapshot.
+
+        @type path: str, the snapshot file
+        @rtype: None
+        """
+        self.path = path
+
+
+    def save(self, viewMode):
+        """
+        Saves the current session: the candlesticks, trade log and signals in Data, the
+        account in Analysis and the given View mode.
+
+        @type viewMode: int, the mode of the View
+        @rtype: None
+        """
+        data = Data.getInstance()
+        analyzer = Analysis.getInstance()
+        stockData = data.stockData
+
+        metadata = {"ticker": data.ticker, "exchange": data.exchange, "timeDays": data.timeDays,
+                    "loadedStock": data._loadedStock, "mode": viewMode,
+                    "journal": data.journal.path, "journalRun": data.journal.run,
+                    "account": dict([(field, getattr(analyzer, field)) for field in ACCOUNT_FIELDS])}
+        count = len(stockData)
+        bars = [struct.pack("<I", count)]
+        for column in range(6):
+            bars.append(struct.pack("<%dd" % count, *[bar[column] for bar in stockData]))
+        signals = [value for signal in data.tradeSignals for value in signal]
+
+        temporaryPath = self.path + ".tmp"
+        snapshotFile = open(temporaryPath, "wb")
+        snapshotFile.write(_HEADER.pack(MAGIC, VERSION))
+        for tag, payload in [(b"META", json.dumps(metadata).encode("utf-8")),
+                             (b"BARS", b"".join(bars)),
+                             (b"SIGS", struct.pack("<%di" % len(signals), *signals)),
+                             (b"TLOG", json.dumps(list(data.tradeLog)).encode("utf-8"))]:
+            snapshotFile.write(_SECTION.pack(tag, len(payload)))
+            snapshotFile.write(payload)
+        snapshotFile.flush()
+        os.fsync(snapshotFile.fileno())
+        snapshotFile.close()
+        try:
+            os.rename(temporaryPath, self.path)
+        except OSError:
+            # rename does not replace an existing file on Windows
+            os.remove(self.path)
+            os.rename(temporaryPath, self.path)
+
+
+    def restore(self):
+        """
+        Restores the session saved in the snapshot into Data and Analysis.
+
+        @rtype: int, the View mode of the session, or None if there is no valid snapshot
+        """
+        if not os.path.exists(self.path):
+            return None
+        snapshot = _mapFile(self.path)
+        try:
+            sections = _readSections(snapshot)
+        except (struct.error, ValueError):
+            return None
+        finally:
+            if hasattr(snapshot, "close"):
+                snapshot.close()
+        if sections == None:
+            return None
+
+        metadata = json.loads(sections[b"META"].decode("utf-8"))
+        data = Data.getInstance()
+        analyzer = Analysis.getInstance()
+        data.ticker = str(metadata["ticker"])
+        data.exchange = str(metadata["exchange"])
+        data.timeDays = metadata["timeDays"]
+        if metadata["loadedStock"] != None:
+            data._loadedStock = (str(metadata["loadedStock"][0]), str(metadata["loadedStock"][1]),
+                                 metadata["loadedStock"][2])
+        for field in ACCOUNT_FIELDS:
+            setattr(analyzer, field, metadata["account"][field])
+
+        bars = sections[b"BARS"]
+        count = struct.unpack_from("<I", bars, 0)[0]
+        columns = [struct.unpack_from("<%dd" % count, bars, 4 + 8 * count * column) for column in range(6)]
+        data.popList(data.stockData)
+        data.stockData.extend([[columns[0][i], columns[1][i], columns[2][i], columns[3][i],
+                                columns[4][i], columns[5][i]] for i in range(count)])
+        data.revision += 1
+
+        signals = struct.unpack_from("<%di" % (len(sections[b"SIGS"]) // 4), sections[b"SIGS"], 0)
+        data.clearTrades()
+        data.tradeSignals.extend([[signals[i], signals[i + 1]] for i in range(0, len(signals), 2)])
+
+        trades = [[str(value) if isinstance(value, type(u"")) else value for value in trade]
+                  for trade in json.loads(sections[b"TLOG"].decode("utf-8"))]
+        if data.journal.path != None and metadata.get("journal") == data.journal.path and \
+           data.journal.resumeRun(metadata["journalRun"]) > 0:
+            data.tradeLog.extend(trades)
+        else:
+            for trade in trades:
+                data.recordTrade(trade)
+        return metadata["mode"]
+
+
+def _mapFile(path):
+    """
+    Returns the contents of a file, memory-mapped where mmap is available. Helper.
+
+    @rtype: mmap or str
+    """
+    snapshotFile = open(path, "rb")
+    try:
+        try:
+            import mmap
+            return mmap.mmap(snapshotFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ImportError, AttributeError, ValueError, EnvironmentError):
+            return snapshotFile.read()
+    finally:
+        snapshotFile.close()
+
+
+def _readSections(snapshot):
+    """
+    Returns the sections of a snapshot, or None if it is not a complete snapshot. Helper.
+
+    @rtype: dict, tag -> payload
+    """
+    magic, version = _HEADER.unpack_from(snapshot, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+    sections = {}
+    position = _HEADER.size
+    while position < len(snapshot):
+        tag, length = _SECTION.unpack_from(snapshot, position)
+        position += _SECTION.size
+        if position + length > len(snapshot):
+            return None
+        sections[tag] = snapshot[position:position + length]
+        position += length
+    for tag in [b"META", b"BARS", b"SIGS", b"TLOG"]:
+        if tag not in sections:
+            return None
+    return sections
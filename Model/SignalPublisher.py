@@ -0,0 +1,305 @@
+import socket
+import threading
+from collections import deque
+from Clock import monotonicTime
+from Instrumentation import FrameTimeHistogram
+
+# fields of a signal message, in order, separated by tabs
+MESSAGE_FIELDS = ["sequence", "ticker", "exchange", "barTime", "candleStick", "side", "shares",
+                  "price", "strategy"]
+
+
+class _Subscriber():
+    """
+    Holds one connected consumer of a SignalPublisher: its socket, the messages waiting to be
+    sent to it, and the thread sending them. Helper.
+    """
+
+    def __init__(self, publisher, connection, maxPending):
+        self.publisher = publisher
+        self.connection = connection
+        self.pending = deque()          # (message, monotonic time published), oldest first
+        self.maxPending = maxPending
+        self.dropped = 0                # messages dropped because the consumer fell behind
+        self.closed = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._send)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def enqueue(self, message, publishTime):
+        """
+        Queues a message, dropping the oldest one if the consumer is too far behind.
+
+        @rtype: None
+        """
+        self.condition.acquire()
+        try:
+            if len(self.pending) >= self.maxPending:
+                self.pending.popleft()
+                self.dropped += 1
+            self.pending.append((message, publishTime))
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def close(self):
+        self.condition.acquire()
+        try:
+            self.closed = 1
+            self.condition.notify()
+        finally:
+            self.condition.release()
+
+
+    def _send(self):
+        """
+        Sends the queued messages as they arrive: everything queued while the previous batch
+        was being sent goes out in a single write. Runs on the subscriber's thread.
+
+        @rtype: None
+        """
+        while True:
+            self.condition.acquire()
+            try:
+                while len(self.pending) == 0 and self.closed == 0:
+                    self.condition.wait()
+                if self.closed == 1:
+                    break
+                batch = list(self.pending)
+                self.pending.clear()
+            finally:
+                self.condition.release()
+            try:
+                self.connection.sendall("".join([message for message, publishTime in batch]))
+            except socket.error:
+                break
+            self.publisher._recordBatch(batch, monotonicTime())
+        try:
+            self.connection.close()
+        except socket.error:
+            pass
+        self.publisher._removeSubscriber(self)
+
+
+class SignalPublisher():
+    """
+    Class responsible for publishing the new long and short trades of the live session to
+    other processes, e.g. an execution process, as they are made.
+
+    Consumers connect to a local TCP socket (Jython has no Unix domain sockets). On connect,
+    they receive a header line starting with # and naming the fields, then one line per
+    signal, with its fields separated by tabs:
+        sequence, ticker, exchange, barTime, candleStick, side (L or S), shares, price, strategy
+
+    Publishing only queues the message and wakes the consumers' sender threads, so it never
+    waits on a socket. Each consumer has its own queue. Messages queued while the previous
+    write was in progress are sent together in one write, so a busy consumer gets batches
+    rather than falling further behind one message at a time. A consumer whose queue is full
+    loses its oldest messages instead of holding up the simulation. Nagle's algorithm is
+    turned off, so a lone signal goes out at once. metrics() reports the batching and
+    backpressure: messages published, sent and dropped, batch sizes, queue depths and the
+    latency from publication to the end of the write.
+    """
+
+    # Singleton instance of SignalPublisher
+    _instance = None
+
+    @staticmethod
+    def getInstance():
+        """
+        Returns the singleton instance of SignalPublisher. If it does not exist, create it and
+        then return it.
+
+        @rtype: SignalPublisher, the singleton instance of SignalPublisher
+        """
+        if SignalPublisher._instance == None:
+            SignalPublisher._instance = SignalPublisher()
+        return SignalPublisher._instance
+
+
+    def __init__(self, maxPending=4096):
+        """
+        Initializes a new SignalPublisher. Singleton, should only be called by getInstance().
+
+        @type maxPending: int, the number of messages queued per consumer before the oldest
+                          ones are dropped
+        @rtype: None
+        """
+        self.maxPending = maxPending
+        self.port = None                # the port listened on, None until started
+        self.sequence = 0               # number of signals published
+        self.sentCount = 0              # number of messages written to consumers
+        self.batchCount = 0             # number of writes
+        self.maxBatch = 0               # largest number of messages in one write
+        self.maxQueueDepth = 0          # largest number of messages waiting for a consumer
+        self.latencies = FrameTimeHistogram(1024)
+                                        # publication to end of write, of the latest messages
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._watermarks = {}           # (ticker, exchange, time of the day's first candlestick,
+                                        # strategy) -> last candlestick published
+
+
+    def start(self, port=5557, host="127.0.0.1"):
+        """
+        Starts listening for consumers on a local port.
+
+        @type port: int, the port, 0 for any free port
+        @type host: str, the interface listened on
+        @rtype: int, the port listened on
+        """
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(5)
+        self._server = server
+        self.port = server.getsockname()[1]
+        accepter = threading.Thread(target=self._accept)
+        accepter.daemon = True
+        accepter.start()
+        return self.port
+
+
+    def stop(self):
+        """
+        Stops listening and disconnects every consumer.
+
+        @rtype: None
+        """
+        if self._server != None:
+            try:
+                self._server.close()
+            except socket.error:
+                pass
+            self._server = None
+        for subscriber in self._subscriberList():
+            subscriber.close()
+
+
+    def publish(self, data, trade):
+        """
+        Publishes a trade of a session to every consumer, if it is newer than the trades
+        already published for the session's stock, day and strategy, so that a trade is not
+        published twice when its candlestick is simulated again. Which trades are live signals
+        is decided by the caller, see TradingStrategy.publishSignal().
+
+        @type data: Data, the session the trade was made in
+        @type trade: list, the trade record, organized like Data.tradeLog
+        @rtype: int, 1 if the trade was published, 0 otherwise
+        """
+        if self.port == None:
+            return 0
+        candleStickCount = trade[0]
+        key = (data.ticker, data.exchange, data.stockData[0][0], trade[1])
+        if candleStickCount <= self._watermarks.get(key, -1):
+            return 0
+        self._watermarks[key] = candleStickCount
+
+        publishTime = monotonicTime()
+        self.sequence += 1
+        barTime = data.stockData[candleStickCount][0]
+        message = "%d\t%s\t%s\t%d\t%d\t%s\t%d\t%s\t%s\n" % (
+            self.sequence, data.ticker, data.exchange, barTime, candleStickCount,
+            "L" if trade[2] == "Long" else "S", trade[3], trade[4], trade[1])
+        for subscriber in self._subscriberList():
+            subscriber.enqueue(message, publishTime)
+            if len(subscriber.pending) > self.maxQueueDepth:
+                self.maxQueueDepth = len(subscriber.pending)
+        return 1
+
+
+    def resetWatermark(self, ticker, exchange):
+        """
+        Allows the trades of a stock to be published again from the first candlestick of
+        its days, for every strategy, e.g. when a day is replayed.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @rtype: None
+        """
+        for key in list(self._watermarks):
+            if key[0] == ticker and key[1] == exchange:
+                del self._watermarks[key]
+
+
+    def metrics(self):
+        """
+        Returns the batching and backpressure metrics of the publisher.
+
+        @rtype: dict, with the subscribers, messages published, sent and dropped, writes,
+                largest batch, current and largest queue depth, and the median and 99th
+                percentile latency from publication to the end of the write (seconds)
+        """
+        subscribers = self._subscriberList()
+        median, percentile99 = self.latencies.percentiles([50, 99])
+        return {"subscribers": len(subscribers), "published": self.sequence,
+                "sent": self.sentCount, "dropped": sum([subscriber.dropped for subscriber in subscribers]),
+                "batches": self.batchCount, "maxBatch": self.maxBatch,
+                "queueDepth": max([len(subscriber.pending) for subscriber in subscribers] + [0]),
+                "maxQueueDepth": self.maxQueueDepth,
+                "latencyMedian": median, "latency99": percentile99}
+
+
+    def _accept(self):
+        """
+        Accepts consumers until the publisher is stopped. Runs on its own thread. Helper.
+
+        @rtype: None
+        """
+        server = self._server
+        while self._server is server:
+            try:
+                connection, address = server.accept()
+            except socket.error:
+                return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection.sendall("#" + "\t".join(MESSAGE_FIELDS) + "\n")
+            self._lock.acquire()
+            try:
+                self._subscribers.append(_Subscriber(self, connection, self.maxPending))
+            finally:
+                self._lock.release()
+
+
+    def _subscriberList(self):
+        """
+        Returns a copy of the list of consumers, safe to iterate while consumers come and go.
+        Helper.
+
+        @rtype: list, of _Subscriber
+        """
+        self._lock.acquire()
+        try:
+            return list(self._subscribers)
+        finally:
+            self._lock.release()
+
+
+    def _removeSubscriber(self, subscriber):
+        self._lock.acquire()
+        try:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        finally:
+            self._lock.release()
+
+
+    def _recordBatch(self, batch, sentTime):
+        """
+        Records the size and latencies of a write to a consumer. Helper.
+
+        @rtype: None
+        """
+        self._lock.acquire()
+        try:
+            self.sentCount += len(batch)
+            self.batchCount += 1
+            self.maxBatch = max(self.maxBatch, len(batch))
+            for message, publishTime in batch:
+                self.latencies.add(sentTime - publishTime)
+        finally:
+            self._lock.release()
@@ -0,0 +1,241 @@
+import calendar
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# offset from UTC of the exchanges' timezone in minutes, as in getprices' TIMEZONE_OFFSET
+DEFAULT_TIMEZONE_OFFSET = -240
+
+
+class TimeIndex():
+    """
+    Class responsible for addressing candlesticks by time instead of by position: a sorted
+    array of the candlesticks' times (seconds since the epoch, UTC, as decoded by BarParser)
+    searched by bisection, so that looking up a time or slicing a time range costs
+    O(log n) whatever the number of candlesticks.
+
+    The index follows its candlesticks as they grow: candlesticks appended since the last
+    lookup are added to the index, and the index is rebuilt if the candlesticks were
+    replaced, as in Resampler.
+    """
+
+    def __init__(self, stockData=None):
+        """
+        Initializes a new TimeIndex.
+
+        @type stockData: list, the candlesticks, organized like Data.stockData
+        @rtype: None
+        """
+        self.times = array('d')         # time of each indexed candlestick, in order
+        self._stockData = None          # the candlesticks the index was built from
+        self._lastIndexedBar = None     # the last candlestick indexed
+        if stockData != None:
+            self.update(stockData)
+
+
+    def update(self, stockData=None):
+        """
+        Indexes the candlesticks added since the last call, or rebuilds the index if the
+        candlesticks were replaced (e.g. by Data.refreshStockData).
+
+        @type stockData: list, the candlesticks, defaults to the ones already indexed
+        @rtype: None
+        """
+        if stockData == None:
+            stockData = self._stockData if self._stockData != None else []
+        indexedCount = len(self.times)
+        replaced = (stockData is not self._stockData or len(stockData) < indexedCount or
+                    (indexedCount > 0 and stockData[indexedCount - 1] is not self._lastIndexedBar))
+        if replaced:
+            self._stockData = stockData
+            self.times = array('d', [bar[0] for bar in stockData])
+        elif len(stockData) > indexedCount:
+            self.times.extend([bar[0] for bar in stockData[indexedCount:]])
+        if len(stockData) > 0:
+            self._lastIndexedBar = stockData[-1]
+
+
+    def indexAt(self, timestamp):
+        """
+        Returns the index of the candlestick covering a time: the last one at or before it.
+
+        @type timestamp: float, seconds since the epoch
+        @rtype: int, the candlestick #, or None if the time is before the first candlestick
+        """
+        self.update()
+        index = bisect_right(self.times, timestamp) - 1
+        if index < 0:
+            return None
+        return index
+
+
+    def indexOf(self, timestamp):
+        """
+        Returns the index of the candlestick of a time, only if there is one at that exact time.
+
+        @type timestamp: float, seconds since the epoch
+        @rtype: int, the candlestick #, or None if there is no candlestick at that time
+        """
+        self.update()
+        index = bisect_left(self.times, timestamp)
+        if index < len(self.times) and self.times[index] == timestamp:
+            return index
+        return None
+
+
+    def indexAtClock(self, hour, minute, timezoneOffset=DEFAULT_TIMEZONE_OFFSET):
+        """
+        Returns the index of the candlestick covering a time of day, e.g. 10:31, on the day
+        of the first candlestick.
+
+        @type hour: int, the hour in the exchange's timezone
+        @type minute: int, the minute
+        @type timezoneOffset: int, the exchange's offset from UTC in minutes
+        @rtype: int, the candlestick #, or None if the time is before the first candlestick
+        """
+        self.update()
+        if len(self.times) == 0:
+            return None
+        return self.indexAt(clockTime(self.times[0], hour, minute, timezoneOffset))
+
+
+    def timeRange(self, startTime, stopTime):
+        """
+        Returns the positions of the candlesticks in a time range.
+
+        @type startTime: float, the first time included, seconds since the epoch
+        @type stopTime: float, the first time excluded, seconds since the epoch
+        @rtype: tuple, (first candlestick #, candlestick # after the last)
+        """
+        self.update()
+        return bisect_left(self.times, startTime), bisect_left(self.times, stopTime)
+
+
+    def slice(self, startTime, stopTime):
+        """
+        Returns the candlesticks in a time range.
+
+        @type startTime: float, the first time included, seconds since the epoch
+        @type stopTime: float, the first time excluded, seconds since the epoch
+        @rtype: list, the candlesticks, organized like Data.stockData
+        """
+        first, stop = self.timeRange(startTime, stopTime)
+        return self._stockData[first:stop]
+
+
+def clockTime(timestamp, hour, minute, timezoneOffset=DEFAULT_TIMEZONE_OFFSET):
+    """
+    Returns the time of a time of day, on the day of another time in an exchange's timezone.
+
+    @type timestamp: float, any time of the day, seconds since the epoch
+    @type hour: int, the hour in the exchange's timezone
+    @type minute: int, the minute
+    @type timezoneOffset: int, the exchange's offset from UTC in minutes, e.g. -240
+    @rtype: float, seconds since the epoch
+    """
+    day = time.gmtime(timestamp + timezoneOffset * 60)
+    midnight = calendar.timegm((day.tm_year, day.tm_mon, day.tm_mday, 0, 0, 0))
+    return float(midnight + hour * 3600 + minute * 60 - timezoneOffset * 60)
+
+
+class AlignedBars():
+    """
+    Holds the candlesticks of several series (e.g. tickers) brought onto a common clock by
+    alignBars(). For every time of the clock and every series, the position of the series'
+    candlestick at or before that time is kept, so gaps are filled forward with the previous
+    candlestick; positions before a series' first candlestick are -1.
+    """
+
+    def __init__(self, times, barSeries, positions):
+        """
+        Initializes new AlignedBars. Should only be called by alignBars().
+
+        @type times: array, the common clock, seconds since the epoch
+        @type barSeries: list, of the candlesticks of every series
+        @type positions: list, of array('i'), the candlestick # of every series at every time
+        @rtype: None
+        """
+        self.times = times
+        self.barSeries = barSeries
+        self.positions = positions
+
+
+    def __len__(self):
+        return len(self.times)
+
+
+    def column(self, seriesIndex, field=1):
+        """
+        Returns a field of a series at every time of the clock, filled forward.
+
+        @type seriesIndex: int, the series, in the order given to alignBars()
+        @type field: int, the field of the candlesticks, 1 (close) by default, see Data.stockData
+        @rtype: list, the field at every time, None before the series' first candlestick
+        """
+        bars = self.barSeries[seriesIndex]
+        return [bars[position][field] if position >= 0 else None
+                for position in self.positions[seriesIndex]]
+
+
+    def bars(self, seriesIndex):
+        """
+        Returns the candlesticks of a series at every time of the clock. A gap is filled with
+        a flat candlestick at the previous close, with no volume.
+
+        @type seriesIndex: int, the series, in the order given to alignBars()
+        @rtype: list, of candlesticks organized like Data.stockData, None before the series'
+                first candlestick
+        """
+        bars = self.barSeries[seriesIndex]
+        aligned = []
+        previousPosition = -1
+        for timeIndex, position in enumerate(self.positions[seriesIndex]):
+            if position < 0:
+                aligned.append(None)
+            elif position != previousPosition:
+                aligned.append(bars[position])
+            else:
+                close = bars[position][1]
+                aligned.append([self.times[timeIndex], close, close, close, close, 0.0])
+            previousPosition = position
+        return aligned
+
+
+    def rows(self, field=1):
+        """
+        Returns a field of every series at every time of the clock, time-major: one row
+        across the series per time.
+
+        @type field: int, the field of the candlesticks, 1 (close) by default, see Data.stockData
+        @rtype: list, of rows of the field of every series, None before a series' first candlestick
+        """
+        columns = [self.column(seriesIndex, field) for seriesIndex in range(len(self.barSeries))]
+        return [list(row) for row in zip(*columns)]
+
+
+def alignBars(barSeries, interval=60):
+    """
+    Brings several series of candlesticks onto a common clock: the union of their times,
+    rounded down to the interval. The clock is built once, and each series is then matched
+    to it in a single merge pass, rather than looking up every time of every series.
+
+    @type barSeries: list, of the candlesticks of every series, organized like Data.stockData
+    @type interval: int, seconds between two candlesticks
+    @rtype: AlignedBars
+    """
+    def slot(timestamp):
+        return math.floor(timestamp / interval) * interval
+
+    times = array('d', sorted(set([slot(bar[0]) for bars in barSeries for bar in bars])))
+    positions = []
+    for bars in barSeries:
+        seriesPositions = array('i', [-1] * len(times))
+        position = -1
+        barCount = len(bars)
+        for timeIndex in range(len(times)):
+            while position + 1 < barCount and slot(bars[position + 1][0]) <= times[timeIndex]:
+                position += 1
+            seriesPositions[timeIndex] = position
+        positions.append(seriesPositions)
+    return AlignedBars(times, barSeries, positions)
@@ -0,0 +1,255 @@
+import struct
+import tempfile
+
+# file layout: header, then batches of (batch header, columns)
+MAGIC = b"MRTJ"
+VERSION = 1
+_HEADER = struct.Struct("<4sH")             # magic, version
+_BATCH_HEADER = struct.Struct("<IIII")      # trade count, first run, last run, payload length
+
+# trade types, as stored in the side column
+SIDES = ["Long", "Short"]
+
+
+class TradeJournal():
+    """
+    Append-only, columnar journal of every trade of a session, so that the trade log held in
+    memory can stay bounded however many trades a run produces.
+
+    Trades are kept in memory only until a batch is full; the batch is then written to the
+    journal file as columns (run, candlestick, side, shares, price, trade size, position size,
+    strategy and information) through a buffered file. Every simulation from scratch starts a
+    new run, and batches record the runs they hold, so reading one run skips the batches of
+    the others without decoding them.
+
+    Without a path, the journal spills to a temporary file that is deleted when it is closed.
+    The temporary file is only created when the first batch is written, so a journal of
+    fewer trades than a batch, e.g. of a headless session, holds no open file.
+    """
+
+    def __init__(self, path=None, batchSize=256):
+        """
+        Initializes a new TradeJournal, appending to the journal file if it exists.
+
+        @type path: str, the journal file, or None for a temporary file
+        @type batchSize: int, the number of trades written to the file at a time
+        @rtype: None
+        """
+        self.path = path
+        self.batchSize = batchSize
+        self.run = 0                    # the run trades are recorded in
+        self.count = 0                  # number of trades recorded by this journal
+        self._pending = []              # trades not yet written to the file
+        self._lastRun = -1              # the highest run in the journal
+
+        self._index = []                # (trade count, first run, last run, offset) of each batch
+        self._file = None               # the journal file, None until a temporary one is needed
+        if path == None:
+            return
+        self._file = open(path, "a+b", 65536)
+        self._file.seek(0, 2)
+        if self._file.tell() == 0:
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+        else:
+            self._file.seek(0)
+            magic, version = _HEADER.unpack(self._file.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise IOError("not a version " + str(VERSION) + " trade journal: " + str(path))
+            self._index, end = self._scanBatches()
+            self._file.truncate(end)    # drops a batch cut short by a crash
+            self._lastRun = max([batch[2] for batch in self._index] + [-1])
+            self.run = self._lastRun + 1
+
+
+    def beginRun(self):
+        """
+        Starts a new run, e.g. when the trade log is cleared to simulate from scratch.
+
+        @rtype: None
+        """
+        if self.count > 0 or len(self._pending) > 0:
+            self.run = max(self.run, self._lastRun) + 1
+            self.count = 0
+
+
+    def resumeRun(self, run):
+        """
+        Makes an earlier run the current one again, e.g. when a session is restored, so that
+        its trades are read as the current run's. The next run started still gets a new
+        number.
+
+        @type run: int, the run
+        @rtype: int, the number of trades of the run, 0 if the journal does not hold it (the
+                current run is then left unchanged)
+        """
+        count = 0
+        for trade in self.trades(run):
+            count += 1
+        if count > 0:
+            self._lastRun = max(self._lastRun, self.run)
+            self.run = run
+            self.count = count
+        return count
+
+
+    def record(self, trade):
+        """
+        Appends a trade to the current run.
+
+        @type trade: list, a trade record, organized like Data.tradeLog
+        @rtype: None
+        """
+        self._pending.append((self.run, trade))
+        self.count += 1
+        self._lastRun = max(self._lastRun, self.run)
+        if len(self._pending) >= self.batchSize:
+            self._writeBatch()
+
+
+    def flush(self):
+        """
+        Writes the pending trades and flushes the journal file.
+
+        @rtype: None
+        """
+        if len(self._pending) > 0:
+            self._writeBatch()
+        if self._file != None:
+            self._file.flush()
+
+
+    def trades(self, run=None, firstCandleStick=0, lastCandleStick=None, side=None):
+        """
+        Iterates over the trades of a run in the order they were recorded, reading the
+        batches in the file one at a time.
+
+        @type run: int, the run, defaults to the current one
+        @type firstCandleStick: int, the first candlestick of the trades returned
+        @type lastCandleStick: int, the last candlestick of the trades returned, or None
+        @type side: str, "Long" or "Short" to return only those trades, or None for both
+        @rtype: generator, of trade records organized like Data.tradeLog
+        """
+        if run == None:
+            run = self.run
+        if self._file != None:
+            self._file.flush()
+        for count, firstRun, lastRun, offset in list(self._index):
+            if run < firstRun or run > lastRun:
+                continue
+            for trade in self._readBatch(count, offset):
+                if _matches(trade, run, firstCandleStick, lastCandleStick, side):
+                    yield list(trade[1:])
+        for trade in list(self._pending):
+            if _matches((trade[0],) + tuple(trade[1]), run, firstCandleStick, lastCandleStick, side):
+                yield trade[1]
+
+
+    def runs(self):
+        """
+        Returns the runs recorded in the journal.
+
+        @rtype: list, of runs, oldest first
+        """
+        runs = set([trade[0] for trade in self._pending])
+        for count, firstRun, lastRun, offset in self._index:
+            runs.update(range(firstRun, lastRun + 1))
+        return sorted(runs)
+
+
+    def close(self):
+        """
+        Writes the pending trades and closes the journal file.
+
+        @rtype: None
+        """
+        self.flush()
+        if self._file != None:
+            self._file.close()
+
+
+    def _writeBatch(self):
+        """
+        Writes the pending trades as a batch of columns. Helper.
+
+        @rtype: None
+        """
+        count = len(self._pending)
+        runs = [trade[0] for trade in self._pending]
+        trades = [trade[1] for trade in self._pending]
+        if self._file == None:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+        texts = []
+        for trade in trades:
+            for value in [trade[1], trade[7] if len(trade) > 7 else ""]:
+                encoded = value.encode("utf-8")
+                texts.append(struct.pack("<H", len(encoded)) + encoded)
+        payload = b"".join([struct.pack("<%dI" % count, *runs),
+                            struct.pack("<%di" % count, *[trade[0] for trade in trades]),
+                            struct.pack("<%dB" % count, *[SIDES.index(trade[2]) for trade in trades]),
+                            struct.pack("<%di" % count, *[trade[3] for trade in trades]),
+                            struct.pack("<%dd" % count, *[float(trade[4]) for trade in trades]),
+                            struct.pack("<%dd" % count, *[trade[5] for trade in trades]),
+                            struct.pack("<%dd" % count, *[trade[6] for trade in trades])] + texts)
+        self._file.seek(0, 2)
+        self._file.write(_BATCH_HEADER.pack(count, min(runs), max(runs), len(payload)))
+        self._index.append((count, min(runs), max(runs), self._file.tell()))
+        self._file.write(payload)
+        self._pending = []
+
+
+    def _scanBatches(self):
+        """
+        Reads the batch headers of the journal file. Helper.
+
+        @rtype: tuple, (list of (trade count, first run, last run, payload offset), the end of
+                the last complete batch)
+        """
+        batches = []
+        self._file.seek(0, 2)
+        end = self._file.tell()
+        position = _HEADER.size
+        while position + _BATCH_HEADER.size <= end:
+            self._file.seek(position)
+            count, firstRun, lastRun, length = _BATCH_HEADER.unpack(self._file.read(_BATCH_HEADER.size))
+            if position + _BATCH_HEADER.size + length > end:
+                break
+            batches.append((count, firstRun, lastRun, position + _BATCH_HEADER.size))
+            position += _BATCH_HEADER.size + length
+        return batches, position
+
+
+    def _readBatch(self, count, offset):
+        """
+        Decodes the batch at (offset) of the journal file. Helper.
+
+        @rtype: list, of (run, candlestick, strategy, side, shares, price, trade size,
+                position size, information)
+        """
+        self._file.seek(offset)
+        payload = self._file.read(count * 37)
+        runs = struct.unpack_from("<%dI" % count, payload, 0)
+        candleSticks = struct.unpack_from("<%di" % count, payload, 4 * count)
+        sides = struct.unpack_from("<%dB" % count, payload, 8 * count)
+        shares = struct.unpack_from("<%di" % count, payload, 9 * count)
+        prices = struct.unpack_from("<%dd" % count, payload, 13 * count)
+        tradeSizes = struct.unpack_from("<%dd" % count, payload, 21 * count)
+        positionSizes = struct.unpack_from("<%dd" % count, payload, 29 * count)
+
+        texts = []
+        for i in range(2 * count):
+            length = struct.unpack("<H", self._file.read(2))[0]
+            texts.append(str(self._file.read(length).decode("utf-8")))
+        return [(runs[i], candleSticks[i], texts[2 * i], SIDES[sides[i]], shares[i], str(prices[i]),
+                 tradeSizes[i], positionSizes[i], texts[2 * i + 1]) for i in range(count)]
+
+
+def _matches(trade, run, firstCandleStick, lastCandleStick, side):
+    """
+    Returns whether a (run,) + trade record passes the filters of trades(). Helper.
+
+    @rtype: bool
+    """
+    return (trade[0] == run and trade[1] >= firstCandleStick and
+            (lastCandleStick == None or trade[1] <= lastCandleStick) and
+            (side == None or trade[3] == side))
@@ -0,0 +1,154 @@
+class BacktestResult():
+    """
+    Holds the fills and the final account state of a backtest run by backtestSignals().
+    Mirrors the account fields of Analysis, without touching the Analysis singleton.
+    """
+
+    def __init__(self, cashInitial):
+        """
+        Initializes a new BacktestResult.
+
+        @type cashInitial: float, the starting cash of the backtest ($)
+        @rtype: None
+        """
+        self.fills = []                 # (candlestick #, 0 for long / 1 for short, shares, share price)
+        self.cashInitial = cashInitial
+        self.cash = cashInitial         # cash after commission ($)
+        self.position = 0               # position at the end of the backtest (shares)
+        self.positionSize = 0           # position at the end of the backtest ($)
+        self.commissionTotal = 0        # total commission paid ($)
+        self.PL = 0                     # profit/loss ($)
+
+
+def backtestSignals(stockData, longSignals, shortSignals, warmup, longShares=600, shortShares=600,
+                    cashInitial=100000, commission=10, maxLongPosition=100000,
+                    maxShortPosition=-100000, liquidationCandleStick=389, risk=None):
+    """
+    Runs the tick loop of the signal-based strategies over precomputed signal lists: on each
+    candlestick past the warmup, a long signal opens/adds a long position if it is within the
+    long limit, otherwise a short signal opens/adds a short position if it is within the short
+    limit. Any remaining position is liquidated at the liquidation candlestick.
+
+    This differs from the tick loops of the hand-written strategies (e.g. SMACrossOver), which
+    only look at the short signal when a long trade would be outside the long limit: here a
+    short signal is also traded when there is no long signal, so a rules strategy can go
+    short while it still has room to go long.
+
+    The account only changes on candlesticks with a signal, so only those candlesticks are
+    visited instead of every tick of the dataset. With a RiskEngine, the trade sizes are
+    computed for the whole dataset at once, and the rules depending on the account replace
+    the long and short limits, checked only on those candlesticks.
+
+    @type stockData: list, the candlesticks of the dataset
+    @type longSignals: list, truthy at every candlestick with a long (buy) signal
+    @type shortSignals: list, truthy at every candlestick with a short (sell) signal
+    @type warmup: int, signals are ignored up to and including this candlestick
+    @type longShares: int, the number of shares per long trade
+    @type shortShares: int, the number of shares per short trade
+    @type cashInitial: float, the starting cash ($)
+    @type commission: float, the commission paid per trade ($)
+    @type maxLongPosition: float, the maximum long position allowed ($)
+    @type maxShortPosition: float, the maximum short position allowed ($), negative
+    @type liquidationCandleStick: int, the candlestick at which open positions are closed
+    @type risk: RiskEngine, the risk rules of the account, or None for the limits above only
+    @rtype: BacktestResult
+    """
+    result = BacktestResult(cashInitial)
+    candleStickTotal = len(stockData)
+    candidates = [candleStickCount for candleStickCount in range(warmup + 1, candleStickTotal)
+                  if longSignals[candleStickCount] or shortSignals[candleStickCount]]
+    if liquidationCandleStick < candleStickTotal:
+        candidates = [candleStickCount for candleStickCount in candidates
+                      if candleStickCount < liquidationCandleStick]
+        candidates.append(liquidationCandleStick)
+
+    cash = cashInitial
+    position = 0
+    positionSize = 0
+    trades = 0
+    if risk != None:
+        longSizes = risk.tradeSizes(stockData, longShares)
+        shortSizes = risk.tradeSizes(stockData, shortShares)
+        day = None
+        dayStartPL = 0
+    for candleStickCount in candidates:
+        sharePrice = stockData[candleStickCount][1]
+        if candleStickCount == liquidationCandleStick:
+            # End of day liquidation
+            if position > 0:
+                shares, positionType = position, 1
+            elif position < 0:
+                shares, positionType = -position, 0
+            else:
+                continue
+        elif risk != None:
+            PL = None
+            if risk.dailyLossStop != None:
+                PL = cash - trades * commission + position * sharePrice - cashInitial
+                if candleStickCount // 390 != day:
+                    day = candleStickCount // 390
+                    dayStartPL = PL
+            if longSignals[candleStickCount] and longSizes[candleStickCount] > 0 and \
+               risk.checkFill(0, candleStickCount, longSizes[candleStickCount], sharePrice, position,
+                              positionSize, PL, dayStartPL) == 1:
+                shares, positionType = longSizes[candleStickCount], 0
+            elif shortSignals[candleStickCount] and shortSizes[candleStickCount] > 0 and \
+                 risk.checkFill(1, candleStickCount, shortSizes[candleStickCount], sharePrice, position,
+                                positionSize, PL, dayStartPL) == 1:
+                shares, positionType = shortSizes[candleStickCount], 1
+            else:
+                continue
+        elif longSignals[candleStickCount] and positionSize + longShares * sharePrice <= maxLongPosition:
+            shares, positionType = longShares, 0
+        elif shortSignals[candleStickCount] and positionSize - shortShares * sharePrice >= maxShortPosition:
+            shares, positionType = shortShares, 1
+        else:
+            continue
+
+        if positionType == 0:
+            cash -= shares * sharePrice
+            positionSize += shares * sharePrice
+            position += shares
+        else:
+            cash += shares * sharePrice
+            positionSize -= shares * sharePrice
+            position -= shares
+        trades += 1
+        result.fills.append((candleStickCount, positionType, shares, sharePrice))
+
+    result.commissionTotal = trades * commission
+    result.cash = cash - result.commissionTotal
+    result.position = position
+    if candleStickTotal > 0:
+        result.positionSize = position * stockData[candleStickTotal - 1][1]
+    result.PL = result.cash - cashInitial + result.positionSize
+    return result
+
+
+def equityCurve(stockData, result, commission=10):
+    """
+    Returns the profit/loss of a backtest at the close of every candlestick, marking the
+    open position to market.
+
+    @type stockData: list, the candlesticks the backtest ran on
+    @type result: BacktestResult, the result of backtestSignals() on stockData
+    @type commission: float, the commission paid per trade ($)
+    @rtype: list, the profit/loss at every candlestick ($)
+    """
+    curve = []
+    fillIndex = 0
+    cash = 0.0
+    position = 0
+    for candleStickCount in range(len(stockData)):
+        while fillIndex < len(result.fills) and result.fills[fillIndex][0] == candleStickCount:
+            fillCandleStick, positionType, shares, sharePrice = result.fills[fillIndex]
+            if positionType == 0:
+                cash -= shares * sharePrice
+                position += shares
+            else:
+                cash += shares * sharePrice
+                position -= shares
+            cash -= commission
+            fillIndex += 1
+        curve.append(cash + position * stockData[candleStickCount][1])
+    return curve
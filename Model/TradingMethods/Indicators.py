@@ -0,0 +1,498 @@
+import abc
+from collections import deque
+from Data import Data
+
+class Indicator():
+    """
+    The parent class of all technical indicator classes. Every indicator can be computed in
+    batch mode over a whole dataset with getIndicators(), or in streaming mode one candlestick
+    at a time with update(). Each call to update() runs in constant time, so computing an
+    indicator over n candlesticks is O(n) regardless of the indicator's duration.
+    """
+
+    def __init__(self, column=1):
+        """
+        Initializes a new Indicator.
+
+        @type column: int, the index of the candlestick value the indicator is computed from,
+                      defaults to the close
+        @rtype: None
+        """
+        self.column = column
+        self.values = []                        # indicator value at every candlestick seen
+
+
+    def reset(self):
+        """
+        Clears all values and accumulators, so that the indicator can be recomputed from
+        the start of a dataset. Subclasses with accumulators extend this method.
+
+        @rtype: None
+        """
+        self.values = []
+
+
+    def update(self, bar):
+        """
+        Streams a single candlestick into the indicator and returns the new indicator value.
+
+        @type bar: list, a candlestick organized as date, close, high, low, open, volume
+        @rtype: float, the indicator value at this candlestick
+        """
+        value = self.updateValue(bar[self.column])
+        self.values.append(value)
+        return value
+
+
+    @abc.abstractmethod
+    def updateValue(self, value):
+        """
+        Streams a single raw value into the indicator's accumulators and returns the new
+        indicator value, without recording it. Abstract method.
+
+        @type value: float, the newest value of the series the indicator is computed from
+        @rtype: float
+        """
+        return
+
+
+    def getIndicators(self, stockData=None):
+        """
+        Computes and returns the indicator for every tick in a dataset.
+
+        @type stockData: list, the candlesticks to compute over, defaults to the stock
+                         currently being tracked in Data
+        @rtype: list, the indicator value at every candlestick of the dataset
+        """
+        if stockData == None:
+            stockData = Data.getInstance().stockData
+        self.reset()
+        for bar in stockData:
+            self.update(bar)
+        return self.values
+
+
+    def getOverlayLists(self):
+        """
+        Returns the lists of values that the View draws over the price chart. Indicators
+        that are not on the same scale as the price (oscillators) return an empty list.
+
+        @rtype: list, of lists of price-scaled values
+        """
+        return [self.values]
+
+
+class WelfordWindow():
+    """
+    Rolling mean and variance over the last (duration) values, kept with Welford's
+    accumulators so that adding or removing a value takes constant time and does not
+    suffer from the cancellation errors of a running sum of squares.
+    """
+
+    def __init__(self, duration):
+        """
+        Initializes a new WelfordWindow.
+
+        @type duration: int, the number of values in the rolling window
+        @rtype: None
+        """
+        self.duration = duration
+        self.reset()
+
+
+    def reset(self):
+        """
+        Empties the window.
+
+        @rtype: None
+        """
+        self.window = deque()
+        self.mean = 0.0
+        self._sumSquaredDeviations = 0.0
+
+
+    def add(self, value):
+        """
+        Adds a value to the window, removing the oldest value if the window is full.
+
+        @type value: float, the value to add
+        @rtype: None
+        """
+        self.window.append(value)
+        count = len(self.window)
+        delta = value - self.mean
+        self.mean += delta / count
+        self._sumSquaredDeviations += delta * (value - self.mean)
+
+        if count > self.duration:
+            # reverse Welford step for the value leaving the window
+            oldest = self.window.popleft()
+            count -= 1
+            delta = oldest - self.mean
+            self.mean -= delta / count
+            self._sumSquaredDeviations -= delta * (oldest - self.mean)
+            if self._sumSquaredDeviations < 0:
+                self._sumSquaredDeviations = 0.0
+
+
+    def variance(self):
+        """
+        Returns the population variance of the values in the window.
+
+        @rtype: float
+        """
+        if len(self.window) == 0:
+            return 0.0
+        return self._sumSquaredDeviations / len(self.window)
+
+
+    def standardDeviation(self):
+        """
+        Returns the population standard deviation of the values in the window.
+
+        @rtype: float
+        """
+        return self.variance() ** 0.5
+
+
+class MonotonicWindow():
+    """
+    Rolling maximum (or minimum) over the last (duration) values, kept in a monotonic deque
+    so that every value is added and removed once: amortized constant time per value.
+    """
+
+    def __init__(self, duration, trackMaximum):
+        """
+        Initializes a new MonotonicWindow.
+
+        @type duration: int, the number of values in the rolling window
+        @type trackMaximum: int, 1 to track the rolling maximum, 0 for the rolling minimum
+        @rtype: None
+        """
+        self.duration = duration
+        self.trackMaximum = trackMaximum
+        self.reset()
+
+
+    def reset(self):
+        """
+        Empties the window.
+
+        @rtype: None
+        """
+        self._candidates = deque()              # (index, value) pairs, monotonic in value
+        self._count = 0
+
+
+    def add(self, value):
+        """
+        Adds a value to the window and returns the current rolling extreme.
+
+        @type value: float, the value to add
+        @rtype: float, the maximum (or minimum) of the values in the window
+        """
+        candidates = self._candidates
+        if self.trackMaximum == 1:
+            while candidates and candidates[-1][1] <= value:
+                candidates.pop()
+        else:
+            while candidates and candidates[-1][1] >= value:
+                candidates.pop()
+        candidates.append((self._count, value))
+
+        # drop the extreme if it has left the window
+        if candidates[0][0] <= self._count - self.duration:
+            candidates.popleft()
+        self._count += 1
+        return candidates[0][1]
+
+
+    def current(self):
+        """
+        Returns the current rolling extreme, or None if the window is empty.
+
+        @rtype: float
+        """
+        if not self._candidates:
+            return None
+        return self._candidates[0][1]
+
+
+class ExponentialMovingAverage(Indicator):
+    """
+    Class responsible for calculating the Exponential Moving Average, which weighs recent
+    candlesticks more heavily than older ones.
+    """
+
+    def __init__(self, duration, column=1):
+        """
+        Initializes a new ExponentialMovingAverage.
+
+        @type duration: int, the duration of the exponential moving average
+        @type column: int, the index of the candlestick value to average
+        @rtype: None
+        """
+        Indicator.__init__(self, column)
+        self.duration = duration
+        self.smoothing = 2.0 / (duration + 1)
+        self.current = None
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self.current = None
+
+
+    def updateValue(self, value):
+        if self.current == None:
+            # seed the average with the first value
+            self.current = float(value)
+        else:
+            self.current += self.smoothing * (value - self.current)
+        return self.current
+
+
+class RelativeStrengthIndex(Indicator):
+    """
+    Class responsible for calculating the Relative Strength Index, an oscillator between 0
+    and 100 comparing the size of recent gains to recent losses, using Wilder's smoothing.
+    """
+
+    def __init__(self, duration=14, column=1):
+        """
+        Initializes a new RelativeStrengthIndex.
+
+        @type duration: int, the smoothing duration of the average gains and losses
+        @type column: int, the index of the candlestick value to compute from
+        @rtype: None
+        """
+        Indicator.__init__(self, column)
+        self.duration = duration
+        self.reset()
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self._previous = None
+        self._changeCount = 0
+        self._averageGain = 0.0
+        self._averageLoss = 0.0
+
+
+    def updateValue(self, value):
+        if self._previous == None:
+            self._previous = value
+            return 50.0
+        change = value - self._previous
+        self._previous = value
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+
+        # simple average until (duration) changes exist, Wilder's smoothing afterwards
+        if self._changeCount < self.duration:
+            self._changeCount += 1
+        weight = 1.0 / self._changeCount
+        self._averageGain += weight * (gain - self._averageGain)
+        self._averageLoss += weight * (loss - self._averageLoss)
+
+        if self._averageLoss == 0:
+            if self._averageGain == 0:
+                return 50.0
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self._averageGain / self._averageLoss)
+
+
+    def getOverlayLists(self):
+        return []
+
+
+class MovingAverageConvergenceDivergence(Indicator):
+    """
+    Class responsible for calculating the MACD: the difference between a fast and a slow
+    exponential moving average, together with its signal line and histogram.
+    """
+
+    def __init__(self, fastDuration=12, slowDuration=26, signalDuration=9, column=1):
+        """
+        Initializes a new MovingAverageConvergenceDivergence.
+
+        @type fastDuration: int, the duration of the fast exponential moving average
+        @type slowDuration: int, the duration of the slow exponential moving average
+        @type signalDuration: int, the duration of the signal line's moving average
+        @type column: int, the index of the candlestick value to compute from
+        @rtype: None
+        """
+        self._fast = ExponentialMovingAverage(fastDuration)
+        self._slow = ExponentialMovingAverage(slowDuration)
+        self._signal = ExponentialMovingAverage(signalDuration)
+        Indicator.__init__(self, column)
+        self.reset()
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self._fast.reset()
+        self._slow.reset()
+        self._signal.reset()
+        self.signalValues = []                  # signal line at every candlestick
+        self.histogramValues = []               # MACD minus signal line at every candlestick
+
+
+    def update(self, bar):
+        value = Indicator.update(self, bar)
+        signal = self._signal.current
+        self.signalValues.append(signal)
+        self.histogramValues.append(value - signal)
+        return value
+
+
+    def updateValue(self, value):
+        macd = self._fast.updateValue(value) - self._slow.updateValue(value)
+        self._signal.updateValue(macd)
+        return macd
+
+
+    def getOverlayLists(self):
+        return []
+
+
+class BollingerBands(Indicator):
+    """
+    Class responsible for calculating Bollinger Bands: a simple moving average with bands
+    a number of standard deviations above and below it.
+    """
+
+    def __init__(self, duration=20, bandWidth=2.0, column=1):
+        """
+        Initializes a new BollingerBands.
+
+        @type duration: int, the duration of the moving average and standard deviation
+        @type bandWidth: float, the number of standard deviations between the average and a band
+        @type column: int, the index of the candlestick value to compute from
+        @rtype: None
+        """
+        self.duration = duration
+        self.bandWidth = bandWidth
+        self._window = WelfordWindow(duration)
+        Indicator.__init__(self, column)
+        self.reset()
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self._window.reset()
+        self.upperValues = []                   # upper band at every candlestick
+        self.lowerValues = []                   # lower band at every candlestick
+
+
+    def update(self, bar):
+        value = Indicator.update(self, bar)
+        offset = self.bandWidth * self._window.standardDeviation()
+        self.upperValues.append(value + offset)
+        self.lowerValues.append(value - offset)
+        return value
+
+
+    def updateValue(self, value):
+        self._window.add(value)
+        return self._window.mean
+
+
+    def getOverlayLists(self):
+        return [self.values, self.upperValues, self.lowerValues]
+
+
+class VolumeWeightedAveragePrice(Indicator):
+    """
+    Class responsible for calculating the Volume Weighted Average Price of the trading day,
+    using the typical price (high + low + close) / 3 of every candlestick.
+    """
+
+    def __init__(self, sessionLength=390):
+        """
+        Initializes a new VolumeWeightedAveragePrice.
+
+        @type sessionLength: int, the number of candlesticks in a trading day, after which
+                             the average restarts
+        @rtype: None
+        """
+        Indicator.__init__(self)
+        self.sessionLength = sessionLength
+        self.reset()
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self._count = 0
+        self._priceVolume = 0.0
+        self._volume = 0.0
+
+
+    def update(self, bar):
+        if self._count == self.sessionLength:
+            self._count = 0
+            self._priceVolume = 0.0
+            self._volume = 0.0
+        self._count += 1
+
+        typicalPrice = (bar[1] + bar[2] + bar[3]) / 3.0
+        self._priceVolume += typicalPrice * bar[5]
+        self._volume += bar[5]
+        if self._volume == 0:
+            value = typicalPrice
+        else:
+            value = self._priceVolume / self._volume
+        self.values.append(value)
+        return value
+
+
+    def updateValue(self, value):
+        # VWAP needs the full candlestick, see update()
+        return value
+
+
+class DonchianChannel(Indicator):
+    """
+    Class responsible for calculating the Donchian Channel: the highest high and lowest low
+    of the last (duration) candlesticks, and the midpoint between them.
+    """
+
+    def __init__(self, duration=20):
+        """
+        Initializes a new DonchianChannel.
+
+        @type duration: int, the number of candlesticks the channel spans
+        @rtype: None
+        """
+        self.duration = duration
+        self._highs = MonotonicWindow(duration, 1)
+        self._lows = MonotonicWindow(duration, 0)
+        Indicator.__init__(self)
+        self.reset()
+
+
+    def reset(self):
+        Indicator.reset(self)
+        self._highs.reset()
+        self._lows.reset()
+        self.upperValues = []                   # highest high at every candlestick
+        self.lowerValues = []                   # lowest low at every candlestick
+
+
+    def update(self, bar):
+        upper = self._highs.add(bar[2])
+        lower = self._lows.add(bar[3])
+        value = (upper + lower) / 2.0
+        self.upperValues.append(upper)
+        self.lowerValues.append(lower)
+        self.values.append(value)
+        return value
+
+
+    def updateValue(self, value):
+        # the channel needs the full candlestick, see update()
+        return value
+
+
+    def getOverlayLists(self):
+        return [self.upperValues, self.values, self.lowerValues]
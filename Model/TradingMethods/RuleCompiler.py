@@ -0,0 +1,484 @@
+"""
+A small declarative rule language for trading strategies, e.g.
+
+    cross_above(sma(close, 15), sma(close, 50)) for 3 bars -> long
+    cross_below(sma(close, 15), sma(close, 50)) -> short
+
+Rules are separated by new lines or semicolons. Each rule is compiled into a graph of
+whole-column kernels: every expression is evaluated once over the entire dataset instead
+of once per tick, and expressions shared between rules (such as sma(close, 15) above)
+are only evaluated once.
+
+Columns:    close, high, low, open, volume
+Functions:  sma(x, n), ema(x, n), rsi(x, n), std(x, n), highest(x, n), lowest(x, n),
+            cross_above(a, b), cross_below(a, b), rising(x, n), falling(x, n)
+Operators:  + - * /  > >= < <=  and or not, and "for n bars" after a rule's condition
+
+A condition "for n bars" is true on every candlestick where the condition has been true
+for the last n candlesticks. A crossover "for n bars" fires once, on the n-th candlestick
+after the cross, if the crossed lines have stayed crossed.
+"""
+
+import re
+from Indicators import ExponentialMovingAverage
+from Indicators import RelativeStrengthIndex
+from Indicators import WelfordWindow
+from Indicators import MonotonicWindow
+from TechnicalMethods import risingRunLengths
+from TechnicalMethods import fallingRunLengths
+
+
+# index of every column in a candlestick of Data.stockData
+COLUMNS = {"close": 1, "high": 2, "low": 3, "open": 4, "volume": 5}
+
+# functions whose value is on the same scale as their first argument
+_PRICE_SCALED_FUNCTIONS = ["sma", "ema", "highest", "lowest"]
+
+# number of arguments of every function
+_FUNCTION_ARITY = {"sma": 2, "ema": 2, "rsi": 2, "std": 2, "highest": 2, "lowest": 2,
+                   "cross_above": 2, "cross_below": 2, "rising": 2, "falling": 2}
+
+_TOKEN_PATTERN = re.compile(r"\s*(?:(\d+\.?\d*)|([A-Za-z_][A-Za-z_0-9]*)|(->|>=|<=|[-+*/<>(),]))")
+
+# operators whose operands can be reordered for common subexpression elimination
+_COMMUTATIVE_OPERATORS = ["+", "*", "and", "or"]
+
+
+class RuleSyntaxError(Exception):
+    """
+    Raised when a rule cannot be parsed or compiled.
+    """
+    pass
+
+
+class _Parser():
+    """
+    Recursive descent parser turning the text of a single rule into a nested tuple
+    expression: ("num", value), ("col", name), or (operator, operand, ...). Helper.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _TOKEN_PATTERN.match(text, position)
+            if match == None:
+                raise RuleSyntaxError("Unexpected character in rule '" + self.text + "' at " +
+                                      str(position))
+            number, name, symbol = match.groups()
+            if number != None:
+                self.tokens.append(("num", float(number)))
+            elif name != None:
+                self.tokens.append(("name", name.lower()))
+            else:
+                self.tokens.append(("sym", symbol))
+            position = match.end()
+        self.index = 0
+
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return (None, None)
+
+
+    def next(self):
+        token = self.peek()
+        self.index += 1
+        return token
+
+
+    def expect(self, kind, value=None):
+        token = self.next()
+        if token[0] != kind or (value != None and token[1] != value):
+            raise RuleSyntaxError("Expected " + str(value or kind) + " in rule '" + self.text +
+                                  "', found " + str(token[1]))
+        return token[1]
+
+
+    def parseRule(self):
+        """
+        rule := expression ["for" number ("bars" | "bar")] "->" ("long" | "short")
+
+        @rtype: tuple, (condition expression, "long" or "short")
+        """
+        condition = self.parseOr()
+        if self.peek() == ("name", "for"):
+            self.next()
+            duration = int(self.expect("num"))
+            if self.peek()[1] in ["bars", "bar"]:
+                self.next()
+            if condition[0] == "cross_above":
+                # a cross that has held for (duration) bars fires once, on the last of them
+                condition = ("held", (">", condition[1], condition[2]), ("num", float(duration)))
+            elif condition[0] == "cross_below":
+                condition = ("held", ("<=", condition[1], condition[2]), ("num", float(duration)))
+            else:
+                condition = ("for", condition, ("num", float(duration)))
+        self.expect("sym", "->")
+        side = self.expect("name")
+        if side not in ["long", "short"]:
+            raise RuleSyntaxError("Rule '" + self.text + "' must end in -> long or -> short")
+        if self.peek()[0] != None:
+            raise RuleSyntaxError("Unexpected " + str(self.peek()[1]) + " in rule '" + self.text + "'")
+        return condition, side
+
+
+    def parseOr(self):
+        left = self.parseAnd()
+        while self.peek() == ("name", "or"):
+            self.next()
+            left = ("or", left, self.parseAnd())
+        return left
+
+
+    def parseAnd(self):
+        left = self.parseNot()
+        while self.peek() == ("name", "and"):
+            self.next()
+            left = ("and", left, self.parseNot())
+        return left
+
+
+    def parseNot(self):
+        if self.peek() == ("name", "not"):
+            self.next()
+            return ("not", self.parseNot())
+        return self.parseComparison()
+
+
+    def parseComparison(self):
+        left = self.parseSum()
+        if self.peek()[0] == "sym" and self.peek()[1] in [">", ">=", "<", "<="]:
+            operator = self.next()[1]
+            left = (operator, left, self.parseSum())
+        return left
+
+
+    def parseSum(self):
+        left = self.parseProduct()
+        while self.peek()[0] == "sym" and self.peek()[1] in ["+", "-"]:
+            left = (self.next()[1], left, self.parseProduct())
+        return left
+
+
+    def parseProduct(self):
+        left = self.parseFactor()
+        while self.peek()[0] == "sym" and self.peek()[1] in ["*", "/"]:
+            left = (self.next()[1], left, self.parseFactor())
+        return left
+
+
+    def parseFactor(self):
+        kind, value = self.next()
+        if kind == "num":
+            return ("num", value)
+        if kind == "sym" and value == "-":
+            return ("-", ("num", 0.0), self.parseFactor())
+        if kind == "sym" and value == "(":
+            expression = self.parseOr()
+            self.expect("sym", ")")
+            return expression
+        if kind == "name" and value in COLUMNS:
+            return ("col", value)
+        if kind == "name" and value in _FUNCTION_ARITY:
+            self.expect("sym", "(")
+            arguments = [self.parseOr()]
+            while self.peek() == ("sym", ","):
+                self.next()
+                arguments.append(self.parseOr())
+            self.expect("sym", ")")
+            if len(arguments) != _FUNCTION_ARITY[value]:
+                raise RuleSyntaxError(value + "() takes " + str(_FUNCTION_ARITY[value]) +
+                                      " arguments in rule '" + self.text + "'")
+            return tuple([value] + arguments)
+        raise RuleSyntaxError("Unexpected " + str(value) + " in rule '" + self.text + "'")
+
+
+class CompiledRules():
+    """
+    A set of compiled rules: a graph of nodes, each evaluated once as a whole-column kernel,
+    with nodes shared between rules through common subexpression elimination.
+    """
+
+    def __init__(self, text):
+        """
+        Parses and compiles a set of rules.
+
+        @type text: str, the rules, separated by new lines or semicolons
+        @rtype: None
+        """
+        self.text = text
+        self.nodes = []                 # (operator, argument node indices or constant, key), in evaluation order
+        self.lookbacks = []             # candlesticks needed before each node is meaningful
+        self._nodeIndices = {}          # canonical node key -> node index
+        self.longNodes = []             # condition node of every long rule
+        self.shortNodes = []            # condition node of every short rule
+
+        for ruleText in re.split(r"[;\n]", text):
+            if ruleText.strip() == "":
+                continue
+            condition, side = _Parser(ruleText).parseRule()
+            nodeIndex = self._intern(condition)
+            if side == "long":
+                self.longNodes.append(nodeIndex)
+            else:
+                self.shortNodes.append(nodeIndex)
+
+        self.warmup = 0
+        for nodeIndex in self.longNodes + self.shortNodes:
+            self.warmup = max(self.warmup, self.lookbacks[nodeIndex])
+
+
+    def _intern(self, expression):
+        """
+        Adds an expression and its subexpressions to the graph, reusing existing nodes for
+        subexpressions already in it. Helper.
+
+        @type expression: tuple, an expression produced by the parser
+        @rtype: int, the index of the expression's node
+        """
+        operator = expression[0]
+        if operator == "num":
+            key = "%g" % expression[1]
+            arguments = expression[1]
+            lookback = 0
+        elif operator == "col":
+            key = expression[1]
+            arguments = expression[1]
+            lookback = 0
+        else:
+            arguments = [self._intern(argument) for argument in expression[1:]]
+            argumentKeys = [self.nodes[argument][2] for argument in arguments]
+            if operator in _COMMUTATIVE_OPERATORS:
+                order = sorted(range(len(arguments)), key=lambda i: argumentKeys[i])
+                arguments = [arguments[i] for i in order]
+                argumentKeys = [argumentKeys[i] for i in order]
+            key = operator + "(" + ",".join(argumentKeys) + ")"
+            lookback = max([self.lookbacks[argument] for argument in arguments])
+            if operator in _FUNCTION_ARITY or operator in ["for", "held"]:
+                duration = self._windowArgument(arguments[-1], operator)
+                if operator in ["cross_above", "cross_below"]:
+                    lookback += 1
+                else:
+                    lookback += duration - 1
+        if key in self._nodeIndices:
+            return self._nodeIndices[key]
+        self.nodes.append((operator, arguments, key))
+        self.lookbacks.append(lookback)
+        self._nodeIndices[key] = len(self.nodes) - 1
+        return len(self.nodes) - 1
+
+
+    def _windowArgument(self, nodeIndex, operator):
+        """
+        Returns the whole number window of a function argument. Helper.
+
+        @rtype: int
+        """
+        node = self.nodes[nodeIndex]
+        if operator in ["cross_above", "cross_below"]:
+            return 1
+        if node[0] != "num" or node[1] < 1 or node[1] != int(node[1]):
+            raise RuleSyntaxError("The window of " + operator + "() must be a whole number in '" +
+                                  self.text + "'")
+        return int(node[1])
+
+
+    def evaluate(self, stockData, seriesCache=None):
+        """
+        Evaluates every node of the graph once over a whole dataset.
+
+        @type stockData: list, the candlesticks of the dataset
+        @type seriesCache: dict, node key -> series already evaluated on the same dataset,
+                           shared between rule sets so that e.g. sma(close, 15) is computed
+                           once for all of them; new series are added to it
+        @rtype: list, the series of every node, indexed like self.nodes
+        """
+        columns = {}
+        candleStickTotal = len(stockData)
+        series = []
+        for operator, arguments, key in self.nodes:
+            if seriesCache != None and key in seriesCache:
+                series.append(seriesCache[key])
+                continue
+            if operator == "num":
+                series.append([arguments] * candleStickTotal)
+            elif operator == "col":
+                if arguments not in columns:
+                    columnIndex = COLUMNS[arguments]
+                    columns[arguments] = [bar[columnIndex] for bar in stockData]
+                series.append(columns[arguments])
+            else:
+                values = [series[argument] for argument in arguments]
+                window = 0
+                if self.nodes[arguments[-1]][0] == "num":
+                    window = int(self.nodes[arguments[-1]][1])
+                series.append(_KERNELS[operator](values, window))
+            if seriesCache != None:
+                seriesCache[key] = series[-1]
+        return series
+
+
+    def getSignals(self, stockData, seriesCache=None):
+        """
+        Evaluates the rules over a whole dataset.
+
+        @type stockData: list, the candlesticks of the dataset
+        @type seriesCache: dict, series shared between rule sets, see evaluate()
+        @rtype: tuple, (long signals, short signals, series of every node), where the signals
+                are lists of 1/0 at every candlestick
+        """
+        series = self.evaluate(stockData, seriesCache)
+        return (_combineSignals(series, self.longNodes, len(stockData)),
+                _combineSignals(series, self.shortNodes, len(stockData)),
+                series)
+
+
+    def getOverlayNodes(self):
+        """
+        Returns the nodes on the same scale as the price, to be drawn over the chart.
+
+        @rtype: list, of node indices
+        """
+        overlayNodes = []
+        for nodeIndex in range(len(self.nodes)):
+            operator, arguments, key = self.nodes[nodeIndex]
+            if operator in _PRICE_SCALED_FUNCTIONS and self.nodes[arguments[0]][0] == "col" and \
+                    self.nodes[arguments[0]][1] != "volume":
+                overlayNodes.append(nodeIndex)
+        return overlayNodes
+
+
+# compiled rule sets, so that rule text is only parsed once per process
+_compiledRules = {}
+
+def compileRules(text):
+    """
+    Returns the compiled form of a set of rules, compiling it on first use.
+
+    @type text: str, the rules, separated by new lines or semicolons
+    @rtype: CompiledRules
+    """
+    if text not in _compiledRules:
+        _compiledRules[text] = CompiledRules(text)
+    return _compiledRules[text]
+
+
+def _combineSignals(series, nodeIndices, candleStickTotal):
+    signals = [0] * candleStickTotal
+    for nodeIndex in nodeIndices:
+        signals = [1 if a or b else 0 for a, b in zip(signals, series[nodeIndex])]
+    return signals
+
+
+def _movingAverageKernel(values, window):
+    # rolling sums from one prefix sum; the average of all values so far before the window fills,
+    # like SimpleMovingAverage
+    x = values[0]
+    prefix = [0.0] * (len(x) + 1)
+    total = 0.0
+    for i in range(len(x)):
+        total += x[i]
+        prefix[i + 1] = total
+    return [(prefix[i + 1] - prefix[max(0, i + 1 - window)]) / min(i + 1, window)
+            for i in range(len(x))]
+
+
+def _emaKernel(values, window):
+    indicator = ExponentialMovingAverage(window)
+    return [indicator.updateValue(value) for value in values[0]]
+
+
+def _rsiKernel(values, window):
+    indicator = RelativeStrengthIndex(window)
+    return [indicator.updateValue(value) for value in values[0]]
+
+
+def _stdKernel(values, window):
+    rolling = WelfordWindow(window)
+    standardDeviations = []
+    for value in values[0]:
+        rolling.add(value)
+        standardDeviations.append(rolling.standardDeviation())
+    return standardDeviations
+
+
+def _highestKernel(values, window):
+    rolling = MonotonicWindow(window, 1)
+    return [rolling.add(value) for value in values[0]]
+
+
+def _lowestKernel(values, window):
+    rolling = MonotonicWindow(window, 0)
+    return [rolling.add(value) for value in values[0]]
+
+
+def _crossAboveKernel(values, window):
+    a, b = values
+    return [0] + [1 if a[i - 1] <= b[i - 1] and a[i] > b[i] else 0 for i in range(1, len(a))]
+
+
+def _crossBelowKernel(values, window):
+    a, b = values
+    return [0] + [1 if a[i - 1] > b[i - 1] and a[i] <= b[i] else 0 for i in range(1, len(a))]
+
+
+def _runKernel(runLengths, window):
+    # same semantics as TechnicalMethods.runPassedForInterval
+    return [1 if runLengths[i] >= min(window, i) - 1 else 0 for i in range(len(runLengths))]
+
+
+def _forKernel(values, window):
+    # condition has held on each of the last (window) candlesticks
+    held = []
+    run = 0
+    for value in values[0]:
+        if value:
+            run += 1
+        else:
+            run = 0
+        held.append(1 if run >= window else 0)
+    return held
+
+
+def _heldKernel(values, window):
+    # condition became true exactly (window) candlesticks ago and has held since
+    held = []
+    run = 0
+    for value in values[0]:
+        if value:
+            run += 1
+        else:
+            run = 0
+        held.append(1 if run == window else 0)
+    return held
+
+
+_KERNELS = {
+    "+":   lambda values, window: [a + b for a, b in zip(values[0], values[1])],
+    "-":   lambda values, window: [a - b for a, b in zip(values[0], values[1])],
+    "*":   lambda values, window: [a * b for a, b in zip(values[0], values[1])],
+    "/":   lambda values, window: [a / b if b != 0 else 0.0 for a, b in zip(values[0], values[1])],
+    ">":   lambda values, window: [1 if a > b else 0 for a, b in zip(values[0], values[1])],
+    ">=":  lambda values, window: [1 if a >= b else 0 for a, b in zip(values[0], values[1])],
+    "<":   lambda values, window: [1 if a < b else 0 for a, b in zip(values[0], values[1])],
+    "<=":  lambda values, window: [1 if a <= b else 0 for a, b in zip(values[0], values[1])],
+    "and": lambda values, window: [1 if a and b else 0 for a, b in zip(values[0], values[1])],
+    "or":  lambda values, window: [1 if a or b else 0 for a, b in zip(values[0], values[1])],
+    "not": lambda values, window: [0 if a else 1 for a in values[0]],
+    "for": _forKernel,
+    "held": _heldKernel,
+    "sma": _movingAverageKernel,
+    "ema": _emaKernel,
+    "rsi": _rsiKernel,
+    "std": _stdKernel,
+    "highest": _highestKernel,
+    "lowest": _lowestKernel,
+    "cross_above": _crossAboveKernel,
+    "cross_below": _crossBelowKernel,
+    "rising": lambda values, window: _runKernel(risingRunLengths(values[0]), window),
+    "falling": lambda values, window: _runKernel(fallingRunLengths(values[0]), window),
+}
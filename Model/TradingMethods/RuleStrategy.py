@@ -0,0 +1,109 @@
+import RuleCompiler
+from Data import Data
+from Analysis import Analysis
+from SessionContext import SessionContext
+from View import View
+from TradingStrategy import TradingStrategy
+
+# the SMA Crossover (Delayed) strategy as rules, with its parameters as placeholders
+CROSSOVER_TEMPLATE = ("sma(close, {short}) >= sma(close, {long}) for {delay} bars -> long;" +
+                      "cross_below(sma(close, {short}), sma(close, {long})) -> short")
+# the rules strategy offered in the View, and its name as shown in the strategy menu
+CROSSOVER_RULES = CROSSOVER_TEMPLATE.format(short=15, long=50, delay=3)
+CROSSOVER_NAME = "Rules: SMA Crossover (15, 50) D=3"
+
+class RuleStrategy(TradingStrategy):
+    """
+    Class for strategies written in the rule language of RuleCompiler instead of as a
+    hand-written subclass, e.g.
+
+        cross_above(sma(close, 15), sma(close, 50)) for 3 bars -> long
+        cross_below(sma(close, 15), sma(close, 50)) -> short
+
+    The rules are evaluated as whole-column kernels and the resulting signals are traded
+    with the tick loop shared by all strategies in TradingStrategy.simulateSignals().
+
+    Subclass of TradingStrategy.
+    """
+
+    def __init__(self, rules, strategyName=None, context=None):
+        """
+        Initializes a new RuleStrategy.
+
+        @type rules: str, the rules of the strategy, separated by new lines or semicolons
+        @type strategyName: str, the name shown in the trade log, defaults to the rules
+        @type context: SessionContext, the session simulated, defaults to the singletons
+        @rtype: None
+        """
+        self.baseLongPosition = 600             # base long position size
+        self.baseShortPosition = 600            # base short position size
+        self.context = SessionContext.resolve(context)
+        self.analyzer = self.context.analyzer   # the account of the session
+        self.data = self.context.data           # the candlesticks and trade log of the session
+
+        self.rules = RuleCompiler.compileRules(rules)
+        self.series = None                      # series of every node of the rules
+        self.simulatedCount = -1                # number of candlesticks simulated
+
+        self.strategyName = strategyName
+        if self.strategyName == None:
+            self.strategyName = rules.strip()
+
+
+    def signalViewToDrawIndicators(self):
+        """
+        Notifies the View to draw the price-scaled indicators used in the rules.
+
+        @rtype: None
+        """
+        if self.series == None:
+            self.series = self.rules.evaluate(self.data.stockData)
+        view = self.context.getView()
+        for nodeIndex in self.rules.getOverlayNodes():
+            view.drawIndicatorLine(self.series[nodeIndex])
+
+
+    def simulateStrategy(self):
+        """
+        Buys and sells stocks based on this trading strategy.
+
+        @rtype: None
+        """
+        self.simulateTail(0)
+
+
+    def simulatedCandleSticks(self):
+        """
+        Returns the number of candlesticks this strategy has simulated.
+
+        @rtype: int, -1 if the strategy has not been simulated
+        """
+        return self.simulatedCount
+
+
+    def simulateTail(self, firstCandleStick):
+        """
+        Buys and sells stocks based on this trading strategy on the candlesticks from
+        (firstCandleStick) on. The rules are whole-column kernels, so they are evaluated over
+        the whole dataset again; only the trades of the new candlesticks are recorded.
+
+        @type firstCandleStick: int, the index of the first candlestick to simulate
+        @rtype: None
+        """
+        longSignals, shortSignals, self.series = self.rules.getSignals(self.data.stockData)
+        self.simulateSignals(longSignals, shortSignals, self.rules.warmup, firstCandleStick)
+        self.simulatedCount = len(self.data.stockData)
+
+
+    def appendStrategySpecificInfo(self, trade, candleStickCount):
+        """
+        Adds information specific to this trading strategy to the trading logs.
+
+        @type trade: list, the list of information pieces to be added to the trading log
+        @type candleStickCount: int, the candlestick index at which this trade was made
+        @rtype: None
+        """
+        info = []
+        for nodeIndex in self.rules.getOverlayNodes():
+            info.append(self.rules.nodes[nodeIndex][2] + "=" + str(self.series[nodeIndex][candleStickCount]))
+        trade.append(", ".join(info))
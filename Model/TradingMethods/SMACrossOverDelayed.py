@@ -1,6 +1,7 @@
 import TechnicalMethods
 from Data import Data
 from Analysis import Analysis
+from SessionContext import SessionContext
 from View import View
 from TechnicalMethods import SimpleMovingAverage
 from TradingStrategy import TradingStrategy
@@ -19,10 +20,11 @@ class SMACrossOverDelayed(TradingStrategy):
     Subclass of TradingStrategy.
     """
     
-    def __init__(self):
+    def __init__(self, context=None):
         """
         Initializes a new SMACrossOverDelayed object.
 
+        @type context: SessionContext, the session simulated, defaults to the singletons
         @rtype: None
         """
         # Note: Each candlestick represents 1 minute
@@ -33,8 +35,9 @@ class SMACrossOverDelayed(TradingStrategy):
         self.baseShortPosition = 600            # base short position size
         self.crossOverDelayForLongTrades = 3    # number of crossover ticks before executing a long position
         self.crossOverDelayForShortTrades = 3   # number of crossover ticks before executing a long position
-        self.analyzer = Analysis.getInstance()  # get the singleton instance of Analysis
-        self.data = Data.getInstance()          # get the singleton instance of Data
+        self.context = SessionContext.resolve(context)
+        self.analyzer = self.context.analyzer   # the account of the session
+        self.data = self.context.data           # the candlesticks and trade log of the session
         
         self.smaShorter = None                  # shorter-term SMA object
         self.smaShorterList = None              # list of shorter-term SMA values
@@ -46,14 +49,28 @@ class SMACrossOverDelayed(TradingStrategy):
                                            str(self.crossOverDelayForLongTrades)
 
 
+    def parameters(self):
+        """
+        Returns the parameters of this trading strategy.
+        
+        @rtype: dict, from parameter name to value
+        """
+        return {"short": self.crossOverDurationShorter, "long": self.crossOverDurationLonger,
+                "delay": self.crossOverDelayForLongTrades}
+        
+        
     def signalViewToDrawIndicators(self):
         """
-        Notifies the View to draw the technical indicator(s) used for this trading strategy.
+        Notifies the View to draw the technical indicator(s) used for this trading strategy:
+        the SMAs of the simulation, or SMAs computed for the purpose before the first one.
         
         @rtype: None
         """
-        View.getInstantiatedInstance().drawIndicatorDoubleSMA(self.crossOverDurationShorter, 
-                                                                 self.crossOverDurationLonger)                
+        if self.smaShorter == None:
+            self.context.getView().drawIndicatorDoubleSMA(self.crossOverDurationShorter, 
+                                                          self.crossOverDurationLonger)
+        else:
+            self.signalViewToDrawIndicatorOverlays([self.smaShorter, self.smaLonger])
         
         
     def simulateStrategy(self):
@@ -63,40 +80,64 @@ class SMACrossOverDelayed(TradingStrategy):
         @rtype: None
         """
         self.smaShorter = SimpleMovingAverage(self.crossOverDurationShorter)
-        self.smaShorterList = self.smaShorter.getIndicators()
+        self.smaShorterList = self.smaShorter.values
         self.smaLonger = SimpleMovingAverage(self.crossOverDurationLonger)
-        self.smaLongerList = self.smaLonger.getIndicators()
+        self.smaLongerList = self.smaLonger.values
+        self.simulateTail(0)
         
-        # Loops over every tick within the downloaded data
-        for candleStickCount in range(len(self.data.stockData)):
+        
+    def simulatedCandleSticks(self):
+        """
+        Returns the number of candlesticks this strategy has simulated.
+        
+        @rtype: int, -1 if the strategy has not been simulated
+        """
+        if self.smaShorterList == None:
+            return -1
+        return len(self.smaShorterList)
+        
+        
+    def simulateTail(self, firstCandleStick):
+        """
+        Buys and sells stocks based on this trading strategy on the candlesticks from
+        (firstCandleStick) on, streaming them into the SMAs.
+        
+        @type firstCandleStick: int, the index of the first candlestick to simulate
+        @rtype: None
+        """
+        for bar in self.data.stockData[firstCandleStick:]:
+            self.smaShorter.update(bar)
+            self.smaLonger.update(bar)
+        
+        # Loops over every new tick within the downloaded data
+        for candleStickCount in range(firstCandleStick, len(self.data.stockData)):
             previousShortTermSMA = self.smaShorterList[candleStickCount - 1]
             previousLongTermSMA = self.smaLongerList[candleStickCount - 1]
             currentShortTermSMA = self.smaShorterList[candleStickCount]
             currentLongTermSMA = self.smaLongerList[candleStickCount]
-            additionalLongIsInLimits = self.analyzer.checkLongIsInLimits(self.analyzer.positionSize, +\
-                                                                         candleStickCount, self.baseLongPosition)
-            additionalShortIsInLimits = self.analyzer.checkShortIsInLimits(self.analyzer.positionSize, +
-                                                                           candleStickCount, self.baseShortPosition)
-            
             # End of day liquidation
             if candleStickCount == 389:
                 self.liquidateRemainingPosition(candleStickCount)
                 
             # Checks if enough data to make purchase decision and is in limits
-            elif candleStickCount > self.crossOverDurationLonger and additionalLongIsInLimits == 1:
+            elif candleStickCount > self.crossOverDurationLonger and \
+                 self.analyzer.checkLongIsInLimits(self.analyzer.positionSize, candleStickCount,
+                                                   self.longShares(candleStickCount)) == 1:
                 # Cross over has been true for crossOverDelay duration
                 if TechnicalMethods.crossOverDelayForLongTradesPassed(self.crossOverDelayForLongTrades,
                                                                       candleStickCount, self.smaShorterList,
                                                                       self.smaLongerList) == 1:
                     # Buy
-                    self.longStock(candleStickCount, self.baseLongPosition, 0)
+                    self.longStock(candleStickCount, self.longShares(candleStickCount), 0)
             
             # Checks if enough data to make sell decision and is in limits
-            elif candleStickCount > self.crossOverDurationLonger and additionalShortIsInLimits == 1:
+            elif candleStickCount > self.crossOverDurationLonger and \
+                 self.analyzer.checkShortIsInLimits(self.analyzer.positionSize, candleStickCount,
+                                                    self.shortShares(candleStickCount)) == 1:
                 # Checks if should sell
                 if previousShortTermSMA > previousLongTermSMA and currentShortTermSMA <= currentLongTermSMA:
                     # Sell
-                    self.shortStock(candleStickCount, self.baseShortPosition, 0)
+                    self.shortStock(candleStickCount, self.shortShares(candleStickCount), 0)
                 
         
     def appendStrategySpecificInfo(self, trade, candleStickCount):
@@ -1,6 +1,7 @@
 import TechnicalMethods
 from Data import Data
 from Analysis import Analysis
+from SessionContext import SessionContext
 from View import View
 from TechnicalMethods import SimpleMovingAverage
 from TradingStrategy import TradingStrategy
@@ -14,10 +15,11 @@ class SimpleMomentum(TradingStrategy):
     Subclass of TradingStrategy.
     """
     
-    def __init__(self):
+    def __init__(self, context=None):
         """
         Initializes a new SimpleMomentum object.
 
+        @type context: SessionContext, the session simulated, defaults to the singletons
         @rtype: None
         """
         # Note: Each candlestick represents 1 minute
@@ -26,25 +28,37 @@ class SimpleMomentum(TradingStrategy):
         
         self.baseLongPosition = 600             # base long position size
         self.baseShortPosition = 600            # base short position size
-        self.analyzer = Analysis.getInstance()  # get the singleton instance of Analysis
-        self.data = Data.getInstance()          # get the singleton instance of Data
+        self.context = SessionContext.resolve(context)
+        self.analyzer = self.context.analyzer   # the account of the session
+        self.data = self.context.data           # the candlesticks and trade log of the session
         
         self.smaBuy = None                      # buy decision SMA object
         self.smaBuyList = None                  # list of buy decision SMA values
         self.smaSell = None                     # sell decision SMA object
         self.smaSellList = None                 # list of sell decision SMA values
+        self.smaBuyRisingRuns = None            # rising run length of the buy SMA at every tick
+        self.smaSellFallingRuns = None          # falling run length of the sell SMA at every tick
         
         self.strategyName = "Simple Momentum (" + str(self.durationForBuy) + ", " +\
                                              str(self.durationForSell) + ")"
 
 
+    def parameters(self):
+        """
+        Returns the parameters of this trading strategy.
+        
+        @rtype: dict, from parameter name to value
+        """
+        return {"buy": self.durationForBuy, "sell": self.durationForSell}
+        
+        
     def signalViewToDrawIndicators(self):
         """
         Notifies the View to draw the technical indicator(s) used for this trading strategy.
         
         @rtype: None
         """
-        View.getInstantiatedInstance().drawIndicatorDoubleSMA(self.durationForBuy, 
+        self.context.getView().drawIndicatorDoubleSMA(self.durationForBuy, 
                                                                  self.durationForSell)                
         
     # when refactoring, replace analysis with new class name
@@ -55,34 +69,62 @@ class SimpleMomentum(TradingStrategy):
         @rtype: None
         """
         self.smaBuy = SimpleMovingAverage(self.durationForBuy)
-        self.smaBuyList = self.smaBuy.getIndicators()
+        self.smaBuyList = self.smaBuy.values
         self.smaSell = SimpleMovingAverage(self.durationForSell)
-        self.smaSellList = self.smaBuy.getIndicators()
-        
-        # Loops over every tick within the downloaded data
-        for candleStickCount in range(len(self.data.stockData)):
-            additionalLongIsInLimits = self.analyzer.checkLongIsInLimits(self.analyzer.positionSize, 
-                                                                         candleStickCount, self.baseLongPosition)
-            additionalShortIsInLimits = self.analyzer.checkShortIsInLimits(self.analyzer.positionSize, 
-                                                                           candleStickCount, self.baseShortPosition)
-            
+        self.smaSellList = self.smaBuy.values
+        self.smaBuyRisingRuns = []
+        self.smaSellFallingRuns = []
+        self.simulateTail(0)
+        
+        
+    def simulatedCandleSticks(self):
+        """
+        Returns the number of candlesticks this strategy has simulated.
+        
+        @rtype: int, -1 if the strategy has not been simulated
+        """
+        if self.smaBuyList == None:
+            return -1
+        return len(self.smaBuyList)
+        
+        
+    def simulateTail(self, firstCandleStick):
+        """
+        Buys and sells stocks based on this trading strategy on the candlesticks from
+        (firstCandleStick) on, streaming them into the SMAs and their run lengths.
+        
+        @type firstCandleStick: int, the index of the first candlestick to simulate
+        @rtype: None
+        """
+        for bar in self.data.stockData[firstCandleStick:]:
+            self.smaBuy.update(bar)
+            self.smaSell.update(bar)
+        smaBuyRisingRuns = TechnicalMethods.risingRunLengths(self.smaBuyList, self.smaBuyRisingRuns)
+        smaSellFallingRuns = TechnicalMethods.fallingRunLengths(self.smaSellList, self.smaSellFallingRuns)
+        
+        # Loops over every new tick within the downloaded data
+        for candleStickCount in range(firstCandleStick, len(self.data.stockData)):
             # End of day liquidation
             if candleStickCount == 389:
                 self.liquidateRemainingPosition(candleStickCount)
                 
             # Checks if enough data to make purchase decision and is in limits
-            elif candleStickCount > self.durationForBuy and additionalLongIsInLimits == 1:
+            elif candleStickCount > self.durationForBuy and \
+                 self.analyzer.checkLongIsInLimits(self.analyzer.positionSize, candleStickCount,
+                                                   self.longShares(candleStickCount)) == 1:
                 # Checks if SMA values have been rising for self.durationForBuy
-                if TechnicalMethods.valuesRisingInListForInterval(self.durationForBuy, candleStickCount, self.smaBuyList):
+                if TechnicalMethods.runPassedForInterval(self.durationForBuy, candleStickCount, smaBuyRisingRuns):
                     # Buy
-                    self.longStock(candleStickCount, self.baseLongPosition, 0)
+                    self.longStock(candleStickCount, self.longShares(candleStickCount), 0)
             
             # Checks if enough data to make sell decision and is in limits
-            elif candleStickCount > self.durationForSell and additionalShortIsInLimits == 1:
+            elif candleStickCount > self.durationForSell and \
+                 self.analyzer.checkShortIsInLimits(self.analyzer.positionSize, candleStickCount,
+                                                    self.shortShares(candleStickCount)) == 1:
                 # Checks if SMA values have been falling for self.durationForBuy
-                if TechnicalMethods.valuesFallingInListForInterval(self.durationForSell, candleStickCount, self.smaSellList):
+                if TechnicalMethods.runPassedForInterval(self.durationForSell, candleStickCount, smaSellFallingRuns):
                     # Sell
-                    self.shortStock(candleStickCount, self.baseShortPosition, 0)  
+                    self.shortStock(candleStickCount, self.shortShares(candleStickCount), 0)  
                 
         
     def appendStrategySpecificInfo(self, trade, candleStickCount):
@@ -1,55 +1,51 @@
+from collections import deque
 from Data import Data
+from Indicators import Indicator
 
-class SimpleMovingAverage:
+class SimpleMovingAverage(Indicator):
     """
     Class responsible for calculating the Simple Moving Average for every
     ticker in a stock dataset.
     """
     
-    def __init__(self, duration):
+    def __init__(self, duration, column=1):
         """
         Initializes a new SimpleMovingAverage.
     
         @type duration: int, the duration of the simple moving average
+        @type column: int, the index of the candlestick value to average
         @rtype: None
         """
+        Indicator.__init__(self, column)
         self.duration = duration
+        self.reset()
     
     
-    def getIndicators(self):
+    def reset(self):
         """
-        Computes and returns the simple moving average for every tick in the
-        stock currently being tracked.
+        Clears the values and the rolling window of the simple moving average.
+        
+        @rtype: None
+        """
+        Indicator.reset(self)
+        self._window = deque()
+        self._sum = 0.0
     
-        @type duration: int, the duration of the simple moving average
-        @rtype: list, the list of all simple moving average values of the given
-                duration for all ticks in the stock being tracked in Data
+    
+    def updateValue(self, value):
+        """
+        Adds the head of the window to the rolling sum and removes the tail once
+        the window is full. Before enough data exists for the indicator, the
+        average of all values so far is returned.
+        
+        @type value: float, the newest value to average
+        @rtype: float, the simple moving average ending at this value
         """
-        sum = 0
-        tail = 0
-        head = 0
-        returnList = []
-        data = Data.getInstance()
-        for i in range (len(data.stockData)):
-            if i < self.duration - 1:
-                # before enough data exists for indicator
-                sum += data.stockData[i][1]
-                returnList.append(sum/(i+1))
-            elif i == self.duration - 1:
-                # when enough data exists for indicator, set head & tail
-                tail = data.stockData[i - self.duration][1]
-                head = data.stockData[i][1]
-                sum += data.stockData[i][1]
-                returnList.append(sum/self.duration)
-            else:
-                # after enough data exists for indicator, remove tail
-                # and add head to sums
-                sum -= tail
-                head = data.stockData[i][1]
-                sum += head
-                tail = data.stockData[i - self.duration][1]
-                returnList.append(sum/self.duration)
-        return returnList
+        self._window.append(value)
+        self._sum += value
+        if len(self._window) > self.duration:
+            self._sum -= self._window.popleft()
+        return self._sum / len(self._window)
     
     
 def valuesRisingInListForInterval(duration, index, ls):
@@ -137,4 +133,63 @@ def crossOverDelayForShortTradesPassed(crossOverDelayLong, candlestickCount, sma
         longCrossOverCountTicksAgo = smaLongList[candlestickCount - ticksAgo]
         if shortCrossOverCountTicksAgo > longCrossOverCountTicksAgo:
             passed = 0
-    return passed
\ No newline at end of file
+    return passed
+
+def risingRunLengths(ls, runLengths=None):
+    """
+    Returns, for every index in a list, the number of consecutive strictly increasing
+    steps ending at that index. Computed in one pass, so that checking whether values
+    have been rising for an interval is a single comparison per index instead of a
+    rescan of the interval as in valuesRisingInListForInterval.
+
+    @type ls: list, the list of values to check
+    @type runLengths: list, the run lengths of a prefix of the list, extended in place
+                      with the rest, or None to compute them all
+    @rtype: list, the length of the rising run ending at every index
+    """
+    if runLengths == None:
+        runLengths = []
+    for i in range(len(runLengths), len(ls)):
+        if i > 0 and ls[i - 1] < ls[i]:
+            runLengths.append(runLengths[i - 1] + 1)
+        else:
+            runLengths.append(0)
+    return runLengths
+
+
+def fallingRunLengths(ls, runLengths=None):
+    """
+    Returns, for every index in a list, the number of consecutive strictly decreasing
+    steps ending at that index. Computed in one pass, see risingRunLengths.
+
+    @type ls: list, the list of values to check
+    @type runLengths: list, the run lengths of a prefix of the list, extended in place
+                      with the rest, or None to compute them all
+    @rtype: list, the length of the falling run ending at every index
+    """
+    if runLengths == None:
+        runLengths = []
+    for i in range(len(runLengths), len(ls)):
+        if i > 0 and ls[i - 1] > ls[i]:
+            runLengths.append(runLengths[i - 1] + 1)
+        else:
+            runLengths.append(0)
+    return runLengths
+
+
+def runPassedForInterval(duration, index, runLengths):
+    """
+    Returns whether the run ending at (index) covers the previous (duration) values,
+    with the same semantics as valuesRisingInListForInterval and
+    valuesFallingInListForInterval.
+
+    @type duration: int, the number of previous values to check
+    @type index: int, the index in the list to check backwards from
+    @type runLengths: list, run lengths from risingRunLengths or fallingRunLengths
+    @rtype: int, whether the run covers the given duration
+    """
+    if index - duration < 0:
+        duration = index
+    if runLengths[index] >= duration - 1:
+        return 1
+    return 0
@@ -2,8 +2,12 @@ import TechnicalMethods
 import abc
 from Data import Data
 from Analysis import Analysis
+from SessionContext import SessionContext
 from View import View
 from TechnicalMethods import SimpleMovingAverage
+from Backtest import backtestSignals
+from Instrumentation import Instrumentation
+from SignalPublisher import SignalPublisher
 
 class TradingStrategy:
     """
@@ -11,20 +15,26 @@ class TradingStrategy:
     child classes to implement.
     """
     
-    def __init__(self):
+    # trades from this candlestick on are live signals, None outside of a poll; set by
+    # simulateNewCandleSticks(), shared default since subclasses set up their own attributes
+    liveCandleStick = None
+    
+    def __init__(self, context=None):
         """
         Notifies the View to draw the technical indicator(s) used for this trading strategy.
         It is intended for this method to be overridden in most, but not all, of this class's
         subclasses.
         
+        @type context: SessionContext, the session simulated, defaults to the singletons
         @rtype: None
         """
         # Note: Each candlestick represents 1 minute
         self.strategyName = None
         self.baseLongPosition = 600             # base long position size
         self.baseShortPosition = 600            # base short position size
-        self.analyzer = Analysis.getInstance()  # get the singleton instance of Analysis
-        self.data = Data.getInstance()          # get the singleton instance of Data
+        self.context = SessionContext.resolve(context)
+        self.analyzer = self.context.analyzer   # the account of the session
+        self.data = self.context.data           # the candlesticks and trade log of the session
         self.dynamicTradingSizeLong = 0.8       # How much money to use per long trade
                                                 # as a percentage of cash
         self.dynamicTradingSizeShort = 0.8      # How much money to use per short trade
@@ -46,6 +56,39 @@ class TradingStrategy:
         self.baseShortPosition = int(self.dynamicTradingSizeShort * 
                                      actualCurrentCash / sharePrice)
         
+    def longShares(self, candleStickCount):
+        """
+        Returns the number of shares of a long trade, the base long position as sized by the
+        risk engine of the account.
+
+        @type candleStickCount: int, the current tick index in the dataset for the stock
+        @rtype: int
+        """
+        return self.analyzer.risk.sizeShares(candleStickCount, self.baseLongPosition, self.data.stockData)
+
+
+    def shortShares(self, candleStickCount):
+        """
+        Returns the number of shares of a short trade, the base short position as sized by the
+        risk engine of the account.
+
+        @type candleStickCount: int, the current tick index in the dataset for the stock
+        @rtype: int
+        """
+        return self.analyzer.risk.sizeShares(candleStickCount, self.baseShortPosition, self.data.stockData)
+
+
+    def getBars(self, minutes):
+        """
+        Returns the candlesticks of the stock being tracked in a higher timeframe, built from
+        the minute candlesticks in Data and cached per timeframe by the Resampler.
+        
+        @type minutes: int, the timeframe in minutes, e.g. 5, 15, 60 or Resampler.DAILY
+        @rtype: list, the candlesticks of the timeframe, organized like Data.stockData
+        """
+        return self.context.resampler.getBars(minutes, self.data.stockData)
+        
+        
     @abc.abstractmethod
     def signalViewToDrawIndicators(self):
         """
@@ -55,7 +98,23 @@ class TradingStrategy:
         @rtype: None
         """
         return
-    
+
+
+    def signalViewToDrawIndicatorOverlays(self, indicators):
+        """
+        Notifies the View to draw already computed indicators from Indicators or
+        TechnicalMethods over the chart. Intended to be called from
+        signalViewToDrawIndicators() by strategies that keep their indicator objects.
+
+        @type indicators: list, the Indicator objects used by this trading strategy
+        @rtype: None
+        """
+        view = self.context.getView()
+        lineCount = 0
+        for indicator in indicators:
+            lineCount += view.drawIndicatorOverlay(indicator, lineCount)
+
+
     @abc.abstractmethod
     def simulateStrategy(self):
         """
@@ -64,6 +123,68 @@ class TradingStrategy:
         @rtype: None
         """
         return
+
+
+    def simulateNewCandleSticks(self, firstCandleStick):
+        """
+        Buys and sells stocks on the candlesticks appended to Data by a poll, continuing the
+        simulation of the earlier candlesticks, so that the work of a poll grows with the new
+        candlesticks rather than with the whole day. When this strategy has not simulated
+        exactly the earlier candlesticks (new data, another strategy, or a strategy that
+        cannot continue a simulation), the whole dataset is simulated again instead.
+        
+        @type firstCandleStick: int, the index of the first new candlestick, 0 if the data was
+                                replaced
+        @rtype: None
+        """
+        # only the trades on the candlesticks new to this poll are live signals; when the data
+        # was replaced, only its latest candlestick is
+        if firstCandleStick > 0:
+            self.liveCandleStick = firstCandleStick
+        else:
+            self.liveCandleStick = len(self.data.stockData) - 1
+        try:
+            if firstCandleStick == 0 or self.simulatedCandleSticks() != firstCandleStick:
+                self.data.clearTrades()
+                self.analyzer.preAnalysisCalculations()
+                self.simulateStrategy()
+            elif firstCandleStick < len(self.data.stockData):
+                self.analyzer.resumeAnalysisCalculations()
+                self.simulateTail(firstCandleStick)
+        finally:
+            self.liveCandleStick = None
+
+
+    def parameters(self):
+        """
+        Returns the parameters of this trading strategy, e.g. the durations of its
+        indicators, as recorded with its results.
+        
+        @rtype: dict, from parameter name to value
+        """
+        return {}
+
+
+    def simulatedCandleSticks(self):
+        """
+        Returns the number of candlesticks this strategy has simulated and can continue from
+        with simulateTail(). Strategies that cannot continue a simulation return -1.
+        
+        @rtype: int
+        """
+        return -1
+
+
+    def simulateTail(self, firstCandleStick):
+        """
+        Buys and sells stocks on the candlesticks from (firstCandleStick) on, updating the
+        indicators only for those candlesticks. Only called when simulatedCandleSticks()
+        equals firstCandleStick; strategies that can continue a simulation override both.
+        
+        @type firstCandleStick: int, the index of the first candlestick to simulate
+        @rtype: None
+        """
+        return
             
     def liquidateRemainingPosition(self, candleStickCount):
         """
@@ -76,7 +197,37 @@ class TradingStrategy:
         if (self.analyzer.position > 0):
             self.shortStock(candleStickCount, self.analyzer.position, 0)
         elif (self.analyzer.position < 0):
-            self.longStock(candleStickCount, self.analyzer.position, 0)
+            self.longStock(candleStickCount, -self.analyzer.position, 0)
+
+
+    def simulateSignals(self, longSignals, shortSignals, warmup, firstCandleStick=0):
+        """
+        Buys and sells stocks based on precomputed long and short signals, using the tick
+        loop, limit checks and end of day liquidation shared by all trading strategies
+        (see Backtest.backtestSignals). The resulting trades are recorded through longStock()
+        and shortStock() so that Analysis, the trade log and the chart are updated as usual.
+        Unlike the tick loops of the hand-written strategies, a short signal is traded even
+        when a long trade would be within the long limit, as long as there is no long signal.
+        
+        @type longSignals: list, truthy at every candlestick with a long (buy) signal
+        @type shortSignals: list, truthy at every candlestick with a short (sell) signal
+        @type warmup: int, signals are ignored up to and including this candlestick
+        @type firstCandleStick: int, trades before this candlestick are already recorded and
+                                are skipped
+        @rtype: None
+        """
+        result = backtestSignals(self.data.stockData, longSignals, shortSignals, warmup,
+                                 self.baseLongPosition, self.baseShortPosition,
+                                 self.analyzer.cash, self.analyzer.commission,
+                                 self.analyzer.maxLongPosition, self.analyzer.maxShortPosition,
+                                 risk=self.analyzer.risk)
+        for candleStickCount, positionType, positionSizeInShares, sharePrice in result.fills:
+            if candleStickCount < firstCandleStick:
+                continue
+            if positionType == 0:
+                self.longStock(candleStickCount, positionSizeInShares, 0)
+            else:
+                self.shortStock(candleStickCount, positionSizeInShares, 0)
 
     
     def longStock(self, candleStickCount, positionSizeInShares, indicatorVariables):
@@ -93,8 +244,40 @@ class TradingStrategy:
         
         # append long mark at candleStickCount in self.data.tradeSignals and add trade record
         self.data.tradeSignals.append([candleStickCount, 0])
-        View.getInstantiatedInstance().updateChart()
+        if self.context.isDefault == 1:
+            # sessions simulated concurrently in the background are not the sketch's trades
+            Instrumentation.getInstance().count("tradesEmitted")
+        self.updateViewChart()
         self.addLongRecord(candleStickCount, self.strategyName, "Long", positionSizeInShares)
+        self.publishSignal(candleStickCount)
+        
+        
+    def updateViewChart(self):
+        """
+        Notifies the View, if one has been instantiated, that the chart has changed. There is
+        no View when strategies are simulated headless (e.g. in benchmarks).
+        
+        @rtype: None
+        """
+        view = self.context.getView()
+        if view != None:
+            view.updateChart()
+        
+        
+    def publishSignal(self, candleStickCount):
+        """
+        Publishes the trade just recorded to the consumers of the SignalPublisher, if it is
+        listening and the trade is a live signal: a trade of the session shown on screen, on
+        the current day, on a candlestick new to the poll being simulated. Trades of headless
+        sessions (e.g. backtests and the Compare screen), of past days, and of the earlier
+        candlesticks of a day simulated again are not published.
+        
+        @type candleStickCount: int, the current tick index in the dataset for the stock
+        @rtype: None
+        """
+        if self.context.isDefault == 1 and self.data.timeDays == 0 and \
+           self.liveCandleStick != None and candleStickCount >= self.liveCandleStick:
+            SignalPublisher.getInstance().publish(self.data, self.data.tradeLog[-1])
         
         
     def performLongStockCalculations(self, candleStickCount, positionSizeInShares):
@@ -120,8 +303,12 @@ class TradingStrategy:
             
         # append short mark at candleStickCount in self.data.tradeSignals and add trade record
         self.data.tradeSignals.append([candleStickCount, 1])
-        View.getInstantiatedInstance().updateChart()
+        if self.context.isDefault == 1:
+            # sessions simulated concurrently in the background are not the sketch's trades
+            Instrumentation.getInstance().count("tradesEmitted")
+        self.updateViewChart()
         self.addShortRecord(candleStickCount, self.strategyName, "Short", positionSizeInShares)
+        self.publishSignal(candleStickCount)
         
         
     def performShortStockCalculations(self, candleStickCount, positionSizeInShares):
@@ -139,7 +326,7 @@ class TradingStrategy:
         self.addDetailsToTrade(trade, candleStickCount, strategyName, positionType, 
                                positionSizeInShares);
         self.appendStrategySpecificInfo(trade, candleStickCount)
-        self.data.tradeLog.append(trade)
+        self.data.recordTrade(trade)
         
     
     def addShortRecord(self, candleStickCount, strategyName, positionType, positionSizeInShares):
@@ -148,7 +335,7 @@ class TradingStrategy:
         trade = []
         self.addDetailsToTrade(trade, candleStickCount, strategyName, positionType, positionSizeInShares);
         self.appendStrategySpecificInfo(trade, candleStickCount)
-        self.data.tradeLog.append(trade)
+        self.data.recordTrade(trade)
       
       
     @abc.abstractmethod
@@ -0,0 +1,324 @@
+from array import array
+from collections import deque
+from TimeIndex import alignBars
+
+# the universe scanned when no config file is given, as in the View's stock profiles
+DEFAULT_UNIVERSE = "universe.txt"
+
+
+def loadUniverse(path=DEFAULT_UNIVERSE):
+    """
+    Reads a universe config file: one "TICKER EXCHANGE" per line, with blank lines and lines
+    starting with # ignored.
+
+    @type path: str, the config file
+    @rtype: list, of (ticker, exchange)
+    """
+    universe = []
+    universeFile = open(path, "r")
+    try:
+        for line in universeFile:
+            fields = line.split("#", 1)[0].split()
+            if len(fields) == 0:
+                continue
+            if len(fields) != 2:
+                raise ValueError("expected TICKER EXCHANGE in " + path + ": " + line.strip())
+            universe.append((fields[0], fields[1]))
+    finally:
+        universeFile.close()
+    return universe
+
+
+class ScanSignal():
+    """
+    Holds one live signal found by a UniverseScanner.
+    """
+
+    def __init__(self, ticker, exchange, strategyName, positionType, strength, price):
+        """
+        Initializes a new ScanSignal.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type strategyName: str, the scan that found the signal
+        @type positionType: str, "Long" or "Short"
+        @type strength: float, how strong the signal is, signals are ranked by it
+        @type price: float, the close the signal was found on
+        @rtype: None
+        """
+        self.ticker = ticker
+        self.exchange = exchange
+        self.strategyName = strategyName
+        self.positionType = positionType
+        self.strength = strength
+        self.price = price
+
+
+class CrossOverScan():
+    """
+    Scans for the entry conditions of the SMA Crossover strategies, with the predicates of
+    their tick loops. With a delay of 1, as SMACrossOver: a long signal when the shorter SMA
+    crosses above the longer one, a short signal when it crosses back to or below it. With a
+    longer delay, as SMACrossOverDelayed: a long signal on every bar on which the shorter SMA
+    has been at or above the longer one for the last (delay) bars, and the same short signal.
+    Strength is the spread between the SMAs relative to the longer one.
+
+    The SMAs are only compared once the universe has (longer) bars, so the first signals can
+    come a few bars later than in the strategies, which compare them from the first bar on.
+    """
+
+    def __init__(self, shorter=15, longer=50, delay=1):
+        """
+        Initializes a new CrossOverScan.
+
+        @type shorter: int, the shorter SMA duration
+        @type longer: int, the longer SMA duration
+        @type delay: int, the number of bars the shorter SMA must stay at or above the longer
+                     one, 1 for the crossover of SMACrossOver
+        @rtype: None
+        """
+        self.shorter = shorter
+        self.longer = longer
+        self.delay = delay
+        self.strategyName = "SMA Crossover (" + str(shorter) + ", " + str(longer) + ")"
+        if delay > 1:
+            self.strategyName += " D=" + str(delay)
+        self._previousShorter = None    # per ticker, the shorter SMA on the previous bar
+        self._previousLonger = None     # per ticker, the longer SMA on the previous bar
+        self._aboveRuns = None          # per ticker, number of bars the shorter SMA was at or above
+
+
+    def durations(self):
+        """
+        Returns the SMA durations this scan needs.
+
+        @rtype: list, of durations
+        """
+        return [self.shorter, self.longer]
+
+
+    def scan(self, scanner):
+        """
+        Returns the signals of the latest bar, evaluated across the whole universe at once.
+
+        @type scanner: UniverseScanner, the scanner holding the closes and SMAs
+        @rtype: list, of (ticker index, "Long" or "Short", strength)
+        """
+        shorter = scanner.sma(self.shorter)
+        longer = scanner.sma(self.longer)
+        if scanner.barCount < self.longer:
+            return []
+        if self._previousShorter == None:
+            self._previousShorter = array("d", shorter)
+            self._previousLonger = array("d", longer)
+            self._aboveRuns = [1 if shorter[i] >= longer[i] else 0 for i in range(len(shorter))]
+            return []
+
+        signals = []
+        previousShorter = self._previousShorter
+        previousLonger = self._previousLonger
+        aboveRuns = self._aboveRuns
+        for tickerIndex in range(len(shorter)):
+            current = shorter[tickerIndex]
+            currentLonger = longer[tickerIndex]
+            if current >= currentLonger:
+                aboveRuns[tickerIndex] += 1
+            else:
+                aboveRuns[tickerIndex] = 0
+            wasAbove = previousShorter[tickerIndex] > previousLonger[tickerIndex]
+            if self.delay > 1:
+                isLong = aboveRuns[tickerIndex] >= self.delay
+            else:
+                isLong = not wasAbove and current > currentLonger
+            if isLong:
+                signals.append((tickerIndex, "Long", (current - currentLonger) / currentLonger))
+            elif wasAbove and current <= currentLonger:
+                signals.append((tickerIndex, "Short", (currentLonger - current) / currentLonger))
+            previousShorter[tickerIndex] = current
+            previousLonger[tickerIndex] = currentLonger
+        return signals
+
+
+class MomentumScan():
+    """
+    Scans for the entry conditions of the Simple Momentum strategy: a long signal when an SMA
+    has risen for (runLength) bars in a row, a short signal when it has fallen for as long.
+    Strength is the change of the SMA over the run relative to its value.
+    """
+
+    def __init__(self, duration=15, runLength=5):
+        """
+        Initializes a new MomentumScan.
+
+        @type duration: int, the SMA duration
+        @type runLength: int, the number of bars the SMA must rise or fall in a row
+        @rtype: None
+        """
+        self.duration = duration
+        self.runLength = runLength
+        self.strategyName = "SMA Momentum (" + str(duration) + ", " + str(runLength) + ")"
+        self._previous = None           # per ticker, the SMA on the previous bar
+        self._runs = None               # per ticker, rising run (> 0) or falling run (< 0)
+        self._runStarts = None          # per ticker, the SMA when its run started
+
+
+    def durations(self):
+        """
+        Returns the SMA durations this scan needs.
+
+        @rtype: list, of durations
+        """
+        return [self.duration]
+
+
+    def scan(self, scanner):
+        """
+        Returns the signals of the latest bar, evaluated across the whole universe at once.
+
+        @type scanner: UniverseScanner, the scanner holding the closes and SMAs
+        @rtype: list, of (ticker index, "Long" or "Short", strength)
+        """
+        values = scanner.sma(self.duration)
+        if scanner.barCount < self.duration:
+            return []
+        if self._previous == None:
+            self._previous = array("d", values)
+            self._runs = [0] * len(values)
+            self._runStarts = array("d", values)
+            return []
+
+        signals = []
+        previous = self._previous
+        runs = self._runs
+        runStarts = self._runStarts
+        for tickerIndex in range(len(values)):
+            value = values[tickerIndex]
+            if value > previous[tickerIndex]:
+                if runs[tickerIndex] <= 0:
+                    runs[tickerIndex] = 0
+                    runStarts[tickerIndex] = previous[tickerIndex]
+                runs[tickerIndex] += 1
+                if runs[tickerIndex] == self.runLength:
+                    signals.append((tickerIndex, "Long", (value - runStarts[tickerIndex]) / value))
+            elif value < previous[tickerIndex]:
+                if runs[tickerIndex] >= 0:
+                    runs[tickerIndex] = 0
+                    runStarts[tickerIndex] = previous[tickerIndex]
+                runs[tickerIndex] -= 1
+                if runs[tickerIndex] == -self.runLength:
+                    signals.append((tickerIndex, "Short", (runStarts[tickerIndex] - value) / value))
+            previous[tickerIndex] = value
+        return signals
+
+
+class UniverseScanner():
+    """
+    Class responsible for scanning a universe of stocks for the entry signals of the trading
+    strategies on every new bar, and publishing them ranked by strength.
+
+    The scanner keeps a (time x tickers) matrix of closes: one row of the closes of every
+    ticker per bar, for as many bars as the longest SMA needs. Each SMA is kept as a row of
+    running sums updated with the entering and leaving rows of closes, so a new bar costs a
+    few operations per ticker and SMA, whatever the SMA durations. The scans then evaluate
+    their conditions on those rows across the whole universe at once, rather than one
+    ticker at a time.
+    """
+
+    def __init__(self, universe, scans=None, topCount=20):
+        """
+        Initializes a new UniverseScanner.
+
+        @type universe: list, of (ticker, exchange), see loadUniverse()
+        @type scans: list, of CrossOverScan or MomentumScan, defaults to the scans of the
+                     trading strategies
+        @type topCount: int, the number of signals published per bar
+        @rtype: None
+        """
+        if scans == None:
+            scans = [MomentumScan(15, 5), CrossOverScan(15, 50), CrossOverScan(15, 50, 3)]
+        self.universe = universe
+        self.scans = scans
+        self.topCount = topCount
+        self.signals = []               # the ranked signals of the latest bar
+        self.listeners = []             # functions called with the ranked signals of every bar
+        self.barCount = 0               # number of bars scanned
+
+        self._durations = sorted(set([duration for scan in scans for duration in scan.durations()]))
+        self._closes = deque(maxlen=self._durations[-1] + 1)
+                                        # rows of closes, oldest first
+        self._sums = dict([(duration, array("d", [0.0] * len(universe))) for duration in self._durations])
+        self._lastCloses = [None] * len(universe)
+
+
+    def sma(self, duration):
+        """
+        Returns the SMA of every ticker on the latest bar. Before (duration) bars, the average
+        of the bars so far.
+
+        @type duration: int, one of the durations of the scans
+        @rtype: list, of the SMA of every ticker, in the order of the universe
+        """
+        count = float(min(duration, self.barCount))
+        return [total / count for total in self._sums[duration]]
+
+
+    def addBar(self, closes):
+        """
+        Adds the closes of a new bar and scans it.
+
+        @type closes: list, the close of every ticker in the order of the universe, None
+                      where a ticker has no bar (its previous close is carried forward)
+        @rtype: list, of ScanSignal, the strongest first
+        """
+        row = array("d", [0.0] * len(closes))
+        lastCloses = self._lastCloses
+        for tickerIndex in range(len(closes)):
+            close = closes[tickerIndex]
+            if close == None or close != close:
+                close = lastCloses[tickerIndex]
+                if close == None:
+                    close = 0.0
+            lastCloses[tickerIndex] = close
+            row[tickerIndex] = close
+
+        self._closes.append(row)
+        self.barCount += 1
+        for duration in self._durations:
+            sums = self._sums[duration]
+            if self.barCount > duration:
+                leaving = self._closes[-duration - 1]
+                self._sums[duration] = array("d", [total + entering - left for total, entering, left
+                                                   in zip(sums, row, leaving)])
+            else:
+                self._sums[duration] = array("d", [total + entering for total, entering in zip(sums, row)])
+
+        found = []
+        for scan in self.scans:
+            for tickerIndex, positionType, strength in scan.scan(self):
+                ticker, exchange = self.universe[tickerIndex]
+                found.append(ScanSignal(ticker, exchange, scan.strategyName, positionType,
+                                        strength, row[tickerIndex]))
+        found.sort(key=lambda signal: -signal.strength)
+        self.signals = found[:self.topCount]
+        for listener in self.listeners:
+            listener(self.signals)
+        return self.signals
+
+
+    def scanDay(self, fetcher, timeDays):
+        """
+        Downloads a day of every ticker of the universe in parallel and scans its bars in
+        order, as they would have arrived.
+
+        @type fetcher: BulkFetcher, downloads and caches the candlesticks
+        @type timeDays: int, the day, as number of days prior to current day
+        @rtype: list, of the ranked signals of every bar
+        """
+        fetcher.fetchAll([(ticker, exchange, timeDays) for ticker, exchange in self.universe])
+        barsByTicker = [fetcher.cache.get((ticker, exchange, timeDays), [])
+                        for ticker, exchange in self.universe]
+
+        # the tickers are lined up on a common clock once, a ticker without a bar on a minute
+        # keeps its previous close
+        aligned = alignBars(barsByTicker)
+        return [self.addBar(closes) for closes in aligned.rows()]
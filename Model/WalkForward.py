@@ -0,0 +1,232 @@
+import threading
+import RuleCompiler
+from Data import Data
+from Analysis import Analysis
+from Backtest import backtestSignals
+from Backtest import equityCurve
+from BulkFetcher import BulkFetcher, FetchError
+from BarArchive import dayKey
+from ResultsStore import parameterKey
+from WorkerPool import runInParallel
+from RiskEngine import RISK_RULES
+from RuleStrategy import CROSSOVER_TEMPLATE
+
+
+def parameterGrid(**parameterValues):
+    """
+    Returns every combination of the given parameter values, e.g.
+    parameterGrid(short=[5, 15], long=[50]) -> [{"short": 5, "long": 50}, {"short": 15, "long": 50}]
+
+    @rtype: list, of dicts from parameter name to value
+    """
+    grid = [{}]
+    for name in sorted(parameterValues):
+        grid = [dict(parameters, **{name: value}) for parameters in grid for value in parameterValues[name]]
+    return grid
+
+
+class WalkForwardFold():
+    """
+    Holds one fold of a walk-forward run: the parameters chosen on the in-sample days, and how
+    they performed on the following out-of-sample days.
+    """
+
+    def __init__(self, inSampleDays, outOfSampleDays):
+        """
+        Initializes a new WalkForwardFold.
+
+        @type inSampleDays: list, the in-sample days, as number of days prior to current day
+        @type outOfSampleDays: list, the out-of-sample days, as number of days prior to current day
+        @rtype: None
+        """
+        self.inSampleDays = inSampleDays
+        self.outOfSampleDays = outOfSampleDays
+        self.parameters = None          # the best parameters on the in-sample days
+        self.inSamplePL = 0             # profit/loss of those parameters in-sample ($)
+        self.outOfSamplePL = 0          # profit/loss of those parameters out-of-sample ($)
+        self.equityCurve = []           # out-of-sample profit/loss at every candlestick ($)
+
+
+class WalkForward():
+    """
+    Class responsible for walk-forward optimization: the parameters of a rule strategy are
+    optimized on a rolling window of in-sample days, then traded on the following
+    out-of-sample days, and the out-of-sample results of all folds are stitched together.
+
+    Overlapping in-sample windows share their work: each day's candlesticks, indicator series
+    and the result of every parameter set on that day are computed once and cached. Folds
+    run in parallel on worker threads, see WorkerPool.runInParallel().
+    """
+
+    def __init__(self, template=CROSSOVER_TEMPLATE, grid=None, inSampleDays=5, outOfSampleDays=1,
+                 workerCount=4, fetcher=None, store=None):
+        """
+        Initializes a new WalkForward.
+
+        @type template: str, the rules of the strategy with {parameter} placeholders
+        @type grid: list, of dicts from parameter name to value, the parameter sets to try
+        @type inSampleDays: int, the number of days parameters are optimized on
+        @type outOfSampleDays: int, the number of days the optimized parameters are traded on
+        @type workerCount: int, the number of folds run in parallel
+        @type fetcher: BulkFetcher, downloads and caches the candlesticks of every day
+        @type store: ResultsStore, records the backtest of every parameter set on every day,
+                     or None
+        @rtype: None
+        """
+        if fetcher == None:
+            fetcher = BulkFetcher()
+        if grid == None:
+            grid = parameterGrid(short=[5, 10, 15, 20], long=[30, 50, 80], delay=[1, 3, 5])
+        self.template = template
+        self.grid = [parameters for parameters in grid
+                     if "short" not in parameters or "long" not in parameters or
+                     parameters["short"] < parameters["long"]]
+        self.inSampleDays = inSampleDays
+        self.outOfSampleDays = outOfSampleDays
+        self.workerCount = workerCount
+        self.fetcher = fetcher
+        self.store = store
+
+        analyzer = Analysis.getInstance()
+        self._accountSettings = (analyzer.cashInitial, analyzer.commission,
+                                 analyzer.maxLongPosition, analyzer.maxShortPosition)
+        self._riskRules = dict([(rule, getattr(analyzer.risk, rule)) for rule in RISK_RULES])
+        self._dayResults = {}           # (ticker, exchange, day) -> {parameter key -> BacktestResult}
+        self._daySeries = {}            # (ticker, exchange, day) -> series cache of RuleCompiler
+        self._dayRisks = {}             # (ticker, exchange, day) -> RiskEngine, with its volatilities
+        self._dayLocks = {}             # (ticker, exchange, day) -> lock, one computation per day
+        self._cacheLock = threading.Lock()
+
+
+    def run(self, ticker=None, exchange=None, dayCount=14):
+        """
+        Runs the walk-forward optimization over the last (dayCount) days.
+
+        @type ticker: str, stock ticker name, defaults to the stock being tracked in Data
+        @type exchange: str, stock exchange name, defaults to the stock being tracked in Data
+        @type dayCount: int, the number of days to cover, oldest first
+        @rtype: tuple, (list of WalkForwardFold in order, stitched out-of-sample equity curve)
+        """
+        if dayCount < self.inSampleDays + self.outOfSampleDays:
+            raise ValueError("walk-forward needs at least " + str(self.inSampleDays + self.outOfSampleDays) +
+                             " days (in-sample plus out-of-sample), not " + str(dayCount))
+        data = Data.getInstance()
+        if ticker == None:
+            ticker, exchange = data.ticker, data.exchange
+        days = list(range(dayCount - 1, -1, -1))
+
+        folds = []
+        start = 0
+        while start + self.inSampleDays + self.outOfSampleDays <= len(days):
+            folds.append(WalkForwardFold(days[start:start + self.inSampleDays],
+                                         days[start + self.inSampleDays:
+                                              start + self.inSampleDays + self.outOfSampleDays]))
+            start += self.outOfSampleDays
+
+        # download every day up front, in parallel
+        errors = self.fetcher.fetchAll([(ticker, exchange, day) for day in days])
+        if len(errors) > 0:
+            raise FetchError("walk-forward could not download " + str(len(errors)) + " of " +
+                             str(len(days)) + " days: " +
+                             "; ".join([str(errors[key]) for key in sorted(errors)]))
+        runInParallel(lambda fold: self._runFold(ticker, exchange, fold), folds, self.workerCount)
+        if self.store != None:
+            self.store.flush()
+
+        # stitch the out-of-sample curves, each continuing from the previous fold's profit/loss
+        stitchedCurve = []
+        offset = 0.0
+        for fold in folds:
+            stitchedCurve.extend([offset + PL for PL in fold.equityCurve])
+            if len(stitchedCurve) > 0:
+                offset = stitchedCurve[-1]
+        return folds, stitchedCurve
+
+
+    def _runFold(self, ticker, exchange, fold):
+        """
+        Picks the best parameters on the fold's in-sample days and trades them out-of-sample.
+        Helper.
+
+        @rtype: None
+        """
+        for parameters in self.grid:
+            PL = 0.0
+            for day in fold.inSampleDays:
+                PL += self._dayResult(ticker, exchange, day, parameters).PL
+            if fold.parameters == None or PL > fold.inSamplePL:
+                fold.parameters = parameters
+                fold.inSamplePL = PL
+
+        offset = 0.0
+        for day in fold.outOfSampleDays:
+            result = self._dayResult(ticker, exchange, day, fold.parameters)
+            curve = equityCurve(self._bars(ticker, exchange, day), result, self._accountSettings[1])
+            fold.equityCurve.extend([offset + PL for PL in curve])
+            fold.outOfSamplePL += result.PL
+            offset += result.PL
+
+
+    def _dayResult(self, ticker, exchange, day, parameters):
+        """
+        Returns the cached backtest of a parameter set on a day, computing it on first use.
+        Helper.
+
+        @rtype: BacktestResult
+        """
+        cacheKey = (ticker, exchange, day)
+        key = parameterKey(parameters)
+        with self._dayLock(cacheKey):
+            results = self._dayResults.setdefault(cacheKey, {})
+            if key not in results:
+                stockData = self._bars(ticker, exchange, day)
+                rules = RuleCompiler.compileRules(self.template.format(**parameters))
+                longSignals, shortSignals, series = rules.getSignals(
+                    stockData, self._daySeries.setdefault(cacheKey, {}))
+                cashInitial, commission, maxLongPosition, maxShortPosition = self._accountSettings
+                if cacheKey not in self._dayRisks:
+                    self._dayRisks[cacheKey] = self._riskEngine()
+                results[key] = backtestSignals(stockData, longSignals, shortSignals, rules.warmup,
+                                               cashInitial=cashInitial, commission=commission,
+                                               maxLongPosition=maxLongPosition,
+                                               maxShortPosition=maxShortPosition,
+                                               risk=self._dayRisks[cacheKey])
+                if self.store != None and len(stockData) > 0:
+                    result = results[key]
+                    self.store.recordRun(ticker, exchange, self.template, parameters,
+                                         dayKey(stockData[0][0]), len(stockData), len(result.fills),
+                                         result.PL, result.cash, result.commissionTotal,
+                                         result.position)
+            return results[key]
+
+
+    def _bars(self, ticker, exchange, day):
+        """
+        Returns the cached candlesticks of a day, downloading them on first use. Helper.
+
+        @rtype: list
+        """
+        return self.fetcher.fetch(ticker, exchange, day)
+
+
+    def _riskEngine(self):
+        """
+        Returns a RiskEngine with the account settings and risk rules this WalkForward was
+        created with, so that the parameters are scored on the fills the strategy would make.
+        Each day gets its own, as a RiskEngine keeps the volatilities of one dataset. Helper.
+
+        @rtype: RiskEngine
+        """
+        analyzer = Analysis(Data())
+        analyzer.cashInitial, analyzer.commission, analyzer.maxLongPosition, \
+            analyzer.maxShortPosition = self._accountSettings
+        for rule in self._riskRules:
+            setattr(analyzer.risk, rule, self._riskRules[rule])
+        return analyzer.risk
+
+
+    def _dayLock(self, cacheKey):
+        with self._cacheLock:
+            if cacheKey not in self._dayLocks:
+                self._dayLocks[cacheKey] = threading.RLock()
+            return self._dayLocks[cacheKey]
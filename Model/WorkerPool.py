@@ -0,0 +1,54 @@
+import sys
+import threading
+import Queue
+
+
+def runInParallel(function, tasks, workerCount=4):
+    """
+    Calls a function on every task on a pool of worker threads (Jython threads run on
+    separate cores, and multiprocessing is not available on Jython), and waits for all of
+    them. If any call raises, the first error is raised again once every worker is done,
+    with the traceback of the worker it was raised in.
+
+    @type function: function, called with one task
+    @type tasks: list, the tasks
+    @type workerCount: int, the number of tasks run at a time
+    @rtype: None
+    """
+    pending = Queue.Queue()
+    for task in tasks:
+        pending.put(task)
+    errors = []
+
+    def work():
+        while True:
+            try:
+                task = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                function(task)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    workers = [threading.Thread(target=work) for i in range(max(1, min(workerCount, len(tasks))))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if len(errors) > 0:
+        _reraise(errors[0])
+
+
+def _reraise(errorInfo):
+    """
+    Raises an error again with its original traceback. Helper.
+
+    @type errorInfo: tuple, (type, value, traceback) as returned by sys.exc_info()
+    @rtype: None
+    """
+    errorType, error, trace = errorInfo
+    if sys.version_info[0] >= 3:
+        raise error.with_traceback(trace)
+    # the three argument raise is a syntax error on Python 3, which the sources also compile on
+    exec("raise errorType, error, trace", {"errorType": errorType, "error": error, "trace": trace})
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# the folders of the sketch whose modules are imported by name, e.g. "from Data import Data"
+SKETCH_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SKETCH_FOLDERS = ["Model", os.path.join("Model", "TradingMethods"), "View", "Controller"]
+
+
+def addSketchPaths():
+    """
+    Adds the folders of the sketch to the module search path, so that the Model, View and
+    Controller modules can be imported outside of Processing (e.g. by benchmarks and other
+    headless tools).
+
+    @rtype: None
+    """
+    for folder in SKETCH_FOLDERS:
+        path = os.path.join(SKETCH_DIRECTORY, folder)
+        if path not in sys.path:
+            sys.path.insert(0, path)
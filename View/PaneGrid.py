@@ -0,0 +1,260 @@
+import math
+from BulkFetcher import BulkFetcher
+from SessionContext import SessionContext
+from TechnicalMethods import SimpleMovingAverage
+
+# parameters of a strategy that are SMA durations, drawn as lines over a pane's chart
+SMA_PARAMETERS = ["short", "long", "buy", "sell"]
+
+
+class ComparePane():
+    """
+    Holds one pane of a PaneGrid: a stock, a strategy simulated on it in its own
+    SessionContext, and the image the pane was last rendered to.
+    """
+
+    def __init__(self, ticker, exchange, strategyIndex, strategyFactory):
+        """
+        Initializes a new ComparePane.
+
+        @type ticker: str, stock ticker name
+        @type exchange: str, stock exchange name
+        @type strategyIndex: int, index of the strategy in Analysis
+        @type strategyFactory: function, creates the strategy from a SessionContext
+        @rtype: None
+        """
+        self.ticker = ticker
+        self.exchange = exchange
+        self.strategyIndex = strategyIndex
+        self.context = SessionContext.forBars([], ticker, exchange)
+        self.tradingStrategy = strategyFactory(self.context)
+        self.bars = None                # the candlesticks simulated, shared with other panes
+        self.image = None               # the pane rendered by createGraphics(), None if stale
+
+
+    def simulate(self, bars, timeDays):
+        """
+        Simulates the pane's strategy on new candlesticks, and marks the pane to be rendered
+        again.
+
+        @type bars: list, the candlesticks of the pane's stock, only read
+        @type timeDays: int, the day of the candlesticks, as number of days prior to current day
+        @rtype: None
+        """
+        data = self.context.data
+        data.stockData = bars
+        data.timeDays = timeDays
+        data.revision += 1
+        data.clearTrades()
+        self.context.analyzer.preAnalysisCalculations()
+        if len(bars) > 0:
+            self.tradingStrategy.simulateStrategy()
+            self.context.analyzer.postAnalysisCalculations()
+        self.bars = bars
+        self.image = None
+
+
+class PaneGrid():
+    """
+    Class responsible for the comparison screen of the View: a grid of panes, each showing
+    one stock with one strategy, so that several stocks and strategies can be compared at
+    once instead of clicking through them one at a time.
+
+    Candlesticks are downloaded once per stock and shared by every pane showing that stock,
+    as are the SMA series drawn over them. A pane is simulated again only when its
+    candlesticks change, and rendered again only after it was simulated: otherwise its
+    cached image is drawn as it is. Panes past the visible page are neither simulated nor
+    rendered.
+    """
+
+    def __init__(self, view, panes, strategyFactories, fetcher=None, columns=None, rows=None):
+        """
+        Initializes a new PaneGrid.
+
+        @type view: View, the View the grid is drawn in, over its chart area
+        @type panes: list, of (ticker, exchange, strategyIndex)
+        @type strategyFactories: dict, from strategy index to a function creating the
+                                 strategy from a SessionContext
+        @type fetcher: BulkFetcher, downloads and caches the candlesticks of every stock
+        @type columns: int, the number of panes per row, defaults to a square grid
+        @type rows: int, the number of rows on a page, defaults to a square grid
+        @rtype: None
+        """
+        if fetcher == None:
+            fetcher = BulkFetcher()
+        if columns == None:
+            columns = int(math.ceil(math.sqrt(len(panes))))
+        if rows == None:
+            rows = int(math.ceil(len(panes) / float(max(columns, 1))))
+        self.view = view
+        self.fetcher = fetcher
+        self.columns = max(columns, 1)
+        self.rows = max(rows, 1)
+        self.page = 0                   # the page of panes shown
+        self.timeDays = None            # the day shown, as number of days prior to current day
+        self.panes = [ComparePane(ticker, exchange, strategyIndex, strategyFactories[strategyIndex])
+                      for ticker, exchange, strategyIndex in panes]
+        self._indicators = {}           # (ticker, exchange, duration) -> (candlesticks, SMA values)
+
+
+    def visiblePanes(self):
+        """
+        Returns the panes on the current page.
+
+        @rtype: list, of ComparePane
+        """
+        panesPerPage = self.columns * self.rows
+        return self.panes[self.page * panesPerPage:(self.page + 1) * panesPerPage]
+
+
+    def refresh(self, timeDays):
+        """
+        Downloads the candlesticks of the visible panes' stocks, in parallel and once per
+        stock, and simulates the panes whose candlesticks changed. The current day is
+        downloaded again on every refresh, past days only when the day changes.
+
+        @type timeDays: int, the day to show, as number of days prior to current day
+        @rtype: int, the number of panes simulated
+        """
+        panes = self.visiblePanes()
+        stocks = sorted(set([(pane.ticker, pane.exchange) for pane in panes]))
+        if timeDays == 0:
+            for ticker, exchange in stocks:
+                self.fetcher.cache.pop((ticker, exchange, 0), None)
+        self.fetcher.fetchAll([(ticker, exchange, timeDays) for ticker, exchange in stocks])
+        self.timeDays = timeDays
+
+        simulatedCount = 0
+        for pane in panes:
+            bars = self.fetcher.cache.get((pane.ticker, pane.exchange, timeDays), [])
+            if pane.bars is not bars:
+                pane.simulate(bars, timeDays)
+                simulatedCount += 1
+        return simulatedCount
+
+
+    def draw(self):
+        """
+        Draws the visible panes over the chart area of the View, rendering only the panes
+        that were simulated since they were last drawn.
+
+        @rtype: None
+        """
+        paneWidth = int(self.view.chartWidth / self.columns)
+        paneHeight = int(self.view.chartHeight / self.rows)
+        for paneIndex, pane in enumerate(self.visiblePanes()):
+            if pane.image == None or pane.image.width != paneWidth or pane.image.height != paneHeight:
+                pane.image = createGraphics(paneWidth, paneHeight)
+                self.renderPane(pane, pane.image)
+            image(pane.image, self.view.chartStartX + (paneIndex % self.columns) * paneWidth,
+                  self.view.chartStartY + (paneIndex // self.columns) * paneHeight)
+
+
+    def renderPane(self, pane, graphics):
+        """
+        Renders a pane: its candlesticks, the SMAs of its strategy, its trade signals, and
+        its strategy name and profit/loss.
+
+        @type pane: ComparePane, the pane to render
+        @type graphics: PGraphics, the image the pane is rendered to
+        @rtype: None
+        """
+        bars = pane.bars if pane.bars != None else []
+        paneWidth = graphics.width
+        paneHeight = graphics.height
+        chartTop = 0.2 * paneHeight
+        chartHeight = 0.75 * paneHeight
+
+        graphics.beginDraw()
+        graphics.background(255)
+        graphics.stroke(0)
+        graphics.noFill()
+        graphics.rect(0, 0, paneWidth - 1, paneHeight - 1)
+        graphics.fill(0)
+        graphics.textSize(max(8, int(paneHeight * 0.07)))
+        graphics.text(pane.ticker + " - " + pane.tradingStrategy.strategyName, 4, 0.09 * paneHeight)
+        if len(bars) == 0:
+            graphics.text("No data", 4, 0.18 * paneHeight)
+            graphics.endDraw()
+            return
+        graphics.text("P/L ($): " + str(round(pane.context.analyzer.PL, 2)) + "   Trades: " +
+                      str(pane.context.data.journal.count), 4, 0.17 * paneHeight)
+
+        highestPrice = max([bar[2] for bar in bars])
+        lowestPrice = min([bar[3] for bar in bars])
+        pixelDensity = chartHeight / max(highestPrice - lowestPrice, 1e-9)
+        candleStickWidth = (paneWidth - 4.0) / (390 + 2)
+
+        def x(candleStickCount):
+            return 2 + (candleStickCount + 0.5) * candleStickWidth
+
+        def y(price):
+            return chartTop + chartHeight - (price - lowestPrice) * pixelDensity
+
+        # candlesticks as high-low lines, coloured by direction
+        for candleStickCount in range(len(bars)):
+            bar = bars[candleStickCount]
+            if bar[1] >= bar[4]:
+                graphics.stroke(0, 160, 0)
+            else:
+                graphics.stroke(220, 0, 0)
+            graphics.line(x(candleStickCount), y(bar[3]), x(candleStickCount), y(bar[2]))
+
+        # SMAs of the strategy, shared by every pane of the stock
+        smaColors = [(0, 0, 255), (255, 140, 0)]
+        parameters = pane.tradingStrategy.parameters()
+        durations = sorted([parameters[name] for name in SMA_PARAMETERS if name in parameters])
+        for durationIndex in range(len(durations)):
+            values = self._smaValues(pane, durations[durationIndex])
+            graphics.stroke(*smaColors[durationIndex % len(smaColors)])
+            for candleStickCount in range(1, min(len(bars), len(values))):
+                graphics.line(x(candleStickCount - 1), y(values[candleStickCount - 1]),
+                              x(candleStickCount), y(values[candleStickCount]))
+
+        # trade signals, below the low of a long and above the high of a short
+        graphics.noStroke()
+        for candleStickCount, signal in pane.context.data.tradeSignals:
+            if candleStickCount >= len(bars):
+                continue
+            if signal == 0:
+                graphics.fill(0, 160, 0)
+                graphics.triangle(x(candleStickCount) - 3, y(bars[candleStickCount][3]) + 7,
+                                  x(candleStickCount) + 3, y(bars[candleStickCount][3]) + 7,
+                                  x(candleStickCount), y(bars[candleStickCount][3]) + 2)
+            else:
+                graphics.fill(220, 0, 0)
+                graphics.triangle(x(candleStickCount) - 3, y(bars[candleStickCount][2]) - 7,
+                                  x(candleStickCount) + 3, y(bars[candleStickCount][2]) - 7,
+                                  x(candleStickCount), y(bars[candleStickCount][2]) - 2)
+        graphics.endDraw()
+
+
+    def paneAt(self, pointX, pointY):
+        """
+        Returns the visible pane at a point of the screen, e.g. the mouse pointer.
+
+        @type pointX: float, the x coordinate
+        @type pointY: float, the y coordinate
+        @rtype: ComparePane, or None if there is no pane at the point
+        """
+        column = int((pointX - self.view.chartStartX) // (self.view.chartWidth / self.columns))
+        row = int((pointY - self.view.chartStartY) // (self.view.chartHeight / self.rows))
+        if column < 0 or column >= self.columns or row < 0 or row >= self.rows:
+            return None
+        panes = self.visiblePanes()
+        if row * self.columns + column >= len(panes):
+            return None
+        return panes[row * self.columns + column]
+
+
+    def _smaValues(self, pane, duration):
+        """
+        Returns the SMA of a pane's candlesticks, computed once for all panes of the stock.
+        Helper.
+
+        @rtype: list, the SMA value at every candlestick
+        """
+        key = (pane.ticker, pane.exchange, duration)
+        if key not in self._indicators or self._indicators[key][0] is not pane.bars:
+            self._indicators[key] = (pane.bars, SimpleMovingAverage(duration).getIndicators(pane.bars))
+        return self._indicators[key][1]
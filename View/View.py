@@ -1,3 +1,5 @@
+from itertools import islice
+from collections import deque
 from Data import Data
 from StockProfile import StockProfile
 from TradingStrategyProfile import TradingStrategyProfile
@@ -6,6 +8,7 @@ from DayPreviousProfile import DayPreviousProfile
 from ModeProfile import ModeProfile
 from TechnicalMethods import SimpleMovingAverage
 from Analysis import Analysis
+from RoundTrips import RoundTripStatistics, matchRoundTrips
 
 class View():
     """
@@ -53,6 +56,16 @@ class View():
         # Mode in which the user is viewing
         self.mode = 0
         
+        # Grid of panes compared side by side in mode 2, set up by Market.pyde
+        self.paneGrid = None
+        
+        # Whether the History Screen shows round trips instead of fills, toggled by clicking
+        # its mode profile again
+        self.showRoundTrips = 0
+        self._roundTripKey = None           # journal run and count the round trips were matched for
+        self._roundTrips = deque(maxlen=66) # the latest round trips shown
+        self._roundTripStatistics = RoundTripStatistics()
+        
         # Static standard font size
         View.stdTextSize = int(width / 116.364)
         
@@ -62,6 +75,11 @@ class View():
         self.chartWidth = 0.94 * width
         self.chartHeight = 0.6 * height
         
+        # Components changed since the last redraw: "screen" for everything
+        self.dirty = set(["screen"])
+        self._dirtyProfiles = set()
+        self._hoveredProfiles = set()
+        
         # Sets up the profiles for the stocks tracked
         self.profiles = []
         self._stockProfileCount = 0
@@ -73,6 +91,8 @@ class View():
         self._data = Data.getInstance()
         self._highestPrice = self._data.maxHighInData()
         self._lowestPrice = self._data.minLowInData()
+        self._chartRevision = None          # Data.revision the price range was computed for
+        self._chartCandleStickCount = 0     # number of candlesticks the price range covers
         
         # Sets price:pixel density and variables for functions
         self._pixelDensity = 0.6 * height / (self._highestPrice - self._lowestPrice)
@@ -80,6 +100,61 @@ class View():
         self._candleStickStartX = self.chartStartX + 0.0027 * width
         
         
+    def invalidate(self, component="screen"):
+        """
+        Marks a component of the View as changed, so that it is drawn again by the next
+        redraw(). "screen" redraws everything, e.g. after new data, a click or a mode switch.
+        
+        @type component: str, the component that changed
+        @rtype: None
+        """
+        self.dirty.add(component)
+        
+        
+    def updateHover(self):
+        """
+        Checks which profiles the mouse pointer is over, and marks the profiles that it
+        entered or left as changed, so that only their tiles are drawn again.
+        
+        @rtype: None
+        """
+        for profile in self.profiles:
+            hovered = profile in self._hoveredProfiles
+            if profile.mousedOver() == 1 and not hovered:
+                self._hoveredProfiles.add(profile)
+                self._dirtyProfiles.add(profile)
+            elif profile.mousedOver() == 0 and hovered:
+                self._hoveredProfiles.discard(profile)
+                self._dirtyProfiles.add(profile)
+        
+        
+    def redraw(self, tradingStrategy):
+        """
+        Draws only what changed since the last redraw: the whole screen if it was
+        invalidated, otherwise just the profile tiles whose hover state changed. When nothing
+        changed, nothing is drawn and the previous frame stays on the screen.
+        
+        @type tradingStrategy: TradingStrategy, the strategy whose indicators are drawn
+        @rtype: int, 1 if anything was drawn, 0 if the screen was left as it is
+        """
+        if "screen" in self.dirty:
+            self.updateChart()
+            self.drawBackground()
+            if self.mode == 0:      self.drawMainScreen(tradingStrategy)
+            elif self.mode == 1:    self.drawHistoryScreen()
+            elif self.mode == 2:    self.drawCompareScreen()
+        elif len(self._dirtyProfiles) > 0:
+            textSize(View.stdTextSize)
+            for profile in self._dirtyProfiles:
+                profile.drawProfile()
+            colorWhite()
+        else:
+            return 0
+        self.dirty = set()
+        self._dirtyProfiles = set()
+        return 1
+        
+        
     def drawMainScreen(self, tradingStrategy):
         """
         Draws the Main Screen of the program.
@@ -99,7 +174,23 @@ class View():
         
         @rtype: None
         """
-        self.drawTradeHistory()
+        if self.showRoundTrips == 1:
+            self.drawRoundTripHistory()
+        else:
+            self.drawTradeHistory()
+        self.drawInfo()
+        self.drawProfiles()
+        
+        
+    def drawCompareScreen(self):
+        """
+        Draws the Compare Screen of the program, the stocks and strategies of the pane grid
+        side by side.
+        
+        @rtype: None
+        """
+        if self.paneGrid != None:
+            self.paneGrid.draw()
         self.drawInfo()
         self.drawProfiles()
         
@@ -110,24 +201,49 @@ class View():
         
         @rtype: None
         """
-        smaShort = SimpleMovingAverage(crossOverDurationShorter)
-        smaShortList = smaShort.getIndicators()
-        smaLong = SimpleMovingAverage(crossOverDurationLonger)
-        smaLongList = smaLong.getIndicators()
+        smaShortList = SimpleMovingAverage(crossOverDurationShorter).getIndicators()
+        smaLongList = SimpleMovingAverage(crossOverDurationLonger).getIndicators()
         
-        for candleStickCount in range(1, len(self.data.stockData)): #candleStickCount chart
-            # draw short-term SMA
-            colorGreen()
-            lineX = self._candleStickStartX + 0.5 * self._candleStickWidth + candleStickCount * self._candleStickWidth
-            lineY1 = self.chartStartY + self.chartHeight - (smaShortList[candleStickCount - 1] - self._lowestPrice) * self._pixelDensity
-            lineY2 = self.chartStartY + self.chartHeight - (smaShortList[candleStickCount] - self._lowestPrice) * self._pixelDensity        
-            line(lineX - self._candleStickWidth, lineY1, lineX, lineY2)
+        # draw short-term SMA
+        colorGreen()
+        self.drawIndicatorLine(smaShortList)
+        
+        # draw long-term SMA
+        colorBlue()
+        self.drawIndicatorLine(smaLongList)
+        
+        
+    def drawIndicatorOverlay(self, indicator, firstColor=0):
+        """
+        Draws the price-scaled lines of an already computed indicator on the stock chart,
+        e.g. the middle, upper and lower lines of Bollinger Bands. Does not recompute the
+        indicator.
+        
+        @type indicator: Indicator, an indicator from Indicators or TechnicalMethods
+        @type firstColor: int, the color of the first line, as the number of lines drawn
+                          before it, so that several indicators get different colors
+        @rtype: int, the number of lines drawn
+        """
+        overlayColors = [colorGreen, colorBlue, colorRed]
+        overlayLists = indicator.getOverlayLists()
+        for overlayIndex in range(len(overlayLists)):
+            overlayColors[(firstColor + overlayIndex) % len(overlayColors)]()
+            self.drawIndicatorLine(overlayLists[overlayIndex])
+        return len(overlayLists)
+            
             
-            # draw long-term SMA
-            colorBlue()
+    def drawIndicatorLine(self, valueList):
+        """
+        Draws one line of price-scaled indicator values on the stock chart, one segment
+        per candlestick.
+        
+        @type valueList: list, the indicator value at every candlestick
+        @rtype: None
+        """
+        for candleStickCount in range(1, min(len(self.data.stockData), len(valueList))): #candleStickCount chart
             lineX = self._candleStickStartX + 0.5 * self._candleStickWidth + candleStickCount * self._candleStickWidth
-            lineY1 = self.chartStartY + self.chartHeight - (smaLongList[candleStickCount - 1] - self._lowestPrice) * self._pixelDensity
-            lineY2 = self.chartStartY + self.chartHeight - (smaLongList[candleStickCount] - self._lowestPrice) * self._pixelDensity        
+            lineY1 = self.chartStartY + self.chartHeight - (valueList[candleStickCount - 1] - self._lowestPrice) * self._pixelDensity
+            lineY2 = self.chartStartY + self.chartHeight - (valueList[candleStickCount] - self._lowestPrice) * self._pixelDensity        
             line(lineX - self._candleStickWidth, lineY1, lineX, lineY2)
             
         
@@ -139,8 +255,17 @@ class View():
         """
         self.data = Data.getInstance()
         self._tradeSignals = self._data.tradeSignals
-        self._highestPrice = self._data.maxHighInData()
-        self._lowestPrice = self._data.minLowInData()
+        stockData = self._data.stockData
+        if self._chartRevision != self._data.revision or self._chartCandleStickCount > len(stockData):
+            self._highestPrice = self._data.maxHighInData()
+            self._lowestPrice = self._data.minLowInData()
+        else:
+            # candlesticks were only appended, so only the new ones can extend the price range
+            for candleStickCount in range(self._chartCandleStickCount, len(stockData)):
+                self._highestPrice = max(self._highestPrice, stockData[candleStickCount][2])
+                self._lowestPrice = min(self._lowestPrice, stockData[candleStickCount][3])
+        self._chartRevision = self._data.revision
+        self._chartCandleStickCount = len(stockData)
         self._pixelDensity = 0.6 * height / (self._highestPrice - self._lowestPrice)
         
         
@@ -173,6 +298,7 @@ class View():
         """
         self._addModeProfile("Main Screen", 0)
         self._addModeProfile("Trading History", 1)
+        self._addModeProfile("Compare", 2)
         
         
     def _addModeProfile(self, name, modeIndex):
@@ -193,6 +319,7 @@ class View():
         self._addTradingStrategyProfile("SMA Momentum (15, 5)", 0)
         self._addTradingStrategyProfile("SMA Crossover (15, 50)", 1)
         self._addTradingStrategyProfile("SMA Crossover (15, 5) Delay (3)", 2)
+        self._addTradingStrategyProfile("Rules: SMA Crossover (15, 50) D=3", 3)
         
 
     def _addTradingStrategyProfile(self, name, strategyIndex):
@@ -308,10 +435,13 @@ class View():
         @rtype: None
         """
         # draw arrows on chart for buy/sell signals
-        for candleStickCount in range(len(self._tradeSignals)):
-            if self._tradeSignals[candleStickCount][1] == 0:
+        candleStickTotal = len(self.data.stockData)
+        for candleStickCount, signal in self._tradeSignals:
+            if candleStickCount >= candleStickTotal:
+                continue
+            if signal == 0:
                 self.drawUpArrowForLong(candleStickCount)
-            if self._tradeSignals[candleStickCount][1] == 1:
+            if signal == 1:
                 self.drawDownArrowForShort(candleStickCount)
     
     
@@ -324,16 +454,16 @@ class View():
         @rtype: None
         """
         colorGreen()
-        actionBuySquareX = self._candleStickStartX + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        actionBuySquareY = self.chartStartY + self.chartHeight + 0.05 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][3] - self._lowestPrice) * self._pixelDensity
+        actionBuySquareX = self._candleStickStartX + candleStickCount * self._candleStickWidth
+        actionBuySquareY = self.chartStartY + self.chartHeight + 0.05 * height - (self.data.stockData[candleStickCount][3] - self._lowestPrice) * self._pixelDensity
         rect(actionBuySquareX, actionBuySquareY, self._candleStickWidth + 0.001 * width, 0.008 * height)
         
-        triangleX1 = self._candleStickStartX - 0.0015 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        triangleY1 = self.chartStartY + self.chartHeight + 0.05 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][3] - self._lowestPrice) * self._pixelDensity
-        triangleX2 = self._candleStickStartX + 0.005 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
+        triangleX1 = self._candleStickStartX - 0.0015 * width + candleStickCount * self._candleStickWidth
+        triangleY1 = self.chartStartY + self.chartHeight + 0.05 * height - (self.data.stockData[candleStickCount][3] - self._lowestPrice) * self._pixelDensity
+        triangleX2 = self._candleStickStartX + 0.005 * width + candleStickCount * self._candleStickWidth
         triangleY2 = triangleY1
-        triangleX3 = self._candleStickStartX + 0.00175 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        triangleY3 = self.chartStartY + self.chartHeight + 0.04 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][3] - self._lowestPrice) * self._pixelDensity
+        triangleX3 = self._candleStickStartX + 0.00175 * width + candleStickCount * self._candleStickWidth
+        triangleY3 = self.chartStartY + self.chartHeight + 0.04 * height - (self.data.stockData[candleStickCount][3] - self._lowestPrice) * self._pixelDensity
         triangle(triangleX1, triangleY1, triangleX2, triangleY2, triangleX3, triangleY3)
         
         
@@ -346,16 +476,16 @@ class View():
         @rtype: None
         """
         colorRed()
-        actionSellSquareX = self._candleStickStartX + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        actionSellSquareY = self.chartStartY + self.chartHeight - 0.05 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][2] - self._lowestPrice) * self._pixelDensity
+        actionSellSquareX = self._candleStickStartX + candleStickCount * self._candleStickWidth
+        actionSellSquareY = self.chartStartY + self.chartHeight - 0.05 * height - (self.data.stockData[candleStickCount][2] - self._lowestPrice) * self._pixelDensity
         rect(actionSellSquareX, actionSellSquareY, self._candleStickWidth + 0.001 * width, -0.008 * height)
         
-        triangleX1 = self._candleStickStartX - 0.0015 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        triangleY1 = self.chartStartY + self.chartHeight - 0.05 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][2] - self._lowestPrice) * self._pixelDensity
-        triangleX2 = self._candleStickStartX + 0.005 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
+        triangleX1 = self._candleStickStartX - 0.0015 * width + candleStickCount * self._candleStickWidth
+        triangleY1 = self.chartStartY + self.chartHeight - 0.05 * height - (self.data.stockData[candleStickCount][2] - self._lowestPrice) * self._pixelDensity
+        triangleX2 = self._candleStickStartX + 0.005 * width + candleStickCount * self._candleStickWidth
         triangleY2 = triangleY1
-        triangleX3 = self._candleStickStartX + 0.00175 * width + self._tradeSignals[candleStickCount][0] * self._candleStickWidth
-        triangleY3 = self.chartStartY + self.chartHeight - 0.04 * height - (self.data.stockData[self._tradeSignals[candleStickCount][0]][2] - self._lowestPrice) * self._pixelDensity
+        triangleX3 = self._candleStickStartX + 0.00175 * width + candleStickCount * self._candleStickWidth
+        triangleY3 = self.chartStartY + self.chartHeight - 0.04 * height - (self.data.stockData[candleStickCount][2] - self._lowestPrice) * self._pixelDensity
         triangle(triangleX1, triangleY1, triangleX2, triangleY2, triangleX3, triangleY3)
         
     
@@ -491,26 +621,144 @@ class View():
         # draw the log text
         textSize(tradeLogTextSize)
         
-        for tradeIndex in range(len(self._data.tradeLog)):
-            if tradeIndex < 66:
-                text(self._data.tradeLog[tradeIndex][0] + 1, tradeLogTextStartX, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                text(self._data.tradeLog[tradeIndex][1], tradeLogTextStartX + 0.04 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                
-                # alternate colors for position type column based on trading type
-                if self._data.tradeLog[tradeIndex][2] == "Long":
-                    colorGreen()
-                elif self._data.tradeLog[tradeIndex][2] == "Short":
-                    colorBlue()
-                text(self._data.tradeLog[tradeIndex][2], tradeLogTextStartX + 0.20 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                colorBlack()
-                
-                text(self._data.tradeLog[tradeIndex][3], tradeLogTextStartX + 0.25 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                text(self._data.tradeLog[tradeIndex][4], tradeLogTextStartX + 0.30 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                text(self._data.tradeLog[tradeIndex][5], tradeLogTextStartX + 0.39 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                text(self._data.tradeLog[tradeIndex][6], tradeLogTextStartX + 0.48 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                text(self._data.tradeLog[tradeIndex][7], tradeLogTextStartX + 0.60 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
-                
+        for tradeIndex, trade in enumerate(islice(self._data.tradeLog, 66)):
+            text(trade[0] + 1, tradeLogTextStartX, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            text(trade[1], tradeLogTextStartX + 0.04 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            
+            # alternate colors for position type column based on trading type
+            if trade[2] == "Long":
+                colorGreen()
+            elif trade[2] == "Short":
+                colorBlue()
+            text(trade[2], tradeLogTextStartX + 0.20 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            colorBlack()
+            
+            text(trade[3], tradeLogTextStartX + 0.25 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            text(trade[4], tradeLogTextStartX + 0.30 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            text(trade[5], tradeLogTextStartX + 0.39 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            text(trade[6], tradeLogTextStartX + 0.48 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            text(trade[7], tradeLogTextStartX + 0.60 * self.chartWidth, tradeLogTextStartY + tradeLogTextSize * 1.2 * tradeIndex)
+            
+    
+    def updateRoundTrips(self):
+        """
+        Matches the fills of the current run of the trade journal into round trips, again
+        only when trades were recorded since. Only the totals and the latest round trips are
+        kept, so that runs with very many fills are summarized in one pass over the journal.
+        
+        @rtype: None
+        """
+        journal = self._data.journal
+        key = (journal.run, journal.count, self._data.revision, len(self._data.stockData))
+        if key == self._roundTripKey:
+            return
+        self._roundTripKey = key
+        self._roundTrips.clear()
+        self._roundTripStatistics = RoundTripStatistics()
+        for roundTrip in matchRoundTrips(journal.trades(), self._data.stockData,
+                                         Analysis.getInstance().commission):
+            self._roundTrips.append(roundTrip)
+            self._roundTripStatistics.add(roundTrip)
+        
+        
+    def drawRoundTripHistory(self):
+        """
+        Draws the round trips of the simulation on the currently tracked stock: the fills of
+        the trade history paired first in first out, with their profit/loss, holding time
+        and excursions.
+        
+        @rtype: None
+        """
+        self.updateRoundTrips()
+        tradeLogStartY = self.chartStartY + 0.05 * height
+        tradeLogHeight = self.chartHeight - 0.05 * height
+        tradeLogTextStartX = self.chartStartX + 0.005 * width
+        tradeLogTextStartY = tradeLogStartY + 0.05 * height
+        tradeLogTextSize = int(View.stdTextSize * 1.3)
+        tradeLogTitleY = tradeLogTextStartY - 0.03 * height
+        columns = [0.0, 0.08, 0.16, 0.23, 0.30, 0.40, 0.50, 0.59, 0.71, 0.83]
+        
+        # outer panel and line separators in the round trip log
+        colorWhite()
+        rect(self.chartStartX, tradeLogStartY, self.chartWidth, tradeLogHeight) #Outer box
+        line(self.chartStartX, tradeLogStartY + 0.03 * height, self.chartStartX + self.chartWidth, tradeLogStartY + 0.03 * height)
+        for column in columns[1:]:
+            line(self.chartStartX + column * self.chartWidth, tradeLogStartY, self.chartStartX + column * self.chartWidth, tradeLogStartY + tradeLogHeight)
+        
+        textSize(tradeLogTextSize)
+        
+        colorBlack()
+        
+        # titles and criteria in round trip log
+        titles = ["Entry Tick", "Exit Tick", "Type", "Shares", "Entry Price", "Exit Price",
+                  "Held (min)", "P/L ($)", "MAE ($)", "MFE ($)"]
+        for column, title in zip(columns, titles):
+            text(title, tradeLogTextStartX + column * self.chartWidth, tradeLogTitleY)
+        
+        # draw the title text and the totals
+        statistics = self._roundTripStatistics
+        textSize(tradeLogTextSize * 2)
+        text("Round Trips", width/2 - (3 * 2 * tradeLogTextSize), 0.05 * height)
+        textSize(tradeLogTextSize)
+        text("%d round trips, %.1f%% winners, P/L $%.2f, average held %.1f min" % (
+             statistics.count, 100 * statistics.winRate(), statistics.PL,
+             statistics.averageHoldingTime()), self.chartStartX, tradeLogStartY - 0.005 * height)
+        
+        # draw the latest round trips
+        for tripIndex, roundTrip in enumerate(self._roundTrips):
+            rowY = tradeLogTextStartY + tradeLogTextSize * 1.2 * tripIndex
+            text(roundTrip.entryCandleStick + 1, tradeLogTextStartX + columns[0] * self.chartWidth, rowY)
+            text(roundTrip.exitCandleStick + 1, tradeLogTextStartX + columns[1] * self.chartWidth, rowY)
+            
+            # alternate colors for position type column based on trading type
+            if roundTrip.positionType == "Long":
+                colorGreen()
+            else:
+                colorBlue()
+            text(roundTrip.positionType, tradeLogTextStartX + columns[2] * self.chartWidth, rowY)
+            colorBlack()
+            
+            text(roundTrip.shares, tradeLogTextStartX + columns[3] * self.chartWidth, rowY)
+            text(str(roundTrip.entryPrice), tradeLogTextStartX + columns[4] * self.chartWidth, rowY)
+            text(str(roundTrip.exitPrice), tradeLogTextStartX + columns[5] * self.chartWidth, rowY)
+            text(roundTrip.holdingTime, tradeLogTextStartX + columns[6] * self.chartWidth, rowY)
+            
+            # profitable round trips in green, losing ones in red
+            if roundTrip.PL > 0:
+                fill(0, 160, 0)
+            else:
+                colorRed()
+            text(str(round(roundTrip.PL, 2)), tradeLogTextStartX + columns[7] * self.chartWidth, rowY)
+            colorBlack()
+            
+            if roundTrip.MAE != None:
+                text(str(round(roundTrip.MAE, 2)), tradeLogTextStartX + columns[8] * self.chartWidth, rowY)
+                text(str(round(roundTrip.MFE, 2)), tradeLogTextStartX + columns[9] * self.chartWidth, rowY)
+            
     
+    def drawInstrumentationOverlay(self, instrumentation):
+        """
+        Draws the timing and counter summary of the draw loop over the top-right corner of
+        the screen.
+        
+        @type instrumentation: Instrumentation, the instrumentation of the draw loop
+        @rtype: None
+        """
+        lines = instrumentation.summaryLines()
+        overlayWidth = 0.3 * width
+        overlayStartX = width - overlayWidth - 0.01 * width
+        overlayStartY = 0.01 * height
+        lineHeight = View.stdTextSize * 1.3
+        
+        fill(0, 0, 0, 180)
+        rect(overlayStartX, overlayStartY, overlayWidth, lineHeight * (len(lines) + 1))
+        fill(255, 255, 255)
+        textSize(View.stdTextSize)
+        for lineIndex in range(len(lines)):
+            text(lines[lineIndex], overlayStartX + 0.005 * width, overlayStartY + lineHeight * (lineIndex + 1))
+        colorBlack()
+        
+        
     def drawBackground(self):
         """
         Fills the background of the screen.